@@ -0,0 +1,75 @@
+"""
+Times cold loads of a synthetic full table saved as CSV and as Parquet.
+
+    python -m benchmarks.bench_flat_files --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.flat_files import CSV, PARQUET, load_table, save_table
+
+ARCHETYPES = ["aggro", "control", "midrange", "ramp", "combo"]
+SETS = ["Ikoria", "Zendikar Rising", "Kaldheim", "Strixhaven"]
+
+
+def build(rows):
+    """A full table shaped like make_full_table's output"""
+    rng = np.random.default_rng(0)
+    decks = rng.integers(1, rows // 40 + 2, rows)
+    return pd.DataFrame({
+        "eventId": decks // 16,
+        "date": pd.Timestamp("2020-06-01") + pd.to_timedelta(decks // 16, unit="D"),
+        "deckId": decks,
+        "cardId": pd.Categorical.from_codes(
+            rng.integers(0, 2000, rows), [f"{card:03d}znr" for card in range(2000)]
+        ),
+        "count": rng.integers(1, 5, rows),
+        "slot": pd.Categorical.from_codes(rng.integers(0, 2, rows), ["md", "sb"]),
+        "archetype": pd.Categorical.from_codes(rng.integers(0, 5, rows), ARCHETYPES),
+        "latest_set": pd.Categorical.from_codes(rng.integers(0, 4, rows), SETS),
+    })
+
+
+LOADS = {
+    "whole table": {},
+    "two columns": {"columns": ["deckId", "count"]},
+    "one set": {"filters": [("latest_set", "==", "Kaldheim")]},
+}
+
+
+def best_of(repeats, run):
+    """Best wall time of `repeats` calls, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    table = build(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        save_table(table, "csv_table", directory, file_format=CSV)
+        save_table(table, "parquet_table", directory, file_format=PARQUET,
+                   partition_by="latest_set")
+        print(f"{'load':<16}{'csv ms':>12}{'parquet ms':>12}{'speedup':>10}")
+        for name, options in LOADS.items():
+            csv = best_of(args.repeats, lambda: load_table("csv_table", directory, **options))
+            parquet = best_of(
+                args.repeats, lambda: load_table("parquet_table", directory, **options)
+            )
+            print(f"{name:<16}{csv:>12.1f}{parquet:>12.1f}{csv / max(parquet, 1e-6):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Times the pipeline's lookups on a synthetic database before and after the
+schema migrations add their indexes.
+
+    python -m benchmarks.bench_indexes --events 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from src.migrations import DDL_FILE, migrate
+from src.sqldb import SQLDatabase
+
+QUERIES = {
+    "events without decks": lambda sql_db: sql_db.get_events_without_decks(),
+    "decks without lists": lambda sql_db: sql_db.get_decks_without_lists(),
+    "latest event links": lambda sql_db: sql_db.get_latest_event_links(),
+    # Served by the pilot table's UNIQUE(firstName, lastName) index, which
+    # exists before the migrations too, so this row is a control
+    "pilot lookups (control)": lambda sql_db: [
+        sql_db.get_pilot_id(f"Pilot{number} Surname") for number in range(0, 1000, 10)
+    ],
+    "one event's full table": lambda sql_db: sql_db._cursor.execute(
+        """
+        SELECT event.name, deck.name, pilot.firstName, deckList.cardName
+        FROM event
+        JOIN deck ON deck.eventId = event.id
+        JOIN pilot ON pilot.id = deck.pilotId
+        JOIN deckList ON deckList.deckId = deck.id
+        WHERE event.id = 42
+        """
+        ).fetchall(),
+}
+
+
+def build(path, events, decks_per_event, cards_per_deck):
+    """Writes a database shaped like a real scrape, with no indexes"""
+    connection = sqlite3.connect(path)
+    with open(DDL_FILE, "r") as ddl:
+        connection.executescript(ddl.read())
+    random.seed(0)
+    connection.executemany(
+        "INSERT INTO event (name, link, date) VALUES (?, ?, ?)",
+        [
+            (f"Event {number}", f"event?e={number}&f=ST",
+             f"{number % 28 + 1:02d}/{number % 12 + 1:02d}/{20 + number % 2}")
+            for number in range(events)
+        ]
+    )
+    connection.executemany(
+        "INSERT INTO pilot (firstName, lastName) VALUES (?, ?)",
+        [(f"Pilot{number}", "Surname") for number in range(1000)]
+    )
+    connection.executemany(
+        "INSERT INTO card (setNumber, setName, name, color) VALUES (?, ?, ?, ?)",
+        [(f"{number:03d}", "znr", f"Card {number}", "R") for number in range(400)]
+    )
+    # The last tenth of events and decks are left unscraped
+    scraped_events = events - events // 10
+    connection.executemany(
+        "INSERT INTO deck (eventId, pilotId, deckUrl, name, rank) VALUES (?, ?, ?, ?, ?)",
+        [
+            (event, random.randint(1, 1000), f"?e={event}&d={deck}&f=ST", "Mono Red", "1")
+            for event in range(1, scraped_events + 1)
+            for deck in range(decks_per_event)
+        ]
+    )
+    decks = scraped_events * decks_per_event
+    connection.executemany(
+        "INSERT INTO deckList (cardId, deckId, count, slot, cardName) VALUES (?, ?, ?, ?, ?)",
+        (
+            (f"{card:03d}znr", deck, 4, "md", f"Card {card}")
+            for deck in range(1, decks - decks // 10 + 1)
+            for card in random.sample(range(400), cards_per_deck)
+        )
+    )
+    connection.commit()
+    connection.close()
+
+
+def time_queries(sql_db, repeats):
+    """Best of `repeats` wall times for every query, in milliseconds"""
+    timings = {}
+    for name, run in QUERIES.items():
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run(sql_db)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--decks-per-event", type=int, default=16)
+    parser.add_argument("--cards-per-deck", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build(path, args.events, args.decks_per_event, args.cards_per_deck)
+
+        with SQLDatabase(path, run_migrations=False, shared=False) as sql_db:
+            before = time_queries(sql_db, args.repeats)
+            migrate(sql_db._connection)
+            after = time_queries(sql_db, args.repeats)
+
+    print(f"{'query':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in QUERIES:
+        print(
+            f"{name:<24}{before[name]:>12.2f}{after[name]:>12.2f}"
+            f"{before[name] / max(after[name], 1e-6):>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares the BeautifulSoup page readers in tests.soup_reference with the single pass
+lxml readers in src.parsers on the saved fixture pages.
+
+    python -m benchmarks.bench_parsers --repeats 50
+"""
+import argparse
+import time
+from os.path import dirname, join
+
+from src.parsers import parse_deck_page, parse_event_page
+from tests.soup_reference import soup_deck, soup_event
+
+FIXTURES = join(dirname(__file__), "..", "tests", "fixtures")
+
+
+PAGES = {
+    "event_ranked.html": (soup_event, parse_event_page),
+    "event_points.html": (soup_event, parse_event_page),
+    "deck.html": (
+        lambda text: soup_deck(text, "url", 1),
+        lambda text: parse_deck_page(text, "url", 1)
+    ),
+}
+
+
+def best_time(parse, text, repeats):
+    """Fastest of `repeats` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'page':<20}{'soup ms':>10}{'lxml ms':>10}{'speedup':>10}")
+    for page, (soup_parse, lxml_parse) in PAGES.items():
+        with open(join(FIXTURES, page), "r") as fixture:
+            text = fixture.read()
+        assert soup_parse(text) == lxml_parse(text), f"{page} parsed differently"
+        soup_ms = best_time(soup_parse, text, args.repeats)
+        lxml_ms = best_time(lxml_parse, text, args.repeats)
+        print(f"{page:<20}{soup_ms:>10.2f}{lxml_ms:>10.2f}{soup_ms / lxml_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
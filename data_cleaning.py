@@ -3,9 +3,11 @@ Download and clean known bad data points for MTG standard tournament
 scene inspection
 """
 
+import hashlib
 import json
 import logging
 import os
+import sys
 import pandas as pd
 
 from src.constants import (
@@ -15,8 +17,18 @@ from src.constants import (
     STRIXHAVEN_RELEASE,
     FULL_TABLE_COLUMNS
     )
-import src.models as m
-from src.sqldb import SQLDatabase
+from src.classifier import apply_labels
+from src.flat_files import append_table, save_table
+from src.profiling import stage
+from src.spot_fixes import apply_fixes, fix_frame
+from src.pipeline import run_pipeline
+from src.sqldb import CHANGED_DECKS, SQLDatabase
+
+OUTPUT_DIR = "flat_files"
+# Records the ids cleaned so far and the hashes they were cleaned under
+STATE_FILE = os.path.join(OUTPUT_DIR, "clean_state.json")
+# Files the cleaning rules come from
+RULE_FILES = ["src/data/maps.json", "src/constants.py"]
 
 new_data = {
     "archetype_maps": {
@@ -55,9 +67,7 @@ def update_json_data(new_data):
 def update(url):
     """Update tables from mtgtop8.com"""
 
-    m.update_events(url)
-    m.update_decks_and_players()
-    m.update_deck_lists()
+    run_pipeline(url)
 
 def clean_dates(df, dayfirst=True):
     """Cast date column to datetime objects"""
@@ -78,8 +88,7 @@ def add_card_id(table):
 def fix_deck_names(table, id_name_map):
     """Replaces weird deck names with sensical ones."""
 
-    for deck_id, deck_name in id_name_map.items():
-        table.loc[table["deckId"] == int(deck_id), "name"] = deck_name
+    apply_fixes(table, fix_frame(id_name_map, "deckId", ["name"], key_type=int))
 
 def set_archetypes(table, archetype_map, **kwargs):
     """
@@ -87,38 +96,29 @@ def set_archetypes(table, archetype_map, **kwargs):
     the id, or specifc name.
     """
 
-    # Loops one more time for each item in archetype map
-    # O(n)
-    for archetype, flags in archetype_map.items():
-        # loops one more time for each item in flags
-        # O(m)
-        for flag in flags:
-            table.loc[
-                table["name"].str.contains(flag, case=False),
-                "archetype"
-            ] = archetype
     if kwargs.get("id_archetype_map", None):
         logging.debug("Had to fix archetypes by id")
-        for deck_id, archetype in kwargs["id_archetype_map"].items():
-            table.loc[table["deckId"] == int(deck_id), "archetype"] = archetype
     if kwargs.get("name_archetype_map", None):
         logging.debug("Had to fix archetypes by deck name")
-        for deck_name, archetype in kwargs["name_archetype_map"].items():
-            table.loc[table["name"] == deck_name, "archetype"] = archetype
+    apply_labels(
+        table,
+        "archetype",
+        archetype_map,
+        id_map=kwargs.get("id_archetype_map", None),
+        name_map=kwargs.get("name_archetype_map", None)
+        )
 
 def set_categories(table, category_map, **kwargs):
     """Add category based on either keywords in the name of the deck or id."""
 
-    for category, flags in category_map.items():
-        for flag in flags:
-            table.loc[
-                table["name"].str.contains(flag, case=False),
-                "category"
-            ] = category
     if kwargs.get("id_category_map", None):
         logging.debug("Had to fix categories by deck id")
-        for deck_id, category in kwargs["id_category_map"].items():
-            table.loc[table["deckId"] == int(deck_id), "category"] = category
+    apply_labels(
+        table,
+        "category",
+        category_map,
+        id_map=kwargs.get("id_category_map", None)
+        )
 
 def fix_abu_codes(table, abu_map, inplace=True):
     """Fixes 'abu' codes in mtgtop8's HTML code."""
@@ -139,6 +139,10 @@ def set_latest_release(table):
     the time of the event.
     """
 
+    if table.empty:
+        # .loc cannot add a column to a frame with no rows
+        table["latest_set"] = pd.Series(dtype=object)
+        return
     table.loc[table["date"] < ZENDIKAR_RELEASE, "latest_set"] = "Ikoria"
     table.loc[
         (table["date"] >= ZENDIKAR_RELEASE)
@@ -154,71 +158,105 @@ def set_latest_release(table):
 
 def fix_rankings(table, ranking_map, composite_ranks=None):
     """Replaces point systems with rough approximations of the player's rank."""
+
+    rank_fixes = {}
     for event_id, rank_conversion in ranking_map.items():
-        event_id = int(event_id)
         for pts, rank in rank_conversion:
-            table.loc[
-                (table["rank"] == pts)
-                & (table["eventId"] == event_id),
-                "rank"
-                ] = rank
+            # Once a score is converted a repeat of it no longer matches
+            rank_fixes.setdefault((int(event_id), pts), rank)
+    apply_fixes(table, fix_frame(rank_fixes, ["eventId", "rank"], ["rank"]))
     if composite_ranks:
-        for place_range, rank in composite_ranks.items():
-            table.loc[table["rank"] == place_range, "rank"] = rank
+        apply_fixes(table, fix_frame(composite_ranks, "rank", ["rank"]))
 
 def make_full_table(**kwargs):
-    """Merges all tables into one 'full table'"""
-
-    events_and_decks = pd.merge(
-        kwargs["event_table"],
-        kwargs["deck_table"],
-        on="eventId",
-        suffixes=["_event", "_deck"]
-        ).drop_duplicates()
-
-    events_decks_pilots = pd.merge(
-        events_and_decks,
-        kwargs["pilot_table"],
-        on="pilotId",
-        suffixes=[None, "_pilot"]
-        ).drop_duplicates()
-
-    events_decks_pilots_deck_list = pd.merge(
-        events_decks_pilots,
-        kwargs["deck_list_table"],
-        on="deckId",
-        suffixes=[None, "_decklist"]
-        ).drop_duplicates()
-
-    result = pd.merge(
-        events_decks_pilots_deck_list,
-        kwargs["card_table"],
-        on="cardId",
-        suffixes=[None, "_cards"]
-        )
+    """
+    Merges all tables into one 'full table'.
+    Each table is cut down to the columns the full table keeps before it is
+    merged, label columns are categorical and cards are joined on an integer
+    key, so the merges never carry card text or repeated strings.
+    """
 
-    return (
-        result[FULL_TABLE_COLUMNS]
-        .drop_duplicates()
-        .sort_values(by=["eventId", "deckId", "slot"])
-        .reset_index(drop=True)
-        )
+    with stage("full table: project"):
+        events = categorize(
+            kwargs["event_table"][["eventId", "name", "date", "latest_set"]]
+            .rename(columns={"name": "name_event"}),
+            ["latest_set"]
+            )
+        decks = categorize(
+            kwargs["deck_table"][
+                ["deckId", "eventId", "pilotId", "name", "archetype", "category"]
+            ].rename(columns={"name": "name_deck"}),
+            ["archetype", "category"]
+            )
+        pilots = kwargs["pilot_table"][["pilotId", "firstName", "lastName"]]
+        deck_lists = categorize(
+            kwargs["deck_list_table"][["deckId", "cardId", "count", "slot"]],
+            ["slot"]
+            )
+        cards = categorize(
+            kwargs["card_table"][["cardId", "name", "color"]], ["name", "color"]
+            )
+
+        # Both cardId columns share one integer code per id
+        card_keys, card_ids = pd.factorize(
+            pd.concat([deck_lists["cardId"], cards["cardId"]], ignore_index=True)
+            )
+        deck_lists = deck_lists.drop(columns="cardId").assign(
+            cardKey=card_keys[:len(deck_lists)]
+            )
+        cards = cards.drop(columns="cardId").assign(
+            cardKey=card_keys[len(deck_lists):]
+            )
+
+    with stage("full table: merge decks"):
+        deck_rows = (
+            pd.merge(events, decks, on="eventId")
+            .merge(pilots, on="pilotId")
+            .drop_duplicates()
+            )
+
+    with stage("full table: merge cards"):
+        card_rows = pd.merge(
+            deck_lists.drop_duplicates(), cards.drop_duplicates(), on="cardKey"
+            )
+
+    with stage("full table: merge all"):
+        result = pd.merge(deck_rows, card_rows, on="deckId")
+        result["cardId"] = pd.Categorical.from_codes(result.pop("cardKey"), card_ids)
+        result = (
+            result[FULL_TABLE_COLUMNS]
+            .drop_duplicates()
+            .sort_values(by=["eventId", "deckId", "slot"], kind="mergesort")
+            .reset_index(drop=True)
+            )
+
+    return result
+
+def categorize(table, columns):
+    """Copy of table with the given columns as categoricals"""
+
+    return table.astype({column: "category" for column in columns})
 
 def fix_wrong_names(table, id_specs_map):
     """Spot fixes weird deck names"""
 
-    for card_id, specs in id_specs_map.items():
-        table.loc[table["cardId"] == card_id, "cardId"] = specs[0]
-        table.loc[table["cardId"] == card_id, "name"] = specs[1]
-        table.loc[table["cardId"] == card_id, "color"] = specs[2]
+    apply_fixes(table, fix_frame(id_specs_map, "cardId", ["cardId", "name", "color"]))
 
-def save_to_disk(**kwargs):
-    """Saves all tables to separate csv files"""
+def save_to_disk(file_format=None, partition_by=None, **kwargs):
+    """
+    Saves all tables to separate files in flat_files, as Parquet when
+    pyarrow is installed and csv otherwise.
+    partition_by ("latest_set" or "month") splits the full table on disk.
+    """
 
-    if not os.path.exists("flat_files"):
-        os.mkdir("flat_files")
     for table in kwargs:
-        kwargs[table].to_csv(f"flat_files/{table}.csv", index=False)
+        save_table(
+            kwargs[table],
+            table,
+            directory=OUTPUT_DIR,
+            file_format=file_format,
+            partition_by=partition_by if table == "full_table" else None
+            )
 
 def check_missing_archetype(table):
     """
@@ -321,8 +359,97 @@ def check_wrong_sets(table, a_deck_table):
             )
             new_data["id_spec_map"].update({bad_card_id: new_value})
 
-def main():
-    """The main runner of the script"""
+def rules_hash():
+    """
+    Hash of everything the cleaning rules are read from, so a change to
+    maps.json or the constants forces a full rebuild.
+    """
+
+    digest = hashlib.sha256()
+    for path in RULE_FILES:
+        with open(path, "rb") as rule_file:
+            digest.update(rule_file.read())
+    return digest.hexdigest()
+
+def card_hash(card_table):
+    """Hash of the card table as read; refreshed cards force a full rebuild"""
+
+    return str(pd.util.hash_pandas_object(card_table, index=False).sum())
+
+def load_state():
+    """What the last run cleaned, or None if nothing was saved yet"""
+
+    if not os.path.exists(STATE_FILE):
+        return None
+    with open(STATE_FILE, "r") as json_file:
+        return json.load(json_file)
+
+def save_state(state):
+    """Records what this run cleaned"""
+
+    with open(STATE_FILE, "w") as json_file:
+        json.dump(state, json_file)
+
+def read_tables(sql_db, marks=None, upto=None):
+    """
+    Reads the tables to clean. With marks (the highest ids, and deckList
+    rowid, already cleaned) only the decks, pilots and events past them are
+    read, along with older decks whose lists were saved after the last run,
+    plus the events and pilots those decks refer to.
+    """
+
+    if marks is None:
+        return {
+            "event_table": sql_db.get_dataframe_from("event"),
+            "deck_table": sql_db.get_dataframe_from("deck"),
+            "deck_list_table": sql_db.get_dataframe_from("deckList"),
+            "pilot_table": sql_db.get_dataframe_from("pilot")
+        }
+
+    changed = (upto["deck"], marks["deck"], marks["deckList"], upto["deckList"])
+    referenced = "SELECT {} FROM deck WHERE id IN (" + CHANGED_DECKS + ")"
+    return {
+        "event_table": sql_db.get_dataframe_from(
+            "event",
+            f"(id > ? AND id <= ?) OR id IN ({referenced.format('eventId')})",
+            (marks["event"], upto["event"]) + changed
+            ),
+        "deck_table": sql_db.get_dataframe_from("deck", f"id IN ({CHANGED_DECKS})", changed),
+        "deck_list_table": sql_db.get_dataframe_from(
+            "deckList", f"deckId IN ({CHANGED_DECKS})", changed
+            ),
+        "pilot_table": sql_db.get_dataframe_from(
+            "pilot",
+            f"(id > ? AND id <= ?) OR id IN ({referenced.format('pilotId')})",
+            (marks["pilot"], upto["pilot"]) + changed
+            )
+    }
+
+def append_to_disk(marks, **kwargs):
+    """
+    Adds the newly cleaned rows to the files save_to_disk wrote. Events,
+    pilots and decks read only because a new deck or deck list refers to
+    them are already saved. A deck's list is saved whole, so an older deck
+    with new deckList rows had no deck list or full table rows before.
+    """
+
+    for table, id_column, mark in (
+            ("deck_table", "deckId", "deck"),
+            ("event_table", "eventId", "event"),
+            ("pilot_table", "pilotId", "pilot")):
+        if table in kwargs:
+            kwargs[table] = kwargs[table][kwargs[table][id_column] > marks[mark]]
+    for table in kwargs:
+        if not kwargs[table].empty:
+            append_table(kwargs[table], table, directory=OUTPUT_DIR)
+
+def main(incremental=True):
+    """
+    The main runner of the script.
+    Incremental runs clean and append only the decks scraped since the last
+    run; the whole database is rebuilt when there is no earlier run, or the
+    rules or card table have changed since it.
+    """
 
     logging.basicConfig(
         filename="main_output.log",
@@ -332,12 +459,38 @@ def main():
 
     update(URL)
 
+    state = load_state() if incremental else None
+    rules = rules_hash()
+
     with SQLDatabase() as sql_db:
-        event_table = sql_db.get_dataframe_from("event")
-        deck_table = sql_db.get_dataframe_from("deck")
-        deck_list_table = sql_db.get_dataframe_from("deckList")
+        upto = sql_db.get_max_ids()
         card_table = sql_db.get_dataframe_from("card")
-        pilot_table = sql_db.get_dataframe_from("pilot")
+        cards = card_hash(card_table)
+        rebuild = (
+            state is None
+            or state["rules"] != rules
+            or state["cards"] != cards
+            # Saved before deck lists had their own mark
+            or "deckList" not in state["marks"]
+            )
+        marks = None if rebuild else state["marks"]
+        tables = read_tables(sql_db, marks, upto)
+        deck_ids = None if rebuild else sql_db.get_changed_deck_ids(marks, upto)
+
+    if rebuild:
+        print("Rebuilding every table.")
+    elif tables["deck_table"].empty and upto == marks:
+        print("Nothing new to clean.")
+        return
+    elif tables["deck_table"].empty:
+        print("No new or updated decks, only new events or pilots.")
+    else:
+        print(f"Cleaning {len(tables['deck_table'])} new or updated decks.")
+
+    event_table = tables["event_table"]
+    deck_table = tables["deck_table"]
+    deck_list_table = tables["deck_list_table"]
+    pilot_table = tables["pilot_table"]
 
     clean_dates(event_table)
     rename_id_column(event_table, "eventId")
@@ -346,6 +499,12 @@ def main():
 
     set_latest_release(event_table)
 
+    if not rebuild and deck_table.empty:
+        # Nothing to clean or refresh in the full table
+        append_to_disk(marks, event_table=event_table, pilot_table=pilot_table)
+        save_state({"rules": rules, "cards": cards, "marks": upto})
+        return
+
     add_card_id(card_table)
 
     data_maps = load_json_data()
@@ -389,18 +548,35 @@ def main():
     check_unmatched_card_ids(deck_list_table, card_table, deck_table)
     check_wrong_sets(full_table, deck_table)
 
-    save_to_disk(
-        full_table=full_table,
-        event_table=event_table,
-        deck_table=deck_table,
-        deck_list_table=deck_list_table,
-        card_table=card_table,
-        pilot_table=pilot_table
-        )
+    if rebuild:
+        save_to_disk(
+            full_table=full_table,
+            event_table=event_table,
+            deck_table=deck_table,
+            deck_list_table=deck_list_table,
+            card_table=card_table,
+            pilot_table=pilot_table
+            )
+        logging.info("All tables saved")
+    else:
+        append_to_disk(
+            marks,
+            full_table=full_table,
+            event_table=event_table,
+            deck_table=deck_table,
+            deck_list_table=deck_list_table,
+            pilot_table=pilot_table
+            )
+        logging.info("New rows appended")
+
+    with SQLDatabase() as sql_db:
+        sql_db.refresh_full_table(full_table, deck_ids=deck_ids, replace_all=rebuild)
 
-    logging.info("All tables saved")
+    # Rules are hashed as they were before this run's new spot fixes,
+    # so saving those fixes makes the next run rebuild with them
+    save_state({"rules": rules, "cards": cards, "marks": upto})
 
     update_json_data(new_data)
 
 if __name__ == "__main__":
-    main()
+    main(incremental="--full" not in sys.argv[1:])
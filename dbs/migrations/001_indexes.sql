@@ -0,0 +1,13 @@
+-- Secondary indexes for the scrape anti-joins and the full table joins
+
+-- Serves pilot lookups by the full name scraped from event pages
+CREATE INDEX IF NOT EXISTS pilotFullName ON pilot((firstName || lastName));
+
+-- Dates are saved as dd/mm/yy; this orders them for the latest-events lookup
+CREATE INDEX IF NOT EXISTS eventSortableDate
+    ON event((substr(date, 7) || substr(date, 4, 2) || substr(date, 1, 2)));
+
+CREATE INDEX IF NOT EXISTS deckEventId ON deck(eventId);
+CREATE INDEX IF NOT EXISTS deckPilotId ON deck(pilotId);
+CREATE INDEX IF NOT EXISTS deckListDeckId ON deckList(deckId);
+CREATE INDEX IF NOT EXISTS deckListCardId ON deckList(cardId);
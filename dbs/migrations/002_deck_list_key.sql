@@ -0,0 +1,14 @@
+-- A card shows up once per slot in a deck; drop repeats from re-scrapes
+-- and stop new ones from being inserted.
+
+DELETE FROM deckList
+WHERE rowid NOT IN (
+    SELECT min(rowid)
+    FROM deckList
+    GROUP BY deckId, cardId, slot
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS deckListKey ON deckList(deckId, cardId, slot);
+
+-- deckListKey starts with deckId, so it serves those lookups on its own
+DROP INDEX IF EXISTS deckListDeckId;
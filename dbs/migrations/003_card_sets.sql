@@ -0,0 +1,9 @@
+-- Lets card refreshes skip sets and rows that have not changed on Scryfall
+
+ALTER TABLE card ADD COLUMN contentHash TEXT;
+
+CREATE TABLE IF NOT EXISTS cardSet (
+    setName TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    refreshedAt TEXT NOT NULL
+);
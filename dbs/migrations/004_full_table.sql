@@ -0,0 +1,31 @@
+-- The cleaned full table, one row per card in a deck, kept by data_cleaning
+
+CREATE TABLE IF NOT EXISTS fullTable (
+    eventId INTEGER NOT NULL,
+    eventName TEXT,
+    date TEXT,
+    deckId INTEGER NOT NULL,
+    pilotId INTEGER,
+    deckName TEXT,
+    firstName TEXT,
+    lastName TEXT,
+    cardId TEXT,
+    cardName TEXT,
+    count INTEGER,
+    color TEXT,
+    slot TEXT,
+    archetype TEXT,
+    category TEXT,
+    latestSet TEXT
+);
+
+-- Refreshes replace a deck's rows, and deck lookups start here
+CREATE INDEX IF NOT EXISTS fullTableDeckId ON fullTable(deckId);
+
+-- Covering indexes for the usual notebook slices; dates are yyyy-mm-dd
+CREATE INDEX IF NOT EXISTS fullTableArchetype
+    ON fullTable(archetype, date, deckId, category);
+CREATE INDEX IF NOT EXISTS fullTableDate
+    ON fullTable(date, archetype, deckId, eventId);
+CREATE INDEX IF NOT EXISTS fullTableCardName
+    ON fullTable(cardName, slot, count, deckId, archetype);
@@ -0,0 +1,16 @@
+-- Pages still to be scraped, so an interrupted run carries on where it stopped
+
+CREATE TABLE IF NOT EXISTS scrapeQueue (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    deckId INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    nextAttemptAt REAL NOT NULL DEFAULT 0,
+    lastError TEXT,
+    updatedAt REAL
+);
+
+-- Serves the next-item lookup for each kind of page
+CREATE INDEX IF NOT EXISTS scrapeQueueNext
+    ON scrapeQueue(kind, state, nextAttemptAt);
@@ -0,0 +1,11 @@
+-- Pages the parsers rejected, kept with their html so a parser fix can
+-- save them without fetching them again
+
+CREATE TABLE IF NOT EXISTS quarantine (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    deckId INTEGER,
+    reason TEXT NOT NULL,
+    html TEXT NOT NULL,
+    quarantinedAt REAL
+);
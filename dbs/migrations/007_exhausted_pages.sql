@@ -0,0 +1,5 @@
+-- Pages that used up their attempts get a state of their own instead of
+-- staying failed, so they are not reported as waiting for a retry.
+-- 5 is work_queue.MAX_ATTEMPTS when this migration was written.
+
+UPDATE scrapeQueue SET state = 'exhausted' WHERE state = 'failed' AND attempts >= 5;
@@ -0,0 +1,5 @@
+-- Pilots are now looked up by firstName IN (...), which the
+-- UNIQUE(firstName, lastName) index already serves, so no query uses the
+-- full name expression index any more and it only slows pilot inserts.
+
+DROP INDEX IF EXISTS pilotFullName;
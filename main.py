@@ -1,15 +1,35 @@
 import os
 import sqlite3
+import sys
 import time
 
 from src import models as m
+from src.pipeline import run_pipeline
+from src.work_queue import WorkQueue
 
 URL = "https://www.mtgtop8.com/format?f=ST"
 
-def main():
-    m.update_events(URL)
-    m.update_decks_and_players()
-    m.update_deck_lists()
+def main(streaming=True, offline=False):
+    """
+    Scrapes everything new from mtgtop8. The stages stream into each other
+    by default; streaming=False runs them one after another. Either way
+    each page is committed through the scrape queue as it is parsed.
+    offline replays the queued pages from the response cache instead.
+    """
+    run_pipeline(URL, streaming=streaming, offline=offline)
+
+def redrive():
+    """Saves quarantined pages that parse after a parser fix, without fetching them"""
+    m.redrive_quarantine()
+
+def retry_exhausted():
+    """Queues the pages that failed too many times to be scraped again"""
+    print(f"Queued {WorkQueue().retry_exhausted()} exhausted pages again")
 
 if __name__ == "__main__":
-    main()
+    if "--redrive" in sys.argv[1:]:
+        redrive()
+    elif "--retry-exhausted" in sys.argv[1:]:
+        retry_exhausted()
+    else:
+        main(offline="--offline" in sys.argv[1:])
@@ -8,6 +8,9 @@ from selenium.common.exceptions import NoSuchElementException
 class Scraper:
     """Selenium wrapper for easy web navigation"""
 
+    # Seconds to let the browser render after running page javascript
+    page_load_delay = 2
+
     def __init__(self, url):
         """Establishes driver"""
         self.url = url
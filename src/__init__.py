@@ -1 +1 @@
-from sqldb import SQLDatabase
\ No newline at end of file
+from src.sqldb import SQLDatabase
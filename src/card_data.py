@@ -1,36 +1,109 @@
 """
 Loaded data objects for visuals.
+
+Every table and slice is read on first access and kept until its saved
+file changes, so importing this module costs nothing:
+
+    from src.card_data import card_table   # reads card_table only
 """
 
-from os.path import join
-import pandas as pd
+import threading
 
 from src.constants import FLAT_FILE_DIR
+from src.flat_files import load_table, modified_at, saved_path
 
 
 LANDS = ["Island", "Mountain", "Forest", "Plains", "Swamp"]
 
-full_table = pd.read_csv(join(FLAT_FILE_DIR, "full_table.csv"))
-event_table = pd.read_csv(join(FLAT_FILE_DIR, "event_table.csv"))
-deck_list_table = pd.read_csv(join(FLAT_FILE_DIR, "deck_list_table.csv"))
-pilot_table = pd.read_csv(join(FLAT_FILE_DIR, "pilot_table.csv"))
-deck_table = pd.read_csv(join(FLAT_FILE_DIR, "deck_table.csv"))
-card_table = pd.read_csv(join(FLAT_FILE_DIR, "card_table.csv"))
-
-illegal_deck_ids = full_table[
-    ~full_table["cardId"].isin(
-        card_table["standardLegality"] == "legal"]["cardId"]
-        )
-    ]["deckId"]
-
-first_place_decks = deck_table[
-    (deck_table["rank"] == 1)
-    & (~deck_table["deckId"].isin(illegal_deck_ids))
-    ].copy()
-
-main_decks = full_table[
-    (~full_table["name"].isin(LANDS))
-    & (full_table["slot"] == "md")
-    & (~fulll_table["deckId"].isin(illegal_deck_ids))
-    ].copy()
+TABLES = (
+    "full_table",
+    "event_table",
+    "deck_list_table",
+    "pilot_table",
+    "deck_table",
+    "card_table"
+)
+
+
+def get_illegal_deck_ids(full_table, card_table):
+    """Decks playing a card that is not standard legal"""
+    return full_table[
+        ~full_table["cardId"].isin(
+            card_table[card_table["standardLegality"] == "legal"]["cardId"]
+            )
+        ]["deckId"]
+
+
+def get_first_place_decks(deck_table, illegal_deck_ids):
+    """Legal decks that won their event"""
+    return deck_table[
+        # Parquet saves ranks as text, CSV may read them back as numbers
+        (deck_table["rank"].astype(str) == "1")
+        & (~deck_table["deckId"].isin(illegal_deck_ids))
+        ].copy()
+
+
+def get_main_decks(full_table, illegal_deck_ids):
+    """Main deck spells of legal decks"""
+    return full_table[
+        (~full_table["name"].isin(LANDS))
+        & (full_table["slot"] == "md")
+        & (~full_table["deckId"].isin(illegal_deck_ids))
+        ].copy()
+
+
+# Slices built from other datasets, with the names of their inputs
+DERIVED = {
+    "illegal_deck_ids": (get_illegal_deck_ids, ("full_table", "card_table")),
+    "first_place_decks": (get_first_place_decks, ("deck_table", "illegal_deck_ids")),
+    "main_decks": (get_main_decks, ("full_table", "illegal_deck_ids"))
+}
+
+_cache = {}
+_lock = threading.RLock()
+
+
+def version(name):
+    """Changes whenever a dataset, or anything it is built from, is saved again"""
+    if name in DERIVED:
+        return tuple(version(source) for source in DERIVED[name][1])
+    path = saved_path(name, FLAT_FILE_DIR)
+    return path, modified_at(path)
+
+
+def get(name):
+    """
+    Returns a dataset, loading it (and what it is built from) if it has not
+    been loaded since its file last changed. The same object is handed to
+    every caller, so copy it before changing it.
+    """
+    if name not in TABLES and name not in DERIVED:
+        raise KeyError(f"Unknown dataset {name}")
+    with _lock:
+        current = version(name)
+        cached = _cache.get(name)
+        if cached is not None and cached[0] == current:
+            return cached[1]
+        if name in DERIVED:
+            build, sources = DERIVED[name]
+            value = build(*(get(source) for source in sources))
+        else:
+            value = load_table(name, FLAT_FILE_DIR)
+        _cache[name] = (current, value)
+        return value
+
+
+def clear():
+    """Forgets every loaded dataset"""
+    with _lock:
+        _cache.clear()
+
+
+def __getattr__(name):
+    if name in TABLES or name in DERIVED:
+        return get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+def __dir__():
+    return sorted(list(globals()) + list(TABLES) + list(DERIVED))
@@ -0,0 +1,242 @@
+"""
+Card rows from Scryfall card objects, and streaming reads of Scryfall's
+bulk-data dumps
+"""
+import gzip
+import json
+import re
+
+from src.constants import SETS
+from src.fetcher import CONCURRENCY, fetch_each
+from src.sqldb import CHUNK_SIZE, SQLDatabase, chunked, row_hash
+
+# Characters read from a bulk-data file at a time
+READ_SIZE = 1 << 16
+# Longest token a read can cut short, -Infinity; a \uXXXX escape is shorter
+PARTIAL_TOKEN = len("-Infinity")
+
+SETS_URL = "https://api.scryfall.com/sets"
+SEARCH_URL = (
+    "https://api.scryfall.com/cards/search?order=set&unique=prints&q=set%3A"
+    + "'{}'+lang%3A'en'"
+)
+# Where card_row puts a card's standard legality
+STANDARD_LEGALITY = 5
+
+# Asks the response cache to check with Scryfall instead of trusting its copy
+FRESH = {"Cache-Control": "no-cache"}
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def card_row(card):
+    """Turns a Scryfall card object into a row for the card table"""
+    this_card = (
+        card["collector_number"],
+        card["set"],
+        card["name"],
+        int(card["cmc"]),
+        "".join(card["color_identity"]),
+        card["legalities"]["standard"]
+    )
+
+    # Oracle text & Mana costs are different for cards with two faces...
+    try:
+        oracle_text = card["oracle_text"]
+    except KeyError:
+        oracle_text = " // ".join(face["oracle_text"]
+                                  for face in card["card_faces"])
+
+    try:
+        mana_cost = card["mana_cost"]
+    except KeyError:
+        mana_cost = " // ".join(face["mana_cost"]
+                                for face in card["card_faces"])
+        if mana_cost == " // ":
+            mana_cost = ""
+
+    try:
+        image_uri = card["image_uris"]["normal"]
+    except KeyError:
+        image_uri = " // ".join([face["image_uris"]["normal"] for face in card["card_faces"]])
+
+    return this_card + (oracle_text, mana_cost, image_uri)
+
+
+def search_cards(session, url):
+    """Every card a Scryfall search returns, following its pages"""
+    response = session.get(url, headers=FRESH)
+    # Scryfall answers a search with no results with a 404
+    if response.status_code == 404:
+        return []
+    page = response.json()
+    cards = page["data"]
+    while page["has_more"]:
+        page = session.get(page["next_page"], headers=FRESH).json()
+        cards.extend(page["data"])
+    return cards
+
+
+def search_set(session, card_set):
+    """Card rows of every English printing in a set"""
+    return [card_row(card) for card in search_cards(session, SEARCH_URL.format(card_set))]
+
+
+def set_cards(session, sets=SETS, concurrency=CONCURRENCY):
+    """
+    Returns {set code: card rows} from a search of each set. The searches
+    run concurrently through fetch_each, so the shared scheduler still
+    holds Scryfall to its rate, and each follows its own pages in order.
+    """
+    return dict(zip(sets, fetch_each(sets, search_set, concurrency, session)))
+
+
+def set_signatures(session, sets=SETS, concurrency=CONCURRENCY):
+    """
+    Returns {set code: signature} from Scryfall's current data, along with
+    the {set code: card rows} it was worked out from. The signature is the
+    set's card count and a hash of the card rows of its standard legal
+    cards, so it changes when a set gains cards, when any card changes
+    legality (a ban, an unban, a swap of one for another or rotation), and
+    when a legal card's saved fields change, such as an errata.
+    An errata to a card that is not standard legal, with nothing else in
+    the set changing, is not seen; update_cards(incremental=False) picks
+    those up.
+    Costs one request for the set list plus the pages of every set's
+    search, which are then all a refresh of the changed sets needs.
+    """
+    card_counts = {
+        card_set["code"]: card_set["card_count"]
+        for card_set in session.get(SETS_URL, headers=FRESH).json()["data"]
+    }
+    rows_by_set = set_cards(session, sets, concurrency)
+    signatures = {}
+    for card_set, rows in rows_by_set.items():
+        legal_rows = sorted(row for row in rows if row[STANDARD_LEGALITY] == "legal")
+        signatures[card_set] = f"{card_counts.get(card_set, 0)}:{row_hash(legal_rows)}"
+    return signatures, rows_by_set
+
+
+def changed_sets(session, sql_db, sets=SETS, concurrency=CONCURRENCY):
+    """
+    Returns the sets whose signature differs from the last refresh, along
+    with the new signatures to save once their cards have been, and those
+    cards' rows.
+    """
+    signatures, rows_by_set = set_signatures(session, sets, concurrency)
+    saved = sql_db.get_card_set_signatures()
+    changed = [card_set for card_set in sets if saved.get(card_set) != signatures[card_set]]
+    return (
+        changed,
+        {card_set: signatures[card_set] for card_set in changed},
+        [row for card_set in changed for row in rows_by_set[card_set]]
+    )
+
+
+def cut_off(error):
+    """
+    Whether a decode error could be a read ending mid item rather than bad
+    JSON: an unterminated string, or an error within a token's length of
+    the end of what has been read.
+    """
+    return (
+        error.msg.startswith("Unterminated string")
+        or len(error.doc) - error.pos <= PARTIAL_TOKEN
+    )
+
+
+def iter_json_array(json_file, read_size=READ_SIZE):
+    """
+    Yields the items of a top level JSON array one at a time, reading the
+    file in read_size pieces, so only one item is ever held in memory.
+    A malformed item, or a missing or stray separator, raises
+    JSONDecodeError without reading further.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    at_end = False
+
+    def skip():
+        """Moves past whitespace, reading more if it runs to the end"""
+        nonlocal position
+        position = WHITESPACE.match(buffer, position).end()
+        while position >= len(buffer) and not at_end:
+            read_more()
+            position = WHITESPACE.match(buffer, position).end()
+
+    def read_more():
+        """Drops what has been decoded and appends the next piece"""
+        nonlocal buffer, position, at_end
+        piece = json_file.read(read_size)
+        at_end = not piece
+        buffer = buffer[position:] + piece
+        position = 0
+
+    skip()
+    if not buffer.startswith("[", position):
+        raise ValueError("Bulk data should be a JSON array")
+    position += 1
+    skip()
+    if buffer.startswith("]", position):
+        return
+
+    while True:
+        # Exactly one separator was consumed after the last item, so a
+        # stray one here fails to decode as a value
+        skip()
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if at_end or not cut_off(error):
+                raise
+            read_more()
+            continue
+        # A number cut off by the end of a read decodes as a shorter
+        # number, so an item only counts once its delimiter has been read
+        following = WHITESPACE.match(buffer, end).end()
+        if not buffer.startswith((",", "]"), following):
+            if at_end:
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, following)
+            read_more()
+            continue
+        position = following + 1
+        yield item
+        if buffer[following] == "]":
+            return
+
+
+def open_bulk_data(path):
+    """Opens a bulk-data dump, which may be gzipped"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_bulk_cards(path, sets=SETS):
+    """
+    Streams card rows out of a Scryfall bulk-data dump (e.g. default_cards),
+    keeping English printings from the given sets.
+    """
+    sets = set(sets)
+    with open_bulk_data(path) as json_file:
+        for card in iter_json_array(json_file):
+            if card.get("set") in sets and card.get("lang", "en") == "en":
+                yield card_row(card)
+
+
+def ingest_bulk_data(path, sets=SETS, chunk_size=CHUNK_SIZE, sql_db=None):
+    """
+    Writes the cards in a bulk-data dump to the card table chunk_size rows
+    at a time, so memory stays flat however big the dump is.
+    Returns (inserted, skipped) row counts.
+    """
+    if sql_db is None:
+        with SQLDatabase() as this_db:
+            return ingest_bulk_data(path, sets, chunk_size, this_db)
+    inserted = skipped = 0
+    for chunk in chunked(iter_bulk_cards(path, sets), chunk_size):
+        chunk_inserted, chunk_skipped = sql_db.union_events(chunk, "card", chunk_size)
+        inserted += chunk_inserted
+        skipped += chunk_skipped
+    return inserted, skipped
@@ -0,0 +1,68 @@
+"""
+Labels deck names from keyword flags in one pass over the unique names
+"""
+import re
+
+import pandas as pd
+
+
+def compile_flags(flag_map):
+    """
+    Compiles {label: [flags]} into one case-insensitive regex.
+    Each label becomes a lookahead alternative followed by an empty group,
+    tried from the last label to the first, so the match's lastindex names
+    the last label with a flag anywhere in the name - the label that one
+    str.contains pass per flag would have left behind.
+    Flags are regexes, as they are for str.contains.
+    Returns (pattern, labels) where labels[lastindex - 1] is the winner.
+    """
+    labels = []
+    alternatives = []
+    for label, flags in reversed(list(flag_map.items())):
+        if not flags:
+            continue
+        # Flags may hold their own groups, so the marker's number is counted
+        flag_groups = sum(re.compile(flag).groups for flag in flags)
+        labels.extend([None] * flag_groups + [label])
+        alternatives.append(
+            r"(?=[\s\S]*?(?:" + "|".join(f"(?:{flag})" for flag in flags) + "))()"
+        )
+    if not alternatives:
+        return None, labels
+    pattern = re.compile(
+        r"\A(?:" + "|".join(alternatives) + ")", re.IGNORECASE
+    )
+    return pattern, labels
+
+
+def classify(names, flag_map):
+    """
+    Returns a Series holding the flag label for each name, or NaN when no
+    flag matches. Each distinct name is matched once.
+    """
+    pattern, labels = compile_flags(flag_map)
+    if pattern is None:
+        return pd.Series(float("nan"), index=names.index, dtype=object)
+    found = {}
+    for name in names.dropna().unique():
+        match = pattern.match(str(name))
+        if match is not None:
+            found[name] = labels[match.lastindex - 1]
+    return names.map(found)
+
+
+def apply_labels(table, column, flag_map, id_map=None, name_map=None):
+    """
+    Sets column from the flags, then the deck id overrides, then the deck
+    name overrides, each beating the last. Rows none of them label keep
+    whatever value the column already had.
+    """
+    labels = classify(table["name"], flag_map)
+    if id_map:
+        by_id = table["deckId"].map({int(deck_id): label for deck_id, label in id_map.items()})
+        labels = by_id.combine_first(labels)
+    if name_map:
+        labels = table["name"].map(name_map).combine_first(labels)
+    if column in table.columns:
+        labels = labels.combine_first(table[column])
+    table[column] = labels
@@ -324,6 +324,19 @@ SETS = [
 
 FLAT_FILE_DIR = "../flat_files"
 
+# Request budgets per host, shared by all scrapers
+REQUESTS_PER_SECOND = {
+    "www.mtgtop8.com": 4,
+    "mtgtop8.com": 4,
+    # Scryfall asks for 50-100 milliseconds between requests
+    "api.scryfall.com": 10
+}
+
+# Raw responses are kept here so pages are only downloaded once
+HTTP_CACHE_DIR = "dbs/http_cache"
+# Seconds before a cached Scryfall response is revalidated
+SCRYFALL_CACHE_TTL = 24 * 60 * 60
+
 if __name__ == "__main__":
     with open("data/maps.json", "w") as json_file:
         json.dump(data_maps, json_file)
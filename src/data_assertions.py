@@ -1,8 +1,23 @@
 """
-Collection of asserts used in the models module
+Collection of checks used by the models and parsers modules
 """
 import re
 
+from src.pilots import PilotIndex
+
+
+class MalformedPage(ValueError):
+    """Raised when a scraped page does not look the way the parsers expect"""
+
+
+def check(condition, reason):
+    """
+    Raises MalformedPage with reason unless condition holds. Unlike assert,
+    it still runs under python -O.
+    """
+    if not condition:
+        raise MalformedPage(reason)
+
 def is_up_to_date(result, latest):
     """Checks if there are any old links in the new links seen on mtgtop8"""
     new_links = []
@@ -12,6 +27,10 @@ def is_up_to_date(result, latest):
     for old_link in latest:
         return old_link in new_links
 
+def has_next_page(page_source, page):
+    """Checks the navigation bar for a link to the page after this one"""
+    return f"PageSubmit({page + 1})" in page_source
+
 def is_malformed(name):
     """Assertion for misformed deck titles"""
     return re.match(r"^\$[0-9]*\ \(.*\)$", name) or re.match(r"^[0-9]*\ TIX$", name)
@@ -42,12 +61,8 @@ def are_equal_length(*args):
     return equal
 
 def check_new_players(players, currently_saved_players):
-    """Looks at the players on the page and filters for only new players"""
-    new_players = []
-    for player in players:
-        if player not in list(
-            currently_saved_players["firstName"] + " "
-            + currently_saved_players["lastName"]
-        ):
-            new_players.append(player)
-    return [player.split(maxsplit=1) for player in new_players]
+    """
+    Looks at the players on the page and filters for only new players.
+    Scrapers covering many events should keep one PilotIndex instead.
+    """
+    return PilotIndex.from_table(currently_saved_players).add_new(players)
@@ -0,0 +1,211 @@
+"""
+Concurrent page fetching for the scrapers
+"""
+import asyncio
+import contextlib
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.session import make_session
+
+# Default number of requests allowed in flight at once
+CONCURRENCY = 8
+
+
+class FetchError(Exception):
+    """
+    Raised once every fetch has finished, when some of them failed.
+    results holds what came back, in order, with the error in place of each
+    failed item; failures maps each failed item to its error.
+    """
+
+    def __init__(self, results, failures):
+        super().__init__(
+            f"{len(failures)} of {len(results)} fetches failed, first: "
+            f"{next(iter(failures.values()))!r}"
+        )
+        self.results = results
+        self.failures = failures
+
+
+def fetch_all(urls, concurrency=CONCURRENCY, session=None):
+    """
+    Gets every url with at most `concurrency` requests in flight and returns
+    the responses in the same order as urls, whatever order they finish in.
+    The session's connection pool is sized to match when one is made here.
+    A response with an error status counts as a failed url. A failed url
+    does not stop the others; FetchError is raised at the end.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+    if session is None:
+        with make_session(pool_size=concurrency) as this_session:
+            return asyncio.run(_fetch_all(this_session, urls, concurrency))
+    return asyncio.run(_fetch_all(session, urls, concurrency))
+
+
+async def _fetch_all(session, urls, concurrency):
+    """Schedules one fetch per url behind a semaphore"""
+    return await _run_all(lambda url: get_page(session, url), urls, concurrency)
+
+
+def get_page(session, url):
+    """
+    Gets a url, raising requests.HTTPError for an error status, since the
+    scheduler hands 403 and 404 responses back as they are
+    """
+    response = session.get(url)
+    response.raise_for_status()
+    return response
+
+
+def fetch_each(items, fetch, concurrency=CONCURRENCY, session=None):
+    """
+    Calls fetch(session, item) for every item with at most `concurrency`
+    calls running at once, returning the results in item order.
+    Each call may make several requests in sequence, such as following a
+    paginated API, so independent chains overlap while each stays in order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if session is None:
+        with make_session(pool_size=concurrency) as this_session:
+            return fetch_each(items, fetch, concurrency, this_session)
+    return asyncio.run(
+        _run_all(lambda item: fetch(session, item), items, concurrency)
+    )
+
+
+async def _run_all(call, items, concurrency):
+    """
+    Runs call(item) on a thread pool behind a semaphore, keeping item order.
+    Every call runs to the end before FetchError reports the ones that failed.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        async def run(item):
+            async with semaphore:
+                return await loop.run_in_executor(pool, call, item)
+
+        results = await asyncio.gather(
+            *(run(item) for item in items), return_exceptions=True
+        )
+    failures = {
+        item: result for item, result in zip(items, results)
+        if isinstance(result, Exception)
+    }
+    if failures:
+        raise FetchError(results, failures)
+    return results
+
+
+# Default number of fetched pages allowed to wait for a parser
+QUEUE_SIZE = 32
+
+
+def fetch_and_parse(urls, parser, parser_args, fetch_workers=CONCURRENCY,
+                    parse_workers=None, queue_size=QUEUE_SIZE, session=None,
+                    parse_pool=None):
+    """
+    Fetches urls on a thread pool and parses each page on a process pool,
+    parse_pool when one is passed so it can be kept across calls.
+    The two are joined by a bounded queue, so fetching never runs more than
+    queue_size pages ahead of parsing and network waits overlap parsing CPU.
+    parser must be a module level function; it is called as
+    parser(page_text, page_url, *parser_args[i]) for the i-th url.
+    Returns the parsed results in url order. A url that fails to fetch,
+    error statuses included, or to parse does not stop the others;
+    FetchError is raised at the end.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+    if session is None:
+        with make_session(pool_size=fetch_workers) as this_session:
+            return _fetch_and_parse(
+                this_session, urls, parser, parser_args,
+                fetch_workers, parse_workers, queue_size, parse_pool
+            )
+    return _fetch_and_parse(
+        session, urls, parser, parser_args,
+        fetch_workers, parse_workers, queue_size, parse_pool
+    )
+
+
+def _fetch_and_parse(session, urls, parser, parser_args,
+                     fetch_workers, parse_workers, queue_size, parse_pool):
+    """Runs the fetch threads and feeds their pages to the parse processes"""
+    jobs = queue.Queue()
+    for position, url in enumerate(urls):
+        jobs.put((position, url))
+    pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def fetch_worker():
+        while not stop.is_set():
+            try:
+                position, url = jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                response = get_page(session, url)
+                page = (position, response.text, response.url, None)
+            except Exception as error:  # reported in the url's place
+                page = (position, None, url, error)
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    workers = [
+        threading.Thread(target=fetch_worker, daemon=True)
+        for _ in range(min(fetch_workers, len(urls)))
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Parsing is bounded too, so pages don't pile up inside the process pool
+    parse_slots = threading.BoundedSemaphore(queue_size)
+    futures = [None] * len(urls)
+    results = [None] * len(urls)
+    try:
+        if parse_pool is None:
+            parse_pool = ProcessPoolExecutor(max_workers=parse_workers)
+        else:
+            parse_pool = contextlib.nullcontext(parse_pool)
+        with parse_pool as parse_pool:
+            for _ in urls:
+                position, text, url, error = pages.get()
+                if error is not None:
+                    results[position] = error
+                    continue
+                parse_slots.acquire()
+                futures[position] = parse_pool.submit(
+                    parser, text, url, *parser_args[position]
+                )
+                futures[position].add_done_callback(
+                    lambda _: parse_slots.release()
+                )
+            for position, future in enumerate(futures):
+                if future is not None:
+                    error = future.exception()
+                    results[position] = future.result() if error is None else error
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    failures = {
+        url: result for url, result in zip(urls, results)
+        if isinstance(result, Exception)
+    }
+    if failures:
+        raise FetchError(results, failures)
+    return results
@@ -0,0 +1,253 @@
+"""
+Saves and loads the cleaned tables as Parquet, falling back to CSV
+"""
+import operator
+import os
+import shutil
+import uuid
+from os.path import exists, join
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from src.constants import FLAT_FILE_DIR
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET = "parquet"
+CSV = "csv"
+# Partition keys save_table can split a table on; "month" is derived from date
+PARTITIONS = ("latest_set", "month")
+# Folder name Hive partitioning gives a missing partition value
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, values: column.isin(values),
+    "not in": lambda column, values: ~column.isin(values)
+}
+
+
+def default_format():
+    """Parquet when pyarrow is installed, otherwise CSV"""
+    return PARQUET if pyarrow is not None else CSV
+
+
+def add_month(table):
+    """Adds a 'YYYY-MM' month column from the date column"""
+    table["month"] = table["date"].dt.strftime("%Y-%m")
+
+
+def save_table(table, name, directory=FLAT_FILE_DIR, file_format=None, partition_by=None):
+    """
+    Writes a table to directory as name.parquet (or name.csv).
+    Parquet keeps categoricals and datetimes as they are. With partition_by
+    the Parquet file becomes a directory with one folder per value of that
+    key, so loads filtered on it only read the matching folders.
+    """
+    file_format = file_format or default_format()
+    os.makedirs(directory, exist_ok=True)
+    if file_format == CSV:
+        table.to_csv(join(directory, f"{name}.csv"), index=False)
+        return
+    if pyarrow is None:
+        raise ImportError("pyarrow is needed to write Parquet files")
+
+    table = arrow_ready(table)
+    path = join(directory, f"{name}.parquet")
+    # A rewrite replaces the old data rather than adding to it
+    remove_saved(path)
+    if partition_by is None:
+        table.to_parquet(path, index=False)
+        return
+    if partition_by not in PARTITIONS:
+        raise ValueError(f"Can only partition by one of {PARTITIONS}")
+    if partition_by == "month":
+        table = table.copy()
+        add_month(table)
+    pyarrow.parquet.write_to_dataset(
+        pyarrow.Table.from_pandas(table, preserve_index=False),
+        path,
+        partition_cols=[partition_by]
+    )
+
+
+def append_table(table, name, directory=FLAT_FILE_DIR, file_format=None, partition_by=None):
+    """
+    Adds rows to a saved table without rewriting what is already there.
+    The saved table's format and partitioning are kept; Parquet rows go in
+    a new part file per partition, cast to the saved schema. The parts are
+    written with write_table rather than write_to_dataset, whose legacy
+    writer in the pinned pyarrow cannot name them. A table that was never
+    saved is written with save_table.
+    """
+    try:
+        path = saved_path(name, directory)
+    except FileNotFoundError:
+        save_table(table, name, directory, file_format, partition_by)
+        return
+    if path.endswith(".csv"):
+        header = pd.read_csv(path, nrows=0).columns
+        table.reindex(columns=header).to_csv(path, mode="a", header=False, index=False)
+        return
+
+    if os.path.isfile(path):
+        # A single file becomes the first part of a directory of parts
+        temp_path = f"{path}.{uuid.uuid4().hex}"
+        os.replace(path, temp_path)
+        os.makedirs(path)
+        os.replace(temp_path, join(path, "part-0.parquet"))
+    partition_by = saved_partition(path)
+    table = arrow_ready(table)
+    if partition_by == "month":
+        table = table.copy()
+        add_month(table)
+    # Parts leave out the key their folder is named after
+    schema = pyarrow.parquet.read_schema(first_part(path))
+    if partition_by is None:
+        parts = [(path, table)]
+    else:
+        folders = partition_folders(path, partition_by)
+        parts = [
+            (folders.get(value) or join(path, f"{partition_by}={quote(value, safe='')}"), rows)
+            for value, rows in table.groupby(
+                table[partition_by].astype(object).fillna(NULL_PARTITION).astype(str),
+                sort=False
+            )
+        ]
+    for folder, rows in parts:
+        os.makedirs(folder, exist_ok=True)
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_pandas(
+                rows.reindex(columns=schema.names), schema=schema, preserve_index=False
+            ),
+            join(folder, f"part-{uuid.uuid4().hex}.parquet")
+        )
+
+
+def partition_folders(path, partition_by):
+    """Maps each saved value of the partition key to its folder"""
+    prefix = f"{partition_by}="
+    return {
+        unquote(entry[len(prefix):]): join(path, entry)
+        for entry in os.listdir(path)
+        if entry.startswith(prefix) and os.path.isdir(join(path, entry))
+    }
+
+
+def saved_partition(path):
+    """The key a Parquet directory is partitioned on, or None"""
+    for entry in os.listdir(path):
+        if os.path.isdir(join(path, entry)) and "=" in entry:
+            return entry.split("=", 1)[0]
+    return None
+
+
+def first_part(path):
+    """Any Parquet file under a directory of parts"""
+    for root, _, files in os.walk(path):
+        for file_name in sorted(files):
+            if file_name.endswith(".parquet"):
+                return join(root, file_name)
+    raise FileNotFoundError(f"No Parquet files in {path}")
+
+
+def arrow_ready(table):
+    """
+    Object columns mixing types (ranks that are partly numbers) cannot be
+    written to Parquet, so their values are saved as strings.
+    """
+    mixed = [
+        column for column in table.columns
+        if table[column].dtype == object
+        and table[column].dropna().map(type).nunique() > 1
+    ]
+    if not mixed:
+        return table
+    table = table.copy()
+    for column in mixed:
+        table[column] = table[column].map(lambda value: value if pd.isna(value) else str(value))
+    return table
+
+
+def load_table(name, directory=FLAT_FILE_DIR, columns=None, filters=None):
+    """
+    Reads a saved table, preferring Parquet.
+    columns limits the columns read. filters is a list of
+    (column, operator, value) tuples that must all hold, e.g.
+    [("latest_set", "==", "Kaldheim")]; Parquet skips partitions and row
+    groups that cannot match, CSV applies them after reading.
+    """
+    path = saved_path(name, directory)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = list(header)
+    if columns is not None:
+        filtered = [column for column, _, _ in filters or []]
+        wanted = [column for column in header if column in columns or column in filtered]
+    table = pd.read_csv(
+        path,
+        usecols=wanted,
+        parse_dates=["date"] if "date" in wanted else None
+    )
+    table = filter_table(table, filters)
+    if columns is not None:
+        table = table[list(columns)]
+    return table
+
+
+def saved_path(name, directory=FLAT_FILE_DIR):
+    """
+    The file (or partitioned directory) load_table reads for a table: the
+    more recently written of its Parquet and CSV copies, should both exist.
+    """
+    parquet_path = join(directory, f"{name}.parquet")
+    csv_path = join(directory, f"{name}.csv")
+    has_parquet = exists(parquet_path) and pyarrow is not None
+    has_csv = exists(csv_path)
+    if has_parquet and has_csv:
+        return max(parquet_path, csv_path, key=modified_at)
+    if has_parquet:
+        return parquet_path
+    if not has_csv:
+        raise FileNotFoundError(f"No saved {name} in {directory}")
+    return csv_path
+
+
+def remove_saved(path):
+    """Deletes a saved file or partitioned directory, if there is one"""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif exists(path):
+        os.remove(path)
+
+
+def modified_at(path):
+    """Latest modification time of a file, or of anything in a directory"""
+    latest = os.stat(path).st_mtime_ns
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            latest = max(latest, os.stat(join(root, file_name)).st_mtime_ns)
+    return latest
+
+
+def filter_table(table, filters):
+    """Keeps the rows matching every (column, operator, value) filter"""
+    if not filters:
+        return table
+    keep = pd.Series(True, index=table.index)
+    for column, op, value in filters:
+        keep &= FILTER_OPERATORS[op](table[column], value)
+    return table[keep].reset_index(drop=True)
@@ -0,0 +1,116 @@
+"""
+Browserless wrapper for traversing mtgtop8.com
+"""
+import lxml.html
+
+from src.session import make_session
+
+# Hidden input that mtgtop8's PageSubmit javascript fills in before posting
+PAGE_FIELD = "cp"
+
+
+class FormScraper:
+    """
+    HTTP-only stand in for the Selenium Scraper.
+    PageSubmit only sets the page number on the event table's form and
+    submits it, so the same post is made directly and the result is parsed
+    with lxml instead of a browser.
+    """
+
+    # Nothing is rendered, so there is nothing to wait for between pages
+    page_load_delay = 0
+
+    def __init__(self, url, session=None):
+        """Loads the first page"""
+        self.url = url
+        self._owns_session = session is None
+        self.session = make_session() if session is None else session
+        self.response = None
+        self.tree = None
+        self._load(self.session.get(self.url))
+
+    def __enter__(self):
+        """Enters the object as context manager"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Closes the session as context manager"""
+        if self._owns_session:
+            self.session.close()
+
+    def __repr__(self):
+        """String representation of page source"""
+        return self.response.text
+
+    def _load(self, response):
+        """Keeps the latest response and its parsed tree"""
+        response.raise_for_status()
+        self.response = response
+        self.tree = lxml.html.fromstring(response.text, base_url=response.url)
+        self.tree.make_links_absolute()
+
+    def get_title(self):
+        """Returns the title of a webpage"""
+        return self.tree.findtext(".//title")
+
+    def get_url(self):
+        """Returns the url of a webpage"""
+        return self.response.url
+
+    def get_by(self, element_type, selector):
+        """Returns a list with the first matching element, or an empty list"""
+        return self.get_all_by(element_type, selector)[:1]
+
+    def get_all_by(self, element_type, selector):
+        """Returns a list of all the elements of the given type."""
+        if element_type == "xpath":
+            found = self.tree.xpath(selector)
+        elif element_type == "css":
+            found = self.tree.cssselect(selector)
+        elif element_type == "id":
+            found = self.tree.xpath("//*[@id=$value]", value=selector)
+        elif element_type == "name":
+            found = self.tree.xpath("//*[@name=$value]", value=selector)
+        elif element_type == "class":
+            found = self.tree.find_class(selector)
+        else:
+            return None
+        return [Element(item) for item in found]
+
+    def execute(self, script, argument):
+        """Replays the form post that the named javascript function makes"""
+        if script != "PageSubmit":
+            raise ValueError(f"{script} is not supported without a browser")
+        self._load(self.page_submit(argument))
+
+    def page_submit(self, page):
+        """Posts the event table's form with the requested page number"""
+        forms = self.tree.xpath("//form[.//input[@name=$field]]", field=PAGE_FIELD)
+        if not forms:
+            return self.session.post(self.get_url(), data={PAGE_FIELD: page})
+        form = forms[0]
+        fields = dict(form.form_values())
+        fields[PAGE_FIELD] = page
+        action = form.action or self.get_url()
+        if (form.method or "GET").upper() == "POST":
+            return self.session.post(action, data=fields)
+        return self.session.get(action, params=fields)
+
+
+class Element:
+    """
+    Wraps an lxml element with the part of Selenium's WebElement API
+    used when reading the event table.
+    """
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def text(self):
+        """Visible text with whitespace collapsed, like a rendered element"""
+        return " ".join(self.element.text_content().split())
+
+    def get_attribute(self, name):
+        """Returns an attribute; links are already made absolute"""
+        return self.element.get(name)
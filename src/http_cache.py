@@ -0,0 +1,261 @@
+"""
+Persistent on-disk cache of raw scraper responses
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import requests
+
+from src.constants import HTTP_CACHE_DIR, SCRYFALL_CACHE_TTL
+from src.scheduler import ThrottledSession
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Published mtgtop8 event and deck pages never change
+IMMUTABLE = "immutable"
+# Scryfall data does change, so it is kept for a while then revalidated
+REVALIDATE = "revalidate"
+
+MTGTOP8_HOSTS = ("www.mtgtop8.com", "mtgtop8.com")
+SCRYFALL_HOSTS = ("api.scryfall.com",)
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a url that was never cached"""
+
+
+def cache_policy(url):
+    """Returns how a url is cached, or None if it should not be"""
+    parts = urlsplit(url)
+    if parts.hostname in MTGTOP8_HOSTS and parts.path == "/event":
+        return IMMUTABLE
+    if parts.hostname in SCRYFALL_HOSTS:
+        return REVALIDATE
+    return None
+
+
+def compress(data):
+    """Compresses a body, returning the codec name with it"""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor().compress(data)
+    return "zlib", zlib.compress(data)
+
+
+def decompress(codec, data):
+    """Reverses compress"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read this cache entry")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def wants_revalidation(headers):
+    """True when a request asks for Cache-Control: no-cache"""
+    return "no-cache" in (headers or {}).get("Cache-Control", "")
+
+
+class ResponseCache:
+    """
+    Response bodies are stored compressed under their sha256, so identical
+    pages share one blob, and a SQLite index maps each url to its blob and
+    the headers needed to rebuild and revalidate the response.
+    In offline mode every request is answered from the cache.
+    """
+
+    def __init__(self, path=HTTP_CACHE_DIR, ttl=SCRYFALL_CACHE_TTL, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        self.lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(path, "index.db"), check_same_thread=False
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                finalUrl TEXT,
+                encoding TEXT,
+                contentType TEXT,
+                etag TEXT,
+                lastModified TEXT,
+                fetchedAt REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def close(self):
+        """Closes the index"""
+        self._connection.close()
+
+    def blob_path(self, digest):
+        """Where a body with this digest lives on disk"""
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    def lookup(self, url):
+        """Returns the index row for a url as a dict, or None"""
+        with self.lock:
+            cursor = self._connection.execute(
+                "SELECT * FROM response WHERE url = ?", (url,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def load(self, entry):
+        """Rebuilds a requests Response from an index row"""
+        with open(self.blob_path(entry["digest"]), "rb") as blob:
+            content = decompress(entry["codec"], blob.read())
+        response = requests.Response()
+        response._content = content
+        response.status_code = 200
+        response.url = entry["finalUrl"]
+        response.encoding = entry["encoding"]
+        if entry["contentType"]:
+            response.headers["Content-Type"] = entry["contentType"]
+        response.from_cache = True
+        return response
+
+    def store(self, url, response):
+        """Saves a successful response's body and headers"""
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            codec, data = compress(content)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as blob:
+                blob.write(data)
+            os.replace(temp_path, path)
+        else:
+            codec = self.lookup_codec(digest)
+        with self.lock:
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO response (
+                    url, digest, codec, finalUrl, encoding, contentType,
+                    etag, lastModified, fetchedAt
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url, digest, codec, response.url, response.encoding,
+                    response.headers.get("Content-Type"),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    time.time()
+                )
+            )
+            self._connection.commit()
+
+    def lookup_codec(self, digest):
+        """Codec of an existing blob; blobs written before a codec change keep theirs"""
+        with self.lock:
+            row = self._connection.execute(
+                "SELECT codec FROM response WHERE digest = ? LIMIT 1", (digest,)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+        return "zstd" if zstandard is not None else "zlib"
+
+    def evict(self, url):
+        """
+        Forgets a url so its next fetch goes to the network, e.g. an
+        immutable page that turned out to be malformed. The body stays on
+        disk for any other url sharing it.
+        """
+        with self.lock:
+            self._connection.execute("DELETE FROM response WHERE url = ?", (url,))
+            self._connection.commit()
+
+    def touch(self, url):
+        """Marks a revalidated entry as fresh again"""
+        with self.lock:
+            self._connection.execute(
+                "UPDATE response SET fetchedAt = ? WHERE url = ?", (time.time(), url)
+            )
+            self._connection.commit()
+
+    def fetch(self, url, send, headers=None):
+        """
+        Answers a GET for url from the cache when its policy allows,
+        otherwise calls send(headers) and stores a successful result.
+        Cache-Control: no-cache forces a revalidation of mutable entries.
+        """
+        policy = cache_policy(url)
+        entry = self.lookup(url) if policy or self.offline else None
+        if self.offline:
+            if entry is None:
+                raise CacheMiss(url)
+            return self.load(entry)
+        if policy is None:
+            return send(headers)
+        if entry is not None:
+            if policy == IMMUTABLE or (
+                    time.time() - entry["fetchedAt"] < self.ttl
+                    and not wants_revalidation(headers)):
+                return self.load(entry)
+            headers = dict(headers or {})
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["lastModified"]:
+                headers["If-Modified-Since"] = entry["lastModified"]
+
+        response = send(headers)
+        if response.status_code == 304 and entry is not None:
+            self.touch(url)
+            return self.load(entry)
+        if response.status_code == 200:
+            self.store(url, response)
+        return response
+
+
+class CachedSession(ThrottledSession):
+    """Throttled session that answers GETs from a ResponseCache first"""
+
+    def __init__(self, scheduler, cache):
+        super().__init__(scheduler)
+        self.cache = cache
+
+    def request(self, method, url, *args, **kwargs):
+        if method.upper() != "GET" or args or kwargs.get("params"):
+            if self.cache.offline:
+                # Form posts and queries are never cached, so cannot be replayed
+                raise CacheMiss(url)
+            return super().request(method, url, *args, **kwargs)
+        headers = kwargs.pop("headers", None)
+
+        def send(these_headers):
+            return super(CachedSession, self).request(
+                method, url, headers=these_headers, **kwargs
+            )
+
+        return self.cache.fetch(url, send, headers)
+
+
+# One shared cache for live runs and one for offline replays
+_shared_caches = {}
+_shared_cache_lock = threading.Lock()
+
+
+def get_cache(offline=False):
+    """The cache shared by every session, opened on first use"""
+    with _shared_cache_lock:
+        if offline not in _shared_caches:
+            _shared_caches[offline] = ResponseCache(offline=offline)
+        return _shared_caches[offline]
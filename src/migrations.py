@@ -0,0 +1,53 @@
+"""
+Versioned schema migrations for the Sqlite database
+"""
+import os
+import re
+import sqlite3
+
+DBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dbs")
+DDL_FILE = os.path.join(DBS_DIR, "ddl.sql")
+MIGRATIONS_DIR = os.path.join(DBS_DIR, "migrations")
+
+MIGRATION_FILE = re.compile(r"^(\d+)_\w+\.sql$")
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Returns (version, path) for every migration file, oldest first"""
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = MIGRATION_FILE.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(directory, file_name)))
+    return sorted(migrations)
+
+
+def get_version(connection):
+    """The last migration applied to a database"""
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection, directory=MIGRATIONS_DIR, ddl_file=DDL_FILE):
+    """
+    Makes sure the base tables in ddl.sql exist, then applies every
+    migration newer than the database's user_version, each in its own
+    transaction. Returns the versions that were applied.
+    """
+    with open(ddl_file, "r") as ddl:
+        connection.executescript(ddl.read())
+
+    applied = []
+    for version, path in list_migrations(directory):
+        if version <= get_version(connection):
+            continue
+        with open(path, "r") as migration:
+            script = migration.read()
+        try:
+            connection.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -2,84 +2,128 @@
 Saving functionality for data scrapped from mtgtop8.com
 """
 import time
-import requests
-from bs4 import BeautifulSoup
+from collections import namedtuple
 
+from src.cards import (
+    SEARCH_URL,
+    card_row,
+    changed_sets,
+    ingest_bulk_data
+    )
 from src.constants import SETS, URL
-from src.scraper import Scraper
-from src.sqldb import query, commit
+from src.fetcher import CONCURRENCY, fetch_each
+from src.form_scraper import FormScraper
+from src.parsers import parse_event_page, parse_deck_page
+from src.pilots import PilotIndex
+from src.quarantine import QuarantinedPage, load, release, save
+from src.session import make_session
+from src.sqldb import (
+    SQLDatabase,
+    commit,
+    latest_event_links
+    )
 from src.data_assertions import (
+    MalformedPage,
+    check,
     is_up_to_date,
-    is_malformed,
-    is_a_link,
-    should_be_skipped,
-    is_points,
-    is_rank,
-    are_equal_length,
-    check_new_players
+    has_next_page,
+    are_equal_length
     )
+from src.work_queue import DECK, EVENT
+
+# Deck links on event pages are relative to this
+DECK_ROOT_URL = URL.replace("format?f=ST", "event")
 
-def update_events(url):
+# Stands in for a response when a saved page is parsed again
+SavedPage = namedtuple("SavedPage", ["text", "url"])
+
+def update_events(url, browser=False):
     """
     Gets a list from the Sqlite file with all the events from the most recent update.
     This list is used to determine how far the EventScraper object needs to go
     to get all the new events from mtgtop8. It then commits the new events to the Sqlite table.
+    Set browser to walk the event table with Selenium instead of plain form posts.
     """
-    currently_saved_events = query("event")
-    latest_events = list(
-        currently_saved_events.loc[
-            currently_saved_events["date"] == currently_saved_events["date"].max(
-            )
-        ]["link"]
-    )
-    scraper = EventScraper(url, latest_events)
+    latest_events = latest_event_links()
+    scraper = EventScraper(url, latest_events, browser=browser)
     new_events = scraper.update()
     commit(new_events, "event")
 
-def update_cards():
+def update_cards(bulk_data=None, incremental=True):
     """
-    Updates all the card definitions from scryfall.
-    This is a fresh update of all data every time it is run,
-    since older cards are not entirely static.
-    Run this sparingly - in the case of a new ban, a new set release, or rotation.
-
+    Updates the card definitions from scryfall.
+    Older cards are not entirely static, so by default every set is
+    searched and its card count and standard legal cards checked (see
+    cards.set_signatures), and only the cards of sets that are new or
+    changed are saved. Changed cards
+    replace the saved rows; unchanged ones are left alone.
+    Pass incremental=False to download every set.
+
+    Pass the path of a downloaded Scryfall bulk-data file (e.g. default_cards)
+    as bulk_data to stream the cards from it instead of searching each set.
     """
-    scraper = CardScraper()
-    new_cards = scraper.update()
-    commit(new_cards, "card")
-
-def update_decks_and_players():
+    if bulk_data is not None:
+        return ingest_bulk_data(bulk_data)
+    if not incremental:
+        scraper = CardScraper()
+        new_cards = scraper.update()
+        return commit(new_cards, "card")
+
+    with SQLDatabase() as sql_db, make_session(pool_size=CONCURRENCY) as this_session:
+        sets, signatures, rows = changed_sets(this_session, sql_db)
+        print(f"{len(sets)} card sets changed: {', '.join(sets)}")
+        counts = sql_db.union_events(rows, "card")
+        sql_db.save_card_set_signatures(signatures)
+    return counts
+
+def redrive_quarantine(db_name=None):
     """
-    Grabs the new data (where the event id is not in the deck table)
-    and makes a DeckPlayer scraper to retrieve it.
-    These two are combined because 'Players' and 'Decks' are scraped
-    from the same locaiton, at the same time.
+    Parses the quarantined pages again from their saved html, for after a
+    parser fix, without going back to mtgtop8. Pages that parse now have
+    their rows saved and leave the quarantine; the rest stay, with the
+    reason they still fail, whatever the error. The deck lists of
+    redriven events are fetched by the next scrape. Returns the number of
+    pages saved.
     """
-    currently_saved_events = query("event")
-    currently_saved_decks = query("deck")
-    currently_saved_players = query("pilot")
-    new_events = list(
-        currently_saved_events.loc[
-            ~(currently_saved_events["id"].isin(
-                currently_saved_decks["eventId"]))
-        ]["link"]
-    )
-    scraper = DeckPlayerScraper(new_events, currently_saved_players)
-    new_decks, new_players = scraper.update()
-    commit(new_players, "pilot")
-    commit(new_decks, "deck")
-
-def update_deck_lists():
-    """Gets all the new decks from recent update and scrapes the deck lists."""
-    currently_saved_decks = query("deck")
-    currently_saved_deck_lists = query("decklist")
-    new_links = currently_saved_decks.loc[
-        ~(currently_saved_decks["id"].isin(
-            currently_saved_deck_lists["deckId"]))
-    ]
-    scraper = DeckListScraper(new_links)
-    new_deck_lists = scraper.update()
-    commit(new_deck_lists, "decklist")
+    saved = 0
+    with SQLDatabase(db_name) as sql_db:
+        pilots = PilotIndex.from_table(sql_db.get_dataframe_from("pilot"))
+        pages = load(sql_db)
+        for page in pages:
+            new_players = []
+            try:
+                if page.kind == EVENT:
+                    decks, players = DeckPlayerScraper.parse_event(SavedPage(page.html, page.url))
+                    new_players = pilots.add_new(players)
+                    data_by_table = {"pilot": new_players, "deck": decks}
+                else:
+                    data_by_table = {
+                        "decklist": parse_deck_list(page.html, page.url, page.deck_id)
+                    }
+                with sql_db.transaction():
+                    release(sql_db, page.url)
+                    sql_db.union_tables(data_by_table)
+            except Exception as error:
+                # Any error, not just a malformed page, leaves this page
+                # quarantined without stopping the redrive of the rest
+                pilots.discard(new_players)
+                reason = str(error) if isinstance(error, MalformedPage) else repr(error)
+                print(f"Still failing {page.url}: {reason}")
+                save(sql_db, page._replace(reason=reason))
+                continue
+            saved += 1
+    print(f"Saved {saved} of {len(pages)} quarantined pages")
+    return saved
+
+def create_scraper(url, browser=False):
+    """
+    Factory for the object used to page through mtgtop8's event table.
+    Selenium is only imported when a browser is asked for.
+    """
+    if browser:
+        from src.Scraper import Scraper
+        return Scraper(url)
+    return FormScraper(url)
 
 def get_page(scraper):
     """Gets the page data from mtgtop8"""
@@ -96,79 +140,15 @@ def get_page(scraper):
         for event, date in zip(events, dates)
     ]
 
-def get_winners(body):
-    """
-    Gets first place deck/pilot; mtgtop8 has different tags for the winner
-    when you navigate to a new event page
-    """
-    try:
-        winner_rank = body.find_all("div", class_="W12")[1].text
-        winner_name = body.find_all("div", class_="W14")[0].find("a").text
-        winner_link = body.find_all("div", class_="W14")[
-            0].find("a").get("href")
-    except (IndexError, AttributeError):
-        winner_rank = body.find_all("div", class_="W14")[0].text
-        winner_name = body.find_all("div", class_="W14")[1].find("a").text
-        winner_link = body.find_all("div", class_="W14")[
-            1].find("a").get("href")
-    return [winner_name], [winner_rank], [winner_link]
-
-def get_players(body, names):
-    """Gets all the players from the page"""
-    result = []
-    for player in body.find_all("div", class_="G11")[:len(names)]:
-        result.append(player.find("a").text)
-    return result
-
-def add_other_decks(body, has_points=False):
-    """Gets the rest of the deck/pilot data from the event page"""
-    names = []
-    ranks = []
-    links = []
-    if has_points:
-        for name in body.find_all("div", class_="S14")[:-3]:
-            assert not is_malformed(
-                name.text), "Bad name - " + name.text
-            names.append(name.text.strip())
-            this_link = name.find("a").get("href")
-            assert is_a_link(this_link), "Bad link - " + this_link
-            links.append(this_link)
-        for points in body.find_all("div", class_="S12"):
-            if not should_be_skipped(points.text):
-                assert is_points(points.text), "Malformed Points " + \
-                    points.text
-                ranks.append(points.text.strip())
-    else:
-        for idx, result in enumerate(body.find_all("div", class_="S14")[:-3]):
-            if idx % 2 == 0:
-                if not is_rank(result.text):
-                    break
-                ranks.append(result.text.strip())
-            else:
-                assert not is_malformed(
-                    result.text), "Bad name - " + result.text
-                names.append(result.text.strip())
-                this_link = result.find("a").get("href")
-                assert is_a_link(
-                    this_link), "Bad link - " + this_link
-                links.append(this_link)
-    return names, ranks, links
-
-def get_html_body(session, link):
-    """Get data from link's html"""
-    html = session.get(link)
-    soup = BeautifulSoup(html.text, features="lxml")
-    return soup.body, html.url
-
-def get_json_body(session, url):
+def get_json_body(session, url, headers=None):
     "Gets data from link's json response"
-    response = session.get(url)
+    response = session.get(url, headers=headers)
     json = response.json()
     data = json["data"]
 
     while json["has_more"]:
         next_page = json["next_page"]
-        response = session.get(next_page)
+        response = session.get(next_page, headers=headers)
         json = response.json()
         data.extend(json["data"])
 
@@ -189,28 +169,41 @@ class PageScraper:
 class EventScraper(PageScraper):
     """Handles updating Events"""
 
-    def __init__(self, url, latest_events):
+    def __init__(self, url, latest_events, browser=False):
         self.url = url
         self.latest_events = latest_events
+        self.browser = browser
 
     def update(self):
         """Traverse the mtgtop8 page and get new events."""
-        with Scraper(self.url) as scraper:
-            page = 0
+        result = []
+        for events in self.iter_pages():
+            result.extend(events)
+        return result
+
+    def iter_pages(self):
+        """
+        Yields the events on each page of the event table as soon as it is
+        read, stopping once a page reaches the latest saved events.
+        """
+        with create_scraper(self.url, self.browser) as scraper:
+            # mtgtop8 numbers the event table's pages from 1, the one loaded first
+            page = 1
             result = get_page(scraper)
-            next_page = True
-            up_to_date = False
+            yield list(result)
+            next_page = has_next_page(str(scraper), page)
+            up_to_date = self.check_previous(result)
             while next_page and not up_to_date:
                 print("Updating next page...")
                 page += 1
-                #TODO: Change this to find href of final href in navigation string.
                 scraper.execute("PageSubmit", page)
-                time.sleep(2)
-                result.extend(get_page(scraper))
-                time.sleep(2)
-                next_page = "Nav_PN_no>Prev" not in str(scraper)
+                time.sleep(scraper.page_load_delay)
+                events = get_page(scraper)
+                result.extend(events)
+                yield events
+                time.sleep(scraper.page_load_delay)
+                next_page = has_next_page(str(scraper), page)
                 up_to_date = self.check_previous(result)
-            return result
 
     def check_previous(self, new_data):
         """
@@ -221,157 +214,81 @@ class EventScraper(PageScraper):
 
 
 class DeckPlayerScraper(PageScraper):
-    """Handles updating Deck and Pilot"""
-
-    def __init__(self, new_events, currently_saved_players):
-        self.new_events = new_events
-        self.currently_saved_players = currently_saved_players
-
-    def update(self):
-        result = []
-        new_players = []
-        with requests.Session() as this_session:
-            for link in self.new_events:
-                print("updating " + link)
-                body, url = get_html_body(this_session, link)
-
-                names, ranks, links = get_winners(body)
-
-                has_points = False
-                if is_points(ranks[0]):
-                    has_points = True
-
-                other_names, other_ranks, other_links = add_other_decks(
-                    body, has_points)
-                names.extend(other_names)
-                ranks.extend(other_ranks)
-                links.extend(other_links)
-
-                players = get_players(body, names)
-                new_players.extend(self.check_previous(players))
-
-                assert are_equal_length(names, ranks, players), \
-                    "names: " + str(len(names)) \
-                    + ", ranks: " + str(len(ranks)) \
-                    + ", players: " + str(len(players)) \
-                    + ", links: " + str(len(links)) \
-                    + " at " + url
-                assert are_equal_length(
-                    list(zip(names, ranks, players, links)), names, ranks, players, links)
-
-                result.extend(
-                    [
-                        (url, player, link, name, rank)
-                        for (player, link, name, rank)
-                        in zip(players, links, names, ranks)
-                    ]
-                )
-
-            return result, new_players
+    """
+    Handles updating Deck and Pilot; the pipeline fetches the event pages
+    and saves what parse_event reads from them
+    """
 
-    def check_previous(self, new_data):
+    @staticmethod
+    def parse_event(page):
         """
-        Returns players that are not new list of players.
+        Returns the (event url, player, deck link, deck name, rank) rows and
+        the players of one fetched event page.
+        Raises MalformedPage when the page cannot be read.
         """
-        return check_new_players(new_data, self.currently_saved_players)
+        url = page.url
+        try:
+            names, ranks, links, players = parse_event_page(page.text)
+        except (IndexError, AttributeError) as error:
+            raise MalformedPage(f"Missing deck or pilot tags - {error} at {url}") from error
+
+        check(are_equal_length(names, ranks, players, links),
+              "names: " + str(len(names))
+              + ", ranks: " + str(len(ranks))
+              + ", players: " + str(len(players))
+              + ", links: " + str(len(links))
+              + " at " + url)
+
+        decks = [
+            (url, player, link, name, rank)
+            for (player, link, name, rank)
+            in zip(players, links, names, ranks)
+        ]
+        return decks, players
 
 class CardScraper(PageScraper):
     """Handles updating Card table from Scryfall"""
 
-    def __init__(self):
+    def __init__(self, sets=SETS, concurrency=CONCURRENCY):
         # Definition of all the sets to capture
-        self.sets = SETS
+        self.sets = sets
+        # Sets fetched at once; the scheduler still holds Scryfall to its rate
+        self.concurrency = concurrency
 
     def update(self):
-        card_table = []
-        with requests.Session() as this_session:
-            for card_set in self.sets:
-                set_url = (
-                    "https://api.scryfall.com/cards/search?order=set&unique=prints&q=set%3A"
-                    + f"'{card_set}'+lang%3A'en'"
-                )
-
-                card_data = get_json_body(this_session, set_url)
-
-                for card in card_data:
-                    this_card = (
-                        card["collector_number"],
-                        card["set"],
-                        card["name"],
-                        int(card["cmc"]),
-                        "".join(card["color_identity"]),
-                        card["legalities"]["standard"]
-                    )
-
-                    # Oracle text & Mana costs are different for cards with two faces...
-                    try:
-                        oracle_text = card["oracle_text"]
-                    except KeyError:
-                        oracle_text = " // ".join(face["oracle_text"]
-                                                  for face in card["card_faces"])
-
-                    try:
-                        mana_cost = card["mana_cost"]
-                    except KeyError:
-                        mana_cost = " // ".join(face["mana_cost"]
-                                                for face in card["card_faces"])
-                        if mana_cost == " // ":
-                            mana_cost = ""
-
-                    try:
-                        image_uri = card["image_uris"]["normal"]
-                    except KeyError:
-                        image_uri = " // ".join([face["image_uris"]["normal"] for face in card["card_faces"]])
-
-                    this_card += (oracle_text, mana_cost, image_uri)
-                    card_table.append(this_card)
+        """
+        Fetches the sets concurrently, each following its own next_page
+        chain in order, and returns the rows in set order then page order.
+        """
+        card_data = fetch_each(self.sets, self.get_set, self.concurrency)
 
+        card_table = []
+        for this_set in card_data:
+            card_table.extend(card_row(card) for card in this_set)
         return card_table
 
+    def get_set(self, session, card_set):
+        """Every page of one set's search results"""
+        return get_json_body(session, SEARCH_URL.format(card_set))
 
-class DeckListScraper(PageScraper):
-    """Handles updating DeckList"""
 
-    def __init__(self, new_links):
-        self.new_links = new_links
-        root_url = URL.replace("format?f=ST", "event")
-        self.urls = root_url + self.new_links["deckUrl"]
+def parse_deck_list(text, deck_url, deck_id):
+    """
+    Parses a deck page's html; module level so it can run in another process.
+    Raises MalformedPage when the page cannot be read.
+    """
+    try:
+        return parse_deck_page(text, deck_url, deck_id)
+    except (IndexError, AttributeError, TypeError) as error:
+        raise MalformedPage(f"Missing card tags - {error} at {deck_url}") from error
 
-    def update(self):
-        assert len(list(self.new_links["id"])) == len(
-            self.urls), "Mismatched list of decks to urls"
-        deck_lists = []
-        with requests.Session() as this_session:
-            for url, deck_id in zip(self.urls, self.new_links["id"]):
-                deck_list_body, deck_url = get_html_body(this_session, url)
-
-                for item in deck_list_body.find_all("td", class_="G14"):
-                    this_card = item.text.strip().split(maxsplit=1)
-                    count = this_card[0]
-                    assert count.isdigit(), "Count is not a digit - " + \
-                        deck_url + " - " + this_card
-
-                    this_id = item.find_all("span", class_="L14")[
-                        0].get("id")[:-2]
-                    slot = this_id[:2]
-                    set_name = this_id[2:5]
-                    collector_number = this_id[5:]
-                    if set_name == "10m":
-                        set_name = "m10"
-                    if set_name == "11m":
-                        set_name = "m11"
-                    if set_name == "12m":
-                        set_name = "m12 "
-                    if set_name == "13m":
-                        set_name = "m13"
-                    if set_name == "14m":
-                        set_name = "m14"
-                    if set_name == "15m":
-                        set_name = "m15"
-
-                    card_name = item.find_all("span", class_="L14")[0].text
-                    deck_lists.append(
-                        (collector_number+set_name, deck_id, count, slot, card_name )
-                    )
-
-        return deck_lists
+def parse_deck_list_checked(text, deck_url, deck_id):
+    """
+    Parses a deck page's html, returning a QuarantinedPage instead of
+    raising when it is malformed, so one bad page in a process pool does
+    not stop the rest.
+    """
+    try:
+        return parse_deck_list(text, deck_url, deck_id)
+    except MalformedPage as error:
+        return QuarantinedPage(deck_url, DECK, deck_id, str(error), text)
@@ -0,0 +1,148 @@
+"""
+Single pass lxml extraction of event and deck pages from mtgtop8.com
+"""
+import lxml.html
+
+from src.data_assertions import (
+    check,
+    is_malformed,
+    is_a_link,
+    should_be_skipped,
+    is_points,
+    is_rank
+    )
+
+# The only classes read from an event page
+EVENT_CLASSES = ("W12", "W14", "S14", "S12", "G11")
+
+
+def parse_html(text):
+    """Builds an lxml tree from a page's text"""
+    try:
+        return lxml.html.document_fromstring(text)
+    except ValueError:
+        # lxml refuses str input that still carries an encoding declaration
+        return lxml.html.document_fromstring(text.encode("utf-8"))
+
+
+def collect_classes(tree, tag, classes):
+    """
+    Walks the tree once and returns {class: [elements]} for every element
+    of the given tag carrying one of the classes, in document order.
+    """
+    found = {name: [] for name in classes}
+    for element in tree.iter(tag):
+        for name in (element.get("class") or "").split():
+            if name in found:
+                found[name].append(element)
+    return found
+
+
+def text_of(element):
+    """Text of an element and its children, like BeautifulSoup's .text"""
+    return element.text_content()
+
+
+def first_link(element):
+    """First <a> under an element; fails like BeautifulSoup when there is none"""
+    link = element.find(".//a")
+    if link is None:
+        raise AttributeError("No link found")
+    return link
+
+
+def parse_event_page(text):
+    """
+    Reads the deck names, ranks, deck links and players from an event page
+    in one pass, as (names, ranks, links, players).
+    """
+    classes = collect_classes(parse_html(text), "div", EVENT_CLASSES)
+    names, ranks, links = get_winners(classes)
+    has_points = bool(is_points(ranks[0]))
+    other_names, other_ranks, other_links = add_other_decks(classes, has_points)
+    names.extend(other_names)
+    ranks.extend(other_ranks)
+    links.extend(other_links)
+    players = [
+        text_of(first_link(player)) for player in classes["G11"][:len(names)]
+    ]
+    return names, ranks, links, players
+
+
+def get_winners(classes):
+    """First place deck/pilot; the winner has its own tags on an event page"""
+    try:
+        winner_rank = text_of(classes["W12"][1])
+        winner = first_link(classes["W14"][0])
+    except (IndexError, AttributeError):
+        winner_rank = text_of(classes["W14"][0])
+        winner = first_link(classes["W14"][1])
+    return [text_of(winner)], [winner_rank], [winner.get("href")]
+
+
+def add_other_decks(classes, has_points=False):
+    """The rest of the deck/pilot data from an event page"""
+    names = []
+    ranks = []
+    links = []
+    if has_points:
+        for name in classes["S14"][:-3]:
+            name_text = text_of(name)
+            check(not is_malformed(name_text), "Bad name - " + name_text)
+            names.append(name_text.strip())
+            this_link = first_link(name).get("href")
+            check(is_a_link(this_link), "Bad link - " + this_link)
+            links.append(this_link)
+        for points in classes["S12"]:
+            points_text = text_of(points)
+            if not should_be_skipped(points_text):
+                check(is_points(points_text), "Malformed Points " + points_text)
+                ranks.append(points_text.strip())
+    else:
+        for idx, result in enumerate(classes["S14"][:-3]):
+            result_text = text_of(result)
+            if idx % 2 == 0:
+                if not is_rank(result_text):
+                    break
+                ranks.append(result_text.strip())
+            else:
+                check(not is_malformed(result_text), "Bad name - " + result_text)
+                names.append(result_text.strip())
+                this_link = first_link(result).get("href")
+                check(is_a_link(this_link), "Bad link - " + this_link)
+                links.append(this_link)
+    return names, ranks, links
+
+
+# mtgtop8 writes core set codes backwards. "m12 " keeps the trailing space
+# that existing rows and maps.json's broken_code_map were saved with.
+SET_CODE_FIXES = {
+    "10m": "m10",
+    "11m": "m11",
+    "12m": "m12 ",
+    "13m": "m13",
+    "14m": "m14",
+    "15m": "m15"
+}
+
+
+def parse_deck_page(text, deck_url, deck_id):
+    """
+    Reads the (cardId, deckId, count, slot, cardName) rows from a deck page.
+    """
+    deck_list = []
+    for item in collect_classes(parse_html(text), "td", ("G14",))["G14"]:
+        this_card = text_of(item).strip().split(maxsplit=1)
+        count = this_card[0]
+        check(count.isdigit(), "Count is not a digit - " +
+              deck_url + " - " + str(this_card))
+
+        card_span = collect_classes(item, "span", ("L14",))["L14"][0]
+        this_id = card_span.get("id")[:-2]
+        slot = this_id[:2]
+        set_name = SET_CODE_FIXES.get(this_id[2:5], this_id[2:5])
+        collector_number = this_id[5:]
+        deck_list.append(
+            (collector_number + set_name, deck_id, count, slot, text_of(card_span))
+        )
+    return deck_list
@@ -0,0 +1,66 @@
+"""
+Pilot name normalization and the set of pilots already known to a scrape
+"""
+
+
+def split_name(name):
+    """
+    Splits a scraped pilot name into [firstName, lastName] the way it is
+    stored, collapsing runs of whitespace first. A single token (an Arena
+    handle) gets an empty lastName, matching the pilot table's default.
+    """
+    parts = " ".join(name.split()).split(" ", 1)
+    if len(parts) == 1:
+        parts.append("")
+    return parts
+
+
+def pilot_key(first_name, last_name):
+    """The identity of a pilot: the normalized full name"""
+    return " ".join(f"{first_name or ''} {last_name or ''}".split())
+
+
+class PilotIndex:
+    """
+    Hashed set of the pilots saved so far, built once per scrape and
+    extended as new pilots are found, so a pilot seen at many events is
+    only returned as new the first time.
+    """
+
+    def __init__(self, saved=()):
+        self.known = {pilot_key(first_name, last_name) for first_name, last_name in saved}
+
+    @classmethod
+    def from_table(cls, pilot_table):
+        """Builds the index from a pilot table DataFrame"""
+        return cls(
+            zip(
+                pilot_table["firstName"].fillna(""),
+                pilot_table["lastName"].fillna("")
+            )
+        )
+
+    def __contains__(self, name):
+        return pilot_key(*split_name(name)) in self.known
+
+    def __len__(self):
+        return len(self.known)
+
+    def add_new(self, players):
+        """
+        Returns [firstName, lastName] for each player not seen before, in
+        page order, and remembers them.
+        """
+        new_players = []
+        for player in players:
+            first_name, last_name = split_name(player)
+            key = pilot_key(first_name, last_name)
+            if key not in self.known:
+                self.known.add(key)
+                new_players.append([first_name, last_name])
+        return new_players
+
+    def discard(self, players):
+        """Forgets [firstName, lastName] pairs whose insert did not happen"""
+        for first_name, last_name in players:
+            self.known.discard(pilot_key(first_name, last_name))
@@ -0,0 +1,296 @@
+"""
+Streams new events into the deck scraper and new decks into the deck list
+scraper through the persistent scrape queue, committing each page's rows
+as soon as it is parsed
+"""
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.data_assertions import MalformedPage
+from src.fetcher import CONCURRENCY, QUEUE_SIZE, FetchError, fetch_all, fetch_and_parse
+from src.models import (
+    DECK_ROOT_URL,
+    DeckPlayerScraper,
+    EventScraper,
+    parse_deck_list_checked
+    )
+from src.pilots import PilotIndex
+from src.quarantine import QuarantinedPage, save_all
+from src.session import make_session
+from src.sqldb import CONNECTIONS, SQLDatabase
+from src.work_queue import (
+    DECK,
+    EVENT,
+    EXHAUSTED,
+    FAILED,
+    QUARANTINED,
+    RETRY_BASE,
+    WorkQueue
+    )
+
+# Event pages fetched at once, and claimed from the queue at a time
+EVENT_WORKERS = 4
+# Deck pages fetched at once
+DECK_LIST_WORKERS = CONCURRENCY
+# Deck pages claimed from the queue at a time, enough to keep the
+# fetch threads and parse processes busy together
+DECK_LIST_BATCH = QUEUE_SIZE
+# How long an idle worker waits before looking for due work again
+POLL_SECONDS = 0.1
+# Once nothing more can be queued, how far ahead a worker waits for a
+# failed page to fall due before leaving it to a later run, in seconds
+RETRY_WINDOW = 2 * 60
+
+
+class Pipeline:
+    """
+    Runs the three scrape stages at the same time, joined by the scrape
+    queue: every page of new events is committed and its events queued for
+    the event stage, and every event's decks are committed and queued for
+    the deck list stage. Each stage claims a batch of due pages at a time;
+    event pages are fetched with fetch_all and deck pages with
+    fetch_and_parse, which parses them on a process pool.
+    Each page's rows are saved in the transaction that marks it done, so a
+    run that dies loses nothing committed and the next run carries on with
+    what is still pending, plus anything an earlier run left in flight.
+    A page that fails is marked failed and retried after a backoff: by
+    this run if it falls due within retry_window of the last page being
+    queued, otherwise by a later run. A page
+    the parsers reject is quarantined with its html instead, and a page
+    that fails on its last attempt is exhausted.
+    With streaming off each stage finishes before the next one starts,
+    still committing page by page. Offline, the event table is not read
+    and the queued pages are replayed from the response cache; pages it
+    does not hold fail and wait for an online run.
+    """
+
+    def __init__(self, url, browser=False, event_workers=EVENT_WORKERS,
+                 deck_list_workers=DECK_LIST_WORKERS, parse_workers=None, db_name=None,
+                 retry_base=RETRY_BASE, retry_window=RETRY_WINDOW, streaming=True, offline=False):
+        self.url = url
+        self.browser = browser
+        self.streaming = streaming
+        self.offline = offline
+        self.event_workers = event_workers
+        self.deck_list_workers = deck_list_workers
+        self.parse_workers = parse_workers
+        self.db_name = db_name
+        self.queue = WorkQueue(db_name, retry_base=retry_base)
+        self.retry_window = retry_window
+
+        self.events_read = threading.Event()
+        self.events_scraped = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {"event": 0, "pilot": 0, "deck": 0, "decklist": 0}
+        self.pilots = None
+        self.session = None
+        self.parse_pool = None
+
+    def run(self):
+        """Scrapes everything new; returns the rows inserted per table"""
+        start = time.perf_counter()
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Resuming {recovered} pages left in flight by an earlier run")
+        with SQLDatabase(self.db_name) as sql_db:
+            self.pilots = PilotIndex.from_table(sql_db.get_dataframe_from("pilot"))
+            leftover_events = sql_db.get_events_without_decks()
+            leftover_decks = sql_db.get_decks_without_lists()
+        # Work saved before the queue existed, or lost between two commits
+        self.queue.add(EVENT, leftover_events)
+        self.queue.add(DECK, DECK_ROOT_URL + leftover_decks["deckUrl"], leftover_decks["id"])
+
+        with make_session(pool_size=self.event_workers + self.deck_list_workers,
+                          offline=self.offline) as session, \
+                ProcessPoolExecutor(max_workers=self.parse_workers) as parse_pool:
+            self.session = session
+            self.parse_pool = parse_pool
+            event_stage = self.start_events() if self.streaming else None
+            deck_list_stage = self.start_deck_lists() if self.streaming else None
+            try:
+                self.read_events()
+            finally:
+                self.events_read.set()
+                if not self.streaming:
+                    event_stage = self.start_events()
+                event_stage.join()
+                self.events_scraped.set()
+                if not self.streaming:
+                    deck_list_stage = self.start_deck_lists()
+                deck_list_stage.join()
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Pipeline added {self.counts['event']} events, {self.counts['deck']} decks "
+            f"and {self.counts['decklist']} deck list rows in {elapsed:.1f}s"
+        )
+        states = self.queue.counts()
+        if states.get(FAILED):
+            print(f"{states[FAILED]} pages failed and are queued to be retried")
+        if states.get(EXHAUSTED):
+            print(
+                f"{states[EXHAUSTED]} pages failed {self.queue.max_attempts} times and were "
+                "given up on; run main.py --retry-exhausted to queue them again"
+            )
+        if states.get(QUARANTINED):
+            print(f"{states[QUARANTINED]} malformed pages are quarantined for a redrive")
+        return self.counts
+
+    def start_events(self):
+        """Starts the event stage"""
+        return self.start(EVENT, self.scrape_events, self.events_read, self.event_workers)
+
+    def start_deck_lists(self):
+        """Starts the deck list stage"""
+        return self.start(DECK, self.scrape_deck_lists, self.events_scraped, DECK_LIST_BATCH)
+
+    def start(self, kind, scrape, upstream_done, batch_size):
+        """Starts a thread draining one kind of page from the queue"""
+        thread = threading.Thread(
+            target=self.drain, args=(kind, scrape, upstream_done, batch_size), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def drain(self, kind, scrape, upstream_done, batch_size):
+        """
+        Scrapes queued pages of a kind, a batch at a time, until nothing
+        more can be queued and no failed page falls due within the retry
+        window
+        """
+        try:
+            while True:
+                finished = upstream_done.is_set()
+                items = self.queue.claim_batch(kind, batch_size)
+                if not items:
+                    if not self.wait(kind, finished):
+                        return
+                    continue
+                scrape(items)
+        finally:
+            CONNECTIONS.close_thread()
+
+    def wait(self, kind, finished):
+        """
+        Sleeps until more work of a kind may be due. Returns False instead
+        when upstream is finished and nothing falls due within the window.
+        """
+        if not finished:
+            time.sleep(POLL_SECONDS)
+            return True
+        due = self.queue.next_due(kind)
+        if due is None or due > time.time() + self.retry_window:
+            return False
+        time.sleep(max(POLL_SECONDS, due - time.time()))
+        return True
+
+    def count(self, counts):
+        """Adds union_tables' inserted counts to the run's totals"""
+        with self.lock:
+            for table, (inserted, _) in counts.items():
+                self.counts[table] += inserted
+
+    def event_pages(self):
+        """Pages of (name, link, date) rows from mtgtop8's event table"""
+        with SQLDatabase(self.db_name) as sql_db:
+            latest_events = sql_db.get_latest_event_links()
+        return EventScraper(self.url, latest_events, browser=self.browser).iter_pages()
+
+    def read_events(self):
+        """Commits each page of events and queues the ones without decks"""
+        if self.offline:
+            # The event table is a form post, which the cache cannot replay
+            print("Offline: replaying the queued pages without reading the event table")
+            return
+        for events in self.event_pages():
+            with SQLDatabase(self.db_name) as sql_db:
+                counts = sql_db.union_tables({"event": events})
+                links = sql_db.get_events_without_decks(link for _, link, _ in events)
+            self.count(counts)
+            self.queue.add(EVENT, links)
+
+    def scrape_events(self, items):
+        """Fetches a batch of event pages together and saves each one"""
+        try:
+            pages = fetch_all([item.url for item in items], self.event_workers, self.session)
+        except FetchError as error:
+            pages = error.results
+        for item, page in zip(items, pages):
+            self.attempt(item, self.save_event, page)
+
+    def scrape_deck_lists(self, items):
+        """
+        Fetches a batch of deck pages while the process pool parses them,
+        then saves each one
+        """
+        try:
+            deck_lists = fetch_and_parse(
+                [item.url for item in items],
+                parse_deck_list_checked,
+                [(item.deck_id,) for item in items],
+                fetch_workers=self.deck_list_workers,
+                parse_pool=self.parse_pool,
+                session=self.session
+            )
+        except FetchError as error:
+            deck_lists = error.results
+        for item, deck_list in zip(items, deck_lists):
+            self.attempt(item, self.save_deck_list, deck_list)
+
+    def attempt(self, item, save, result):
+        """
+        Saves what was fetched for an item, or marks it failed when that, or
+        the fetch, raised, rather than stopping the run
+        """
+        try:
+            if isinstance(result, Exception):
+                raise result
+            save(item, result)
+        except Exception as error:
+            print(f"Failed {item.url} (attempt {item.attempts}): {error!r}")
+            self.queue.fail(item, error)
+
+    def save_event(self, item, page):
+        """Saves an event's pilots and decks, then queues the decks"""
+        try:
+            decks, players = DeckPlayerScraper.parse_event(page)
+        except MalformedPage as error:
+            self.quarantine(QuarantinedPage(item.url, EVENT, None, str(error), page.text))
+            return
+        new_players = self.pilots.add_new(players)
+        try:
+            counts = self.queue.complete(item, {"pilot": new_players, "deck": decks})
+        except Exception:
+            self.pilots.discard(new_players)
+            raise
+        self.count(counts)
+        with SQLDatabase(self.db_name) as sql_db:
+            new_decks = sql_db.get_decks_without_lists(event_link=page.url)
+        self.queue.add(DECK, DECK_ROOT_URL + new_decks["deckUrl"], new_decks["id"])
+
+    def save_deck_list(self, item, deck_list):
+        """Saves one parsed deck's rows, or quarantines its rejected page"""
+        if isinstance(deck_list, QuarantinedPage):
+            self.quarantine(deck_list._replace(url=item.url))
+            return
+        self.count(self.queue.complete(item, {"decklist": deck_list}))
+
+    def quarantine(self, page):
+        """Sets a malformed page aside with its html, out of the queue"""
+        print(f"Quarantined {page.url}: {page.reason}")
+        save_all([page], self.db_name)
+        # A cached page is never fetched again, so the next scrape after a
+        # parser fix would see the same html; offline the copy is all there is
+        cache = getattr(self.session, "cache", None)
+        if cache is not None and not cache.offline:
+            cache.evict(page.url)
+
+
+def run_pipeline(url, browser=False, **kwargs):
+    """
+    Streams every new event, deck and deck list from mtgtop8 into the
+    database; pass streaming=False to run the stages one after another,
+    or offline=True to replay the queued pages from the response cache
+    """
+    return Pipeline(url, browser=browser, **kwargs).run()
@@ -0,0 +1,34 @@
+"""
+Wall time and peak memory reports for pipeline stages
+"""
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; stages then report time only
+    resource = None
+
+
+def peak_rss_mb():
+    """The process's peak resident set size so far in MB, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+@contextlib.contextmanager
+def stage(name, report=print):
+    """Reports how long the block took and the peak RSS at its end"""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    memory = f", peak RSS {peak:.0f} MB" if peak is not None else ""
+    report(f"{name}: {elapsed:.2f}s{memory}")
@@ -0,0 +1,44 @@
+"""
+Pages the parsers rejected, kept in the Sqlite database with their html
+until a parser fix lets them be saved
+"""
+from collections import namedtuple
+
+from src.sqldb import SQLDatabase
+from src.work_queue import DONE, QUARANTINED
+
+QuarantinedPage = namedtuple("QuarantinedPage", ["url", "kind", "deck_id", "reason", "html"])
+
+
+def save(sql_db, page):
+    """
+    Stores a rejected page, replacing any earlier copy of it, and takes it
+    out of the scrape queue, in one transaction or the caller's.
+    """
+    with sql_db.transaction():
+        sql_db.save_quarantined_page(page.url, page.kind, page.deck_id, page.reason, page.html)
+        sql_db.set_queue_state(page.url, QUARANTINED, page.reason)
+
+
+def save_all(pages, db_name=None):
+    """Stores rejected pages in one transaction"""
+    if not pages:
+        return
+    with SQLDatabase(db_name) as sql_db, sql_db.transaction():
+        for page in pages:
+            save(sql_db, page)
+
+
+def load(sql_db, kind=None):
+    """Returns the quarantined pages, of one kind or all of them, oldest first"""
+    return [QuarantinedPage(*row) for row in sql_db.get_quarantined_pages(kind)]
+
+
+def release(sql_db, url):
+    """
+    Drops a page whose rows have now been saved from the quarantine and
+    marks it done in the scrape queue, in one transaction or the caller's.
+    """
+    with sql_db.transaction():
+        sql_db.delete_quarantined_page(url)
+        sql_db.set_queue_state(url, DONE, from_state=QUARANTINED)
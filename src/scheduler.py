@@ -0,0 +1,157 @@
+"""
+Per-host rate limiting and retries shared by every scraper
+"""
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from src.constants import REQUESTS_PER_SECOND
+
+# Responses worth trying again; anything else is handed back as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1
+BACKOFF_CAP = 60
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket; each request takes one token and tokens
+    refill at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then takes it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(
+                    self.paused_until - now,
+                    (1 - self.tokens) / self.rate
+                )
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Holds every caller back for a while, e.g. after a 429"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RequestScheduler:
+    """
+    Sends requests through a token bucket per host and retries throttled
+    or failed requests with exponential backoff and full jitter.
+    Hosts without a configured budget are not limited.
+    """
+
+    def __init__(self, rates=None, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP):
+        self.rates = dict(REQUESTS_PER_SECOND if rates is None else rates)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def set_rate(self, host, requests_per_second):
+        """Changes the budget for a host; None removes the limit"""
+        with self.lock:
+            self.rates[host] = requests_per_second
+            self.buckets.pop(host, None)
+
+    def get_bucket(self, url):
+        """Returns the bucket for a url's host, or None if it is unlimited"""
+        host = urlsplit(url).hostname
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.rates.get(host)
+                self.buckets[host] = TokenBucket(rate) if rate else None
+            return self.buckets[host]
+
+    def send(self, request, method, url, *args, **kwargs):
+        """
+        Calls request(method, url, ...) once a token is free, retrying
+        connection errors and RETRY_STATUSES responses.
+        """
+        bucket = self.get_bucket(url)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                response = request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt >= self.max_retries:
+                response.raise_for_status()
+                return response
+
+            wait = retry_after(response)
+            if wait is None:
+                wait = self.backoff(attempt)
+            elif bucket is not None:
+                bucket.pause(wait)
+            time.sleep(wait)
+            attempt += 1
+
+    def backoff(self, attempt):
+        """Full jitter exponential backoff for the given retry attempt"""
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        )
+
+
+def retry_after(response):
+    """Seconds asked for by a Retry-After header, if there is a usable one"""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class ThrottledSession(requests.Session):
+    """requests session that sends everything through a RequestScheduler"""
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        return self.scheduler.send(super().request, method, url, *args, **kwargs)
+
+
+# Shared by all sessions so the budget holds across scrapers and threads
+SCHEDULER = RequestScheduler()
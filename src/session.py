@@ -0,0 +1,35 @@
+"""
+Shared HTTP session setup for the scrapers
+"""
+from requests.adapters import HTTPAdapter
+
+from src.http_cache import CachedSession, get_cache
+from src.scheduler import SCHEDULER, ThrottledSession
+
+POOL_SIZE = 10
+
+
+def make_session(pool_size=POOL_SIZE, scheduler=SCHEDULER, cache=True, offline=False):
+    """
+    Returns a requests session that keeps up to pool_size connections
+    open per host, so repeated calls to mtgtop8/scryfall reuse sockets.
+    Every request goes through the shared scheduler's rate limits and retries.
+    cache is a ResponseCache, True for the shared on-disk cache or False.
+    offline answers every request from the shared cache, raising
+    http_cache.CacheMiss for anything it does not hold.
+    """
+    if offline:
+        if cache is False:
+            raise ValueError("An offline session needs a cache to replay")
+        cache = get_cache(offline=True) if cache is True else cache
+        cache.offline = True
+    if cache is True:
+        cache = get_cache()
+    if cache:
+        session = CachedSession(scheduler, cache)
+    else:
+        session = ThrottledSession(scheduler)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
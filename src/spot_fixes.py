@@ -0,0 +1,60 @@
+"""
+Applies maps.json spot fixes to whole tables with one keyed lookup each
+"""
+import pandas as pd
+
+
+def fix_frame(fix_map, key, columns, key_type=None):
+    """
+    Turns {key: value or [values]} into a DataFrame indexed by key with
+    one column per replaced table column. key names the table column the
+    keys match, or is a list of names when the keys are tuples.
+    """
+    keys = [key_type(this_key) if key_type else this_key for this_key in fix_map]
+    values = [
+        value if isinstance(value, (list, tuple)) else [value]
+        for value in fix_map.values()
+    ]
+    if isinstance(key, list):
+        index = pd.MultiIndex.from_tuples(keys, names=key)
+    else:
+        index = pd.Index(keys, name=key)
+    return pd.DataFrame(values, columns=columns, index=index)
+
+
+def apply_fixes(table, fixes):
+    """
+    Writes each fix's values into the rows whose key columns (the names of
+    fixes.index) match it. Every row to change is found before any column
+    is written, so a fix that rewrites a key column still writes the rest.
+    Keys are matched with one hash lookup; the first fix for a key wins.
+    Returns the number of rows changed.
+    """
+    if fixes.empty:
+        return 0
+    fixes = fixes[~fixes.index.duplicated(keep="first")]
+    key_columns = list(fixes.index.names)
+    if len(key_columns) == 1:
+        keys = pd.Index(table[key_columns[0]])
+    else:
+        keys = pd.MultiIndex.from_frame(table[key_columns])
+    positions = fixes.index.get_indexer(keys)
+    rows = positions >= 0
+    if not rows.any():
+        return 0
+    for column in fixes.columns:
+        if column not in table.columns:
+            table[column] = None
+        values = fixes[column].to_numpy()[positions[rows]]
+        if isinstance(table[column].dtype, pd.CategoricalDtype):
+            new_values = pd.unique(values[pd.notna(values)])
+            table[column] = table[column].cat.add_categories(
+                [value for value in new_values if value not in table[column].cat.categories]
+            )
+        try:
+            table.loc[rows, column] = values
+        except TypeError:
+            # e.g. integer ranks written into a column of point strings
+            table[column] = table[column].astype(object)
+            table.loc[rows, column] = values
+    return int(rows.sum())
@@ -2,10 +2,107 @@
 Methods for interacting with SQL database
 """
 
+import atexit
+import contextlib
+import hashlib
 import os
 import sqlite3
+import threading
+import time
+import weakref
 import pandas as pd
 
+from src.migrations import migrate
+from src.pilots import pilot_key, split_name
+
+# Applied to every connection; WAL lets readers and a writer share the file
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # Negative values are in KiB, so this is a 64MB page cache
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY"
+}
+
+# Seconds a connection waits on another writer before "database is locked"
+BUSY_TIMEOUT = 30
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Rows sent to executemany at a time by the bulk insert path
+CHUNK_SIZE = 5000
+
+# Bulk insert statements; duplicates are skipped by the database itself
+INSERT_STATEMENTS = {
+    "event": """
+        INSERT OR IGNORE INTO event (name, link, date)
+        VALUES (?, ?, ?)
+        """,
+    "pilot": """
+        INSERT OR IGNORE INTO pilot (firstName, lastName)
+        VALUES (?, ?)
+        """,
+    "deck": """
+        INSERT OR IGNORE INTO deck (eventId, pilotId, deckUrl, name, rank)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+    "decklist": """
+        INSERT OR IGNORE INTO deckList (cardId, deckId, count, slot, cardName)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+    # Cards change (bans, rotation, errata), so changed rows replace old ones
+    "card": """
+        INSERT INTO card (
+            setNumber,
+            setName,
+            name,
+            cmc,
+            color,
+            standardLegality,
+            oracle_text,
+            mana_cost,
+            image_uri,
+            contentHash
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (setNumber, setName) DO UPDATE SET
+            name = excluded.name,
+            cmc = excluded.cmc,
+            color = excluded.color,
+            standardLegality = excluded.standardLegality,
+            oracle_text = excluded.oracle_text,
+            mana_cost = excluded.mana_cost,
+            image_uri = excluded.image_uri,
+            contentHash = excluded.contentHash
+        WHERE card.contentHash IS NOT excluded.contentHash
+        """
+}
+
+# event.date is stored as scraped (dd/mm/yy); this orders it as a date.
+# Matches the eventSortableDate index in ddl.sql.
+SORTABLE_DATE = "(substr(date, 7) || substr(date, 4, 2) || substr(date, 1, 2))"
+
+# Order tables are written in so foreign keys resolve
+TABLE_ORDER = ["event", "pilot", "deck", "decklist", "card"]
+
+# Decks past the deck mark, plus older decks with deckList rows past the
+# deckList rowid mark: decks are saved before their lists, so a list can
+# arrive in a later run than its deck. Takes (upto deck, deck mark,
+# deckList mark, upto deckList).
+CHANGED_DECKS = (
+    "SELECT id FROM deck WHERE id <= ? AND (id > ? OR id IN ("
+    "SELECT deckId FROM deckList WHERE rowid > ? AND rowid <= ?))"
+    )
+
+# fullTable columns whose names differ from make_full_table's
+FULL_TABLE_RENAMES = {
+    "name_event": "eventName",
+    "name_deck": "deckName",
+    "name": "cardName",
+    "latest_set": "latestSet"
+}
+
 
 def query(table):
     """Returns a dataframe with data in a sql table"""
@@ -13,26 +110,140 @@ def query(table):
         return sql_database.get_dataframe_from(table)
 
 
-def commit(data, table):
-    """Adds data to a sql table"""
+def events_without_decks():
+    """Returns the links of events that have no decks saved yet"""
+    with SQLDatabase() as sql_database:
+        return sql_database.get_events_without_decks()
+
+
+def decks_without_lists():
+    """Returns a dataframe of the decks that have no deck list saved yet"""
+    with SQLDatabase() as sql_database:
+        return sql_database.get_decks_without_lists()
+
+
+def latest_event_links():
+    """Returns the links of the events on the most recent saved date"""
+    with SQLDatabase() as sql_database:
+        return sql_database.get_latest_event_links()
+
+
+def commit(data, table, chunk_size=CHUNK_SIZE):
+    """Adds data to a sql table, returning (inserted, skipped) row counts"""
     with SQLDatabase() as sql_db:
-        sql_db.union_events(data, table)
+        return sql_db.union_events(data, table, chunk_size)
+
+
+def connect(path, run_migrations=True):
+    """
+    Opens a connection with PRAGMAS applied and a statement cache, and
+    brings the schema up to date unless run_migrations is False.
+    """
+    try:
+        connection = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+            )
+    except:
+        raise ValueError("Bad Connection")
+    for pragma, value in PRAGMAS.items():
+        connection.execute(f"PRAGMA {pragma} = {value}")
+    if run_migrations:
+        migrate(connection)
+    return connection
+
+
+class ThreadConnections(dict):
+    """One thread's connections by path; a subclass so it can be weakly referenced"""
+
+
+class ConnectionManager:
+    """
+    Keeps one long-lived connection per thread for each database file, so
+    the page cache and prepared statements survive between SQLDatabase
+    objects. Migrations run on the first connection to each file.
+    A thread's connections are closed by close_thread, or otherwise once
+    the thread ends and its thread-local storage is collected, so short
+    lived worker threads do not leave handles open.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._migrated = set()
+
+    def get(self, path, run_migrations=True):
+        """Returns this thread's connection to path, opening it if needed"""
+        connections = self._local.__dict__.get("connections")
+        if connections is None:
+            connections = self._local.connections = ThreadConnections()
+            # Bound to the values list rather than the dict, so the dict can
+            # still be collected when the thread ends
+            connections.opened = []
+            connections.finalizer = weakref.finalize(
+                connections, self._close, connections.opened
+            )
+        if path not in connections:
+            with self._lock:
+                needs_migrations = run_migrations and path not in self._migrated
+                connection = connect(path, needs_migrations)
+                if needs_migrations:
+                    self._migrated.add(path)
+                self._connections.add(connection)
+            connections[path] = connection
+            connections.opened.append(connection)
+        return connections[path]
+
+    def close_thread(self):
+        """Closes the calling thread's connections"""
+        connections = self._local.__dict__.pop("connections", None)
+        if connections is not None:
+            connections.finalizer()
+
+    def _close(self, connections):
+        """Closes connections and forgets them"""
+        with self._lock:
+            for connection in connections:
+                connection.close()
+                self._connections.discard(connection)
+
+    def close_all(self):
+        """Closes every connection handed out, from any thread"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = set()
+            self._migrated = set()
+        self._local = threading.local()
+
+
+CONNECTIONS = ConnectionManager()
+atexit.register(CONNECTIONS.close_all)
 
 
 class SQLDatabase:
     """API for interacting with SQL database."""
 
-    def __init__(self, db_name=None):
-        """Establishes connection to the sql table"""
+    def __init__(self, db_name=None, run_migrations=True, shared=True):
+        """
+        Establishes connection to the sql table.
+        File databases reuse this thread's connection from CONNECTIONS unless
+        shared is False; in-memory databases always get their own.
+        """
         if db_name is None:
             _path_to_db = os.path.abspath("dbs/links.db")
         else:
             _path_to_db = db_name
-        try:
-            self._connection = sqlite3.connect(_path_to_db)
-            self._cursor = self._connection.cursor()
-        except:
-            raise ValueError("Bad Connection")
+        self._owns_connection = not shared or _path_to_db == ":memory:"
+        if self._owns_connection:
+            self._connection = connect(_path_to_db, run_migrations)
+        else:
+            self._connection = CONNECTIONS.get(_path_to_db, run_migrations)
+        self._cursor = self._connection.cursor()
+        self.resolver = ForeignKeyResolver(self._cursor)
 
     def __enter__(self):
         """Method for entering SQLDatabase object as context manager"""
@@ -43,15 +254,86 @@ class SQLDatabase:
         self.close()
 
     def close(self):
-        """Closes the SQL connection"""
-        self._connection.close()
+        """
+        Closes the SQL connection. A shared connection stays open, but
+        anything left uncommitted is rolled back just as closing would.
+        """
+        self._cursor.close()
+        if self._owns_connection:
+            self._connection.close()
+        else:
+            self._connection.rollback()
 
-    def union_events(self, data, table):
-        """Adds items to a table"""
-        for item in data:
-            self.add_new(item, table)
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Runs the block as one write transaction, committed at its end and
+        rolled back on an error. The write lock is taken up front, since a
+        read that later upgrades to a write can fail with "database is
+        locked" without waiting. Inside another transaction the block joins
+        it, and the outer one commits.
+        """
+        if self._connection.in_transaction:
+            yield
+            return
+        self._cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.rollback()
+            raise
         self._connection.commit()
 
+    def union_events(self, data, table, chunk_size=CHUNK_SIZE):
+        """
+        Adds items to a table in one transaction.
+        Returns (inserted, skipped) counts; skipped rows were duplicates.
+        """
+        return self.union_tables({table: data}, chunk_size)[table.lower()]
+
+    def union_tables(self, data_by_table, chunk_size=CHUNK_SIZE):
+        """
+        Bulk adds rows to several tables in one transaction, in foreign key
+        order, with executemany and INSERT OR IGNORE in chunks of chunk_size.
+        Cards are upserted instead; a changed card counts as inserted and
+        an unchanged one as skipped.
+        Returns {table: (inserted, skipped)}.
+        """
+        data_by_table = {
+            table.lower(): data for table, data in data_by_table.items()
+        }
+        counts = {}
+        with self.transaction():
+            for table in sorted(data_by_table, key=TABLE_ORDER.index):
+                inserted = 0
+                total = 0
+                for chunk in chunked(data_by_table[table], chunk_size):
+                    rows = self.prepare_rows(chunk, table)
+                    before = self._connection.total_changes
+                    self._cursor.executemany(INSERT_STATEMENTS[table], rows)
+                    inserted += self._connection.total_changes - before
+                    total += len(rows)
+                counts[table] = (inserted, total - inserted)
+        return counts
+
+    def prepare_rows(self, items, table):
+        """Shapes scraped items into the parameters of INSERT_STATEMENTS"""
+        if table == "pilot":
+            return [
+                tuple(item) + ("",) if len(item) == 1 else tuple(item)
+                for item in items
+            ]
+        if table == "deck":
+            event_ids = self.resolver.event_ids(item[0] for item in items)
+            pilot_ids = self.resolver.pilot_ids(item[1] for item in items)
+            return [
+                (event_ids[item[0]], pilot_ids[item[1]]) + tuple(item[2:])
+                for item in items
+            ]
+        if table == "card":
+            return [tuple(item) + (row_hash(item),) for item in items]
+        return [tuple(item) for item in items]
+
     def add_new(self, item, table):
         """Factory for building correct sql calls to the appropriate table"""
         if table == "event":
@@ -133,14 +415,7 @@ class SQLDatabase:
         Returns pilot ids from pilot table.
         Used to get foreign key for deck table.
         """
-        first_last = "".join(name.split(maxsplit=1))
-        return self._cursor.execute(
-            """
-            SELECT id
-            FROM pilot
-            WHERE (firstName || lastName) = ?
-            """, (first_last,)
-            ).fetchone()[0]
+        return self.resolver.pilot_ids([name])[name]
 
     def add_deck_lists(self, item):
         """Adds deck lists to the deck list table"""
@@ -155,34 +430,411 @@ class SQLDatabase:
             pass
 
     def add_cards(self, item):
-        """Adds cards to the cards table."""
-        try:
-            self._cursor.execute(
+        """Adds cards to the cards table, replacing a card that has changed."""
+        self._cursor.execute(
+            INSERT_STATEMENTS["card"], tuple(item) + (row_hash(item),)
+            )
+
+    def get_card_set_signatures(self):
+        """Returns {set code: signature} as of each set's last refresh"""
+        return dict(
+            self._cursor.execute("SELECT setName, signature FROM cardSet")
+            )
+
+    def save_card_set_signatures(self, signatures):
+        """Records the signatures of freshly downloaded sets"""
+        with self.transaction():
+            self._cursor.executemany(
                 """
-                INSERT INTO card (
-                    setNumber,
-                    setName,
-                    name,
-                    cmc,
-                    color,
-                    standardLegality,
-                    oracle_text,
-                    mana_cost,
-                    image_uri
+                INSERT INTO cardSet (setName, signature, refreshedAt)
+                VALUES (?, ?, datetime('now'))
+                ON CONFLICT (setName) DO UPDATE SET
+                    signature = excluded.signature,
+                    refreshedAt = excluded.refreshedAt
+                """,
+                signatures.items()
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, item
+
+    def get_events_without_decks(self, links=None):
+        """
+        Returns the links of events with no rows in deck, in id order.
+        links limits the check to those events.
+        """
+        if links is None:
+            return self._events_without_decks("", [])
+        found = []
+        for chunk in chunked(list(links), ForeignKeyResolver.LOOKUP_SIZE):
+            found.extend(self._events_without_decks(
+                f"AND link IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+        return found
+
+    def _events_without_decks(self, condition, params):
+        """get_events_without_decks with an extra condition on event"""
+        return [
+            link for (link,) in self._cursor.execute(
+                f"""
+                SELECT link
+                FROM event
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM deck WHERE deck.eventId = event.id
                 )
-        except sqlite3.IntegrityError:
-            pass
+                {condition}
+                ORDER BY id
+                """,
+                params
+                )
+            ]
+
+    def get_decks_without_lists(self, event_link=None):
+        """
+        Returns a dataframe of decks with no rows in deckList, in id order.
+        event_link limits it to the decks of one event.
+        """
+        condition = ""
+        params = ()
+        if event_link is not None:
+            condition = "AND eventId = (SELECT id FROM event WHERE link = ?)"
+            params = (event_link,)
+        return pd.read_sql(
+            f"""
+            SELECT *
+            FROM deck
+            WHERE NOT EXISTS (
+                SELECT 1 FROM deckList WHERE deckList.deckId = deck.id
+            )
+            {condition}
+            ORDER BY id
+            """,
+            self._connection,
+            params=params
+            )
+
+    def get_latest_event_links(self):
+        """Returns the links of the events on the latest date in event"""
+        return [
+            link for (link,) in self._cursor.execute(
+                f"""
+                SELECT link
+                FROM event
+                WHERE {SORTABLE_DATE} = (
+                    SELECT max({SORTABLE_DATE}) FROM event
+                )
+                ORDER BY id
+                """
+                )
+            ]
+
+    def get_max_ids(self):
+        """
+        The highest id in the event, pilot and deck tables, and the highest
+        rowid in deckList, 0 when empty
+        """
+        max_ids = {
+            table: self._cursor.execute(
+                f"SELECT COALESCE(MAX(id), 0) FROM {table}"
+                ).fetchone()[0]
+            for table in ("event", "pilot", "deck")
+        }
+        max_ids["deckList"] = self._cursor.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM deckList"
+            ).fetchone()[0]
+        return max_ids
+
+    def get_changed_deck_ids(self, marks, upto):
+        """
+        The ids of the decks added, or given deck list rows, between the
+        marks and upto, both get_max_ids results
+        """
+        return [
+            deck_id for (deck_id,) in self._cursor.execute(
+                CHANGED_DECKS + " ORDER BY id",
+                (upto["deck"], marks["deck"], marks["deckList"], upto["deckList"])
+                )
+            ]
+
+    def refresh_full_table(self, full_table, deck_ids=None, replace_all=False,
+                           chunk_size=CHUNK_SIZE):
+        """
+        Saves cleaned full table rows to fullTable in one transaction.
+        The rows saved for deck_ids (by default every deck in full_table) are
+        replaced, so a deck whose cleaned rows are now empty is cleared too;
+        replace_all empties the table first. Returns the number of rows
+        written.
+        """
+        table = full_table.rename(columns=FULL_TABLE_RENAMES)
+        table = table.assign(date=table["date"].dt.strftime("%Y-%m-%d"))
+        columns = list(table.columns)
+        table = table.astype(object).where(table.notna(), None)
+        with self.transaction():
+            if replace_all:
+                self._cursor.execute("DELETE FROM fullTable")
+            else:
+                if deck_ids is None:
+                    deck_ids = table["deckId"].unique()
+                self._cursor.executemany(
+                    "DELETE FROM fullTable WHERE deckId = ?",
+                    [(int(deck_id),) for deck_id in deck_ids]
+                    )
+            statement = (
+                f"INSERT INTO fullTable ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})"
+                )
+            for chunk in chunked(table.itertuples(index=False, name=None), chunk_size):
+                self._cursor.executemany(statement, chunk)
+        return len(table)
 
-    def get_dataframe_from(self, table):
-        """Grabs all the data from a table and returns a dataframe"""
-        result = pd.read_sql(f"SELECT * FROM {table}", self._connection)
+    def get_full_table(self, where=None, params=(), columns="*"):
+        """
+        Reads fullTable rows back as make_full_table's columns, e.g.
+        get_full_table("archetype = ? AND date >= ?", ("aggro", "2021-02-05"))
+        """
+        statement = f"SELECT {columns} FROM fullTable"
+        if where:
+            statement += f" WHERE {where}"
+        result = pd.read_sql(statement, self._connection, params=params)
+        if "date" in result.columns:
+            result["date"] = pd.to_datetime(result["date"], format="%Y-%m-%d")
+        return result.rename(
+            columns={name: column for column, name in FULL_TABLE_RENAMES.items()}
+            )
+
+    def get_dataframe_from(self, table, where=None, params=()):
+        """
+        Grabs all the data from a table and returns a dataframe.
+        where (with its params) keeps only some of the rows.
+        """
+        statement = f"SELECT * FROM {table}"
+        if where:
+            statement += f" WHERE {where}"
+        result = pd.read_sql(statement, self._connection, params=params)
         if "date" in result.columns.tolist():
             result["date"] = pd.to_datetime(result["date"], dayfirst=True)
         return result
 
 
+    def add_queue_items(self, kind, urls, deck_ids):
+        """
+        Adds pages to scrapeQueue, leaving pages already in it alone.
+        Returns the number added.
+        """
+        now = time.time()
+        with self.transaction():
+            before = self._connection.total_changes
+            self._cursor.executemany(
+                """
+                INSERT OR IGNORE INTO scrapeQueue (url, kind, deckId, updatedAt)
+                VALUES (?, ?, ?, ?)
+                """,
+                [
+                    (url, kind, None if deck_id is None else int(deck_id), now)
+                    for url, deck_id in zip(urls, deck_ids)
+                ]
+                )
+            return self._connection.total_changes - before
+
+    def claim_queue_items(self, kind, states, size, claimed_state):
+        """
+        Moves up to size of the next due pages of a kind in one of states to
+        claimed_state, counting an attempt for each. Returns their
+        (url, kind, deckId, attempts) rows, attempts as they were before.
+        """
+        now = time.time()
+        with self.transaction():
+            rows = self._cursor.execute(
+                f"""
+                SELECT url, kind, deckId, attempts
+                FROM scrapeQueue
+                WHERE kind = ?
+                    AND state IN ({', '.join('?' * len(states))})
+                    AND nextAttemptAt <= ?
+                ORDER BY nextAttemptAt, rowid
+                LIMIT ?
+                """,
+                (kind, *states, now, size)
+                ).fetchall()
+            self._cursor.executemany(
+                """
+                UPDATE scrapeQueue
+                SET state = ?, attempts = attempts + 1, updatedAt = ?
+                WHERE url = ?
+                """,
+                [(claimed_state, now, row[0]) for row in rows]
+                )
+        return rows
+
+    def set_queue_state(self, url, state, error=None, next_attempt_at=None, from_state=None):
+        """
+        Sets a page's state and last error, and when given the time before
+        which it is not claimed again. With from_state only a page in that
+        state changes.
+        """
+        statement = "UPDATE scrapeQueue SET state = ?, lastError = ?, updatedAt = ?"
+        params = [state, error, time.time()]
+        if next_attempt_at is not None:
+            statement += ", nextAttemptAt = ?"
+            params.append(next_attempt_at)
+        statement += " WHERE url = ?"
+        params.append(url)
+        if from_state is not None:
+            statement += " AND state = ?"
+            params.append(from_state)
+        with self.transaction():
+            self._cursor.execute(statement, params)
+
+    def reset_queue_state(self, from_state, to_state, kind=None, reset_attempts=False):
+        """
+        Moves every page in from_state, of one kind or all of them, to
+        to_state; reset_attempts also gives them a fresh set of attempts,
+        due at once. Returns the number moved.
+        """
+        statement = "UPDATE scrapeQueue SET state = ?, updatedAt = ?"
+        if reset_attempts:
+            statement += ", attempts = 0, nextAttemptAt = 0"
+        statement += " WHERE state = ?"
+        params = [to_state, time.time(), from_state]
+        if kind:
+            statement += " AND kind = ?"
+            params.append(kind)
+        with self.transaction():
+            return self._cursor.execute(statement, params).rowcount
+
+    def get_queue_next_due(self, kind, states):
+        """When the next page of a kind in one of states falls due, or None"""
+        return self._cursor.execute(
+            f"""
+            SELECT MIN(nextAttemptAt)
+            FROM scrapeQueue
+            WHERE kind = ? AND state IN ({', '.join('?' * len(states))})
+            """,
+            (kind, *states)
+            ).fetchone()[0]
+
+    def get_queue_counts(self, kind=None):
+        """Returns {state: number of pages} in scrapeQueue, for one kind or all"""
+        condition = "WHERE kind = ?" if kind else ""
+        return dict(self._cursor.execute(
+            f"SELECT state, COUNT(*) FROM scrapeQueue {condition} GROUP BY state",
+            (kind,) if kind else ()
+            ).fetchall())
+
+
+    def save_quarantined_page(self, url, kind, deck_id, reason, html):
+        """Stores a rejected page, replacing any earlier copy of it"""
+        with self.transaction():
+            self._cursor.execute(
+                """
+                INSERT OR REPLACE INTO quarantine (url, kind, deckId, reason, html, quarantinedAt)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (url, kind, None if deck_id is None else int(deck_id), reason, html, time.time())
+                )
+
+    def get_quarantined_pages(self, kind=None):
+        """
+        Returns the (url, kind, deckId, reason, html) rows of the
+        quarantined pages, of one kind or all of them, oldest first
+        """
+        condition = "WHERE kind = ?" if kind else ""
+        return self._cursor.execute(
+            f"""
+            SELECT url, kind, deckId, reason, html
+            FROM quarantine
+            {condition}
+            ORDER BY quarantinedAt, rowid
+            """,
+            (kind,) if kind else ()
+            ).fetchall()
+
+    def delete_quarantined_page(self, url):
+        """Drops a page from the quarantine"""
+        with self.transaction():
+            self._cursor.execute("DELETE FROM quarantine WHERE url = ?", (url,))
+
+class ForeignKeyResolver:
+    """
+    Resolves event links and pilot names to ids for a whole batch of decks
+    with a few IN queries instead of two SELECTs per deck.
+    Found ids are remembered for the life of the connection; names that
+    are missing are looked up again, so pilots inserted earlier in the
+    same transaction are picked up.
+    """
+
+    # Stays under SQLite's limit on bound parameters per statement
+    LOOKUP_SIZE = 500
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.event_links = {}
+        self.pilot_names = {}
+
+    def event_ids(self, links):
+        """Returns {link: event id} for every link"""
+        links = set(links)
+        self._load(
+            links - self.event_links.keys(),
+            self.event_links,
+            "SELECT link, id FROM event WHERE link IN ({})"
+        )
+        return self._pick(links, self.event_links, "event link")
+
+    def pilot_ids(self, names):
+        """
+        Returns {'first last': pilot id} for every pilot name.
+        Names are matched on pilots.pilot_key on both sides, so a pilot
+        saved with the raw spacing of an older scrape is still found; if
+        that left two rows with one key, the older one is used.
+        """
+        names = set(names)
+        keys = {name: pilot_key(*split_name(name)) for name in names}
+        missing = set(keys.values()) - self.pilot_names.keys()
+        # firstName was always saved as a single token, so it can be queried
+        first_names = list({key.split(" ", 1)[0] for key in missing})
+        for chunk in chunked(first_names, self.LOOKUP_SIZE):
+            placeholders = ", ".join("?" * len(chunk))
+            for first_name, last_name, pilot_id in self._cursor.execute(
+                "SELECT firstName, lastName, id FROM pilot "
+                f"WHERE firstName IN ({placeholders}) ORDER BY id",
+                chunk
+            ):
+                self.pilot_names.setdefault(pilot_key(first_name, last_name), pilot_id)
+        by_key = self._pick(set(keys.values()), self.pilot_names, "pilot")
+        return {name: by_key[key] for name, key in keys.items()}
+
+    def _load(self, missing, known, statement):
+        """Adds the ids for the missing keys to the known map"""
+        missing = list(missing)
+        for chunk in chunked(missing, self.LOOKUP_SIZE):
+            placeholders = ", ".join("?" * len(chunk))
+            known.update(
+                self._cursor.execute(statement.format(placeholders), chunk).fetchall()
+            )
+
+    @staticmethod
+    def _pick(keys, known, kind):
+        """Returns the ids for keys, failing loudly for any unknown key"""
+        unknown = keys - known.keys()
+        if unknown:
+            raise KeyError(f"No {kind} found for {sorted(unknown)[:5]}")
+        return {key: known[key] for key in keys}
+
+
+def row_hash(item):
+    """Content hash of a scraped row, used to skip rewriting unchanged rows"""
+    return hashlib.sha1(repr(tuple(item)).encode("utf-8")).hexdigest()
+
+
+def chunked(items, chunk_size):
+    """Yields lists of at most chunk_size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 if __name__ == "__main__":
     print(os.path.abspath("dbs/links.db"))
@@ -0,0 +1,125 @@
+"""
+Persistent queue of pages to scrape, kept in the Sqlite database
+"""
+import random
+import time
+from collections import namedtuple
+
+from src.sqldb import SQLDatabase
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+# Failed max_attempts times; left alone until retry_exhausted queues it again
+EXHAUSTED = "exhausted"
+# Rejected by the parsers; waits in the quarantine table for a redrive
+QUARANTINED = "quarantined"
+
+# Kinds of page in the queue
+EVENT = "event"
+DECK = "deck"
+
+# Attempts before an item is given up on
+MAX_ATTEMPTS = 5
+# Backoff between attempts, in seconds; half of it fixed and half jittered
+RETRY_BASE = 30
+RETRY_CAP = 60 * 60
+
+WorkItem = namedtuple("WorkItem", ["url", "kind", "deck_id", "attempts"])
+
+
+class WorkQueue:
+    """
+    Pages move from pending to in_flight when a worker claims them, then to
+    done in the same transaction that saves what was scraped from them, or
+    to failed with a time before which they are not retried, or to
+    quarantined when the page itself is malformed. An item that fails on
+    its last attempt is exhausted instead of failed.
+    Every call uses the calling thread's connection, so workers on several
+    threads can share one WorkQueue.
+    """
+
+    def __init__(self, db_name=None, max_attempts=MAX_ATTEMPTS,
+                 retry_base=RETRY_BASE, retry_cap=RETRY_CAP):
+        self.db_name = db_name
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+
+    def add(self, kind, urls, deck_ids=None):
+        """
+        Queues urls that were never queued before; urls already in the queue
+        keep their state. Returns the number added.
+        """
+        urls = list(urls)
+        deck_ids = list(deck_ids) if deck_ids is not None else [None] * len(urls)
+        with SQLDatabase(self.db_name) as sql_db:
+            return sql_db.add_queue_items(kind, urls, deck_ids)
+
+    def recover(self):
+        """Puts items a dead run left in flight back to pending"""
+        with SQLDatabase(self.db_name) as sql_db:
+            return sql_db.reset_queue_state(IN_FLIGHT, PENDING)
+
+    def claim(self, kind):
+        """
+        Marks the next item of a kind that is due as in flight and returns
+        it, or returns None when nothing is due.
+        """
+        items = self.claim_batch(kind, 1)
+        return items[0] if items else None
+
+    def claim_batch(self, kind, size):
+        """
+        Marks up to size of the next items of a kind that are due as in
+        flight and returns them in queue order; empty when nothing is due.
+        """
+        with SQLDatabase(self.db_name) as sql_db:
+            rows = sql_db.claim_queue_items(kind, (PENDING, FAILED), size, IN_FLIGHT)
+        return [WorkItem(url, kind, deck_id, attempts + 1)
+                for url, kind, deck_id, attempts in rows]
+
+    def next_due(self, kind):
+        """
+        Returns when the next pending or failed item of a kind falls due,
+        or None when there is none
+        """
+        with SQLDatabase(self.db_name) as sql_db:
+            return sql_db.get_queue_next_due(kind, (PENDING, FAILED))
+
+    def complete(self, item, data_by_table):
+        """
+        Saves the rows scraped from an item and marks it done in one
+        transaction. Returns union_tables' counts.
+        """
+        with SQLDatabase(self.db_name) as sql_db, sql_db.transaction():
+            sql_db.set_queue_state(item.url, DONE)
+            return sql_db.union_tables(data_by_table)
+
+    def fail(self, item, error):
+        """
+        Marks an item failed, to be retried after a jittered backoff, or
+        exhausted when that was its last attempt. Returns the new state.
+        """
+        state = EXHAUSTED if item.attempts >= self.max_attempts else FAILED
+        backoff = min(self.retry_cap, self.retry_base * 2 ** item.attempts) / 2
+        delay = backoff + random.uniform(0, backoff)
+        with SQLDatabase(self.db_name) as sql_db:
+            sql_db.set_queue_state(
+                item.url, state, f"{type(error).__name__}: {error}", time.time() + delay
+            )
+        return state
+
+    def retry_exhausted(self, kind=None):
+        """
+        Queues exhausted items again with a fresh set of attempts, e.g. once
+        mtgtop8 is back up. Returns the number queued.
+        """
+        with SQLDatabase(self.db_name) as sql_db:
+            return sql_db.reset_queue_state(EXHAUSTED, PENDING, kind, reset_attempts=True)
+
+    def counts(self, kind=None):
+        """Returns {state: number of items}, for one kind or all of them"""
+        with SQLDatabase(self.db_name) as sql_db:
+            return sql_db.get_queue_counts(kind)
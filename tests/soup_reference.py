@@ -0,0 +1,124 @@
+"""
+The BeautifulSoup page readers the scrapers used before src.parsers, kept
+as the reference the lxml parsers are tested and benchmarked against
+"""
+from bs4 import BeautifulSoup
+
+from src.data_assertions import (
+    check,
+    is_malformed,
+    is_a_link,
+    should_be_skipped,
+    is_points,
+    is_rank
+    )
+
+
+def soup_event(text):
+    """Reads an event page the way parsers.parse_event_page does"""
+    body = BeautifulSoup(text, features="lxml").body
+    names, ranks, links = get_winners(body)
+    other_names, other_ranks, other_links = add_other_decks(body, bool(is_points(ranks[0])))
+    names.extend(other_names)
+    ranks.extend(other_ranks)
+    links.extend(other_links)
+    return names, ranks, links, get_players(body, names)
+
+
+def soup_deck(text, deck_url, deck_id):
+    """Reads a deck page the way parsers.parse_deck_page does"""
+    return get_deck_list(BeautifulSoup(text, features="lxml").body, deck_url, deck_id)
+
+
+def get_winners(body):
+    """
+    Gets first place deck/pilot; mtgtop8 has different tags for the winner
+    when you navigate to a new event page
+    """
+    try:
+        winner_rank = body.find_all("div", class_="W12")[1].text
+        winner_name = body.find_all("div", class_="W14")[0].find("a").text
+        winner_link = body.find_all("div", class_="W14")[
+            0].find("a").get("href")
+    except (IndexError, AttributeError):
+        winner_rank = body.find_all("div", class_="W14")[0].text
+        winner_name = body.find_all("div", class_="W14")[1].find("a").text
+        winner_link = body.find_all("div", class_="W14")[
+            1].find("a").get("href")
+    return [winner_name], [winner_rank], [winner_link]
+
+
+def get_players(body, names):
+    """Gets all the players from the page"""
+    result = []
+    for player in body.find_all("div", class_="G11")[:len(names)]:
+        result.append(player.find("a").text)
+    return result
+
+
+def add_other_decks(body, has_points=False):
+    """Gets the rest of the deck/pilot data from the event page"""
+    names = []
+    ranks = []
+    links = []
+    if has_points:
+        for name in body.find_all("div", class_="S14")[:-3]:
+            check(not is_malformed(name.text), "Bad name - " + name.text)
+            names.append(name.text.strip())
+            this_link = name.find("a").get("href")
+            check(is_a_link(this_link), "Bad link - " + this_link)
+            links.append(this_link)
+        for points in body.find_all("div", class_="S12"):
+            if not should_be_skipped(points.text):
+                check(is_points(points.text), "Malformed Points " + points.text)
+                ranks.append(points.text.strip())
+    else:
+        for idx, result in enumerate(body.find_all("div", class_="S14")[:-3]):
+            if idx % 2 == 0:
+                if not is_rank(result.text):
+                    break
+                ranks.append(result.text.strip())
+            else:
+                check(not is_malformed(result.text), "Bad name - " + result.text)
+                names.append(result.text.strip())
+                this_link = result.find("a").get("href")
+                check(is_a_link(this_link), "Bad link - " + this_link)
+                links.append(this_link)
+    return names, ranks, links
+
+
+def get_deck_list(deck_list_body, deck_url, deck_id):
+    """
+    Gets the (cardId, deckId, count, slot, cardName) rows from a deck page's
+    BeautifulSoup body
+    """
+    deck_list = []
+    for item in deck_list_body.find_all("td", class_="G14"):
+        this_card = item.text.strip().split(maxsplit=1)
+        count = this_card[0]
+        check(count.isdigit(), "Count is not a digit - " +
+              deck_url + " - " + str(this_card))
+
+        this_id = item.find_all("span", class_="L14")[
+            0].get("id")[:-2]
+        slot = this_id[:2]
+        set_name = this_id[2:5]
+        collector_number = this_id[5:]
+        if set_name == "10m":
+            set_name = "m10"
+        if set_name == "11m":
+            set_name = "m11"
+        if set_name == "12m":
+            set_name = "m12 "
+        if set_name == "13m":
+            set_name = "m13"
+        if set_name == "14m":
+            set_name = "m14"
+        if set_name == "15m":
+            set_name = "m15"
+
+        card_name = item.find_all("span", class_="L14")[0].text
+        deck_list.append(
+            (collector_number+set_name, deck_id, count, slot, card_name )
+        )
+    return deck_list
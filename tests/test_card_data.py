@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from src import card_data
+from src.flat_files import CSV, save_table
+
+
+def save_tables(directory, legality="legal"):
+    """Minimal saved tables for the derived slices"""
+    save_table(pd.DataFrame({
+        "deckId": [1, 1, 2],
+        "cardId": ["001znr", "002znr", "003khm"],
+        "name": ["Shock", "Mountain", "Demon Bolt"],
+        "slot": ["md", "md", "md"]
+    }), "full_table", directory, file_format=CSV)
+    save_table(pd.DataFrame({
+        "cardId": ["001znr", "002znr", "003khm"],
+        "standardLegality": ["legal", "legal", legality]
+    }), "card_table", directory, file_format=CSV)
+    save_table(pd.DataFrame({
+        "deckId": [1, 2], "rank": [1, 1]
+    }), "deck_table", directory, file_format=CSV)
+
+
+class TestCardData(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(card_data, "FLAT_FILE_DIR", self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(card_data.clear)
+        card_data.clear()
+        save_tables(self.directory.name)
+
+    def test_only_the_requested_table_is_loaded(self):
+        card_table = card_data.card_table
+        self.assertEqual(len(card_table), 3)
+        self.assertEqual(list(card_data._cache), ["card_table"])
+        self.assertIs(card_data.card_table, card_table)
+
+    def test_derived_slices_load_their_sources(self):
+        self.assertEqual(list(card_data.main_decks["name"]), ["Shock", "Demon Bolt"])
+        self.assertEqual(list(card_data.first_place_decks["deckId"]), [1, 2])
+        self.assertNotIn("pilot_table", card_data._cache)
+
+    def test_saving_again_invalidates_what_depends_on_it(self):
+        self.assertEqual(len(card_data.first_place_decks), 2)
+        save_tables(self.directory.name, legality="not_legal")
+        path = os.path.join(self.directory.name, "card_table.csv")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(list(card_data.first_place_decks["deckId"]), [1])
+
+    def test_unknown_names_still_raise(self):
+        with self.assertRaises(AttributeError):
+            card_data.fulll_table
+
+
+if __name__ == "__main__":
+    unittest.main()
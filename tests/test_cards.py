@@ -0,0 +1,197 @@
+import unittest
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from unittest import mock
+
+from src.cards import (
+    SETS_URL,
+    card_row,
+    changed_sets,
+    ingest_bulk_data,
+    iter_bulk_cards,
+    iter_json_array
+)
+from src.sqldb import SQLDatabase
+
+
+def make_card(number, card_set="znr", lang="en", **extra):
+    card = {
+        "collector_number": str(number),
+        "set": card_set,
+        "lang": lang,
+        "name": f"Card {number} — \"quoted\" [x]",
+        "cmc": 2.0,
+        "color_identity": ["R", "G"],
+        "legalities": {"standard": "legal"},
+        "oracle_text": "Deal 2 damage.\nDraw a card, then {T}.",
+        "mana_cost": "{1}{R}",
+        "image_uris": {"normal": f"https://img/{number}.jpg"},
+    }
+    card.update(extra)
+    return card
+
+
+CARDS = [
+    make_card(1),
+    make_card(2, lang="ja"),
+    make_card(3, card_set="lea"),
+    make_card(
+        4,
+        oracle_text=None,
+        card_faces=[
+            {"oracle_text": "Front", "mana_cost": "", "image_uris": {"normal": "f"}},
+            {"oracle_text": "Back", "mana_cost": "", "image_uris": {"normal": "b"}},
+        ]
+    ),
+]
+del CARDS[3]["oracle_text"], CARDS[3]["mana_cost"], CARDS[3]["image_uris"]
+
+
+class TestIterJsonArray(unittest.TestCase):
+
+    def test_items_split_across_reads(self):
+        items = [{"a": [1, 2, {"b": "}],"}]}, 12345, "text", None, [], 1.5e3, True]
+        text = "  [ " + " ,\n ".join(json.dumps(item) for item in items) + " ]\n"
+        for read_size in (1, 2, 3, 7, 1000):
+            self.assertEqual(list(iter_json_array(io.StringIO(text), read_size)), items)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array(io.StringIO("[]"))), [])
+
+    def test_stray_separators_raise(self):
+        for text in ("[1,,2]", "[,1]", "[1,]", "[1 , , 2]", "[,]"):
+            for read_size in (1, 2, 1000):
+                with self.subTest(text=text, read_size=read_size), \
+                        self.assertRaises(json.JSONDecodeError):
+                    list(iter_json_array(io.StringIO(text), read_size))
+
+    def test_truncated_file_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('[{"a": 1}, {"b"'), 4))
+
+    def test_tokens_cut_by_a_read_are_completed(self):
+        items = ["a\u00e9b", -float("inf"), True, None, {"key": 1.25}]
+        text = json.dumps(items)
+        for read_size in range(1, 12):
+            self.assertEqual(list(iter_json_array(io.StringIO(text), read_size)), items)
+
+    def test_malformed_item_raises_without_reading_on(self):
+        text = '[{"a": 1}, {"b": tru}, ' + ", ".join(['{"c": 2}'] * 10000) + "]"
+        json_file = io.StringIO(text)
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(json_file, 64))
+        self.assertLessEqual(json_file.tell(), 128)
+
+
+class TestBulkIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "default_cards.json.gz")
+        with gzip.open(self.path, "wt", encoding="utf-8") as bulk:
+            json.dump(CARDS, bulk)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keeps_english_cards_from_known_sets(self):
+        rows = list(iter_bulk_cards(self.path, sets=["znr"]))
+        self.assertEqual(rows, [card_row(CARDS[0]), card_row(CARDS[3])])
+        self.assertEqual(rows[1][6:8], ("Front // Back", ""))
+
+    def test_writes_in_chunks(self):
+        with SQLDatabase(":memory:") as sql_db:
+            self.assertEqual(ingest_bulk_data(self.path, ["znr"], 1, sql_db), (2, 0))
+            self.assertEqual(ingest_bulk_data(self.path, ["znr"], 1, sql_db), (0, 2))
+
+
+class FakeScryfall:
+    """Answers the set list and set searches from dicts, two cards a page"""
+
+    def __init__(self, card_counts, cards):
+        self.card_counts = card_counts
+        self.cards = cards
+        self.searched = []
+
+    def get(self, url, headers=None):
+        if url == SETS_URL:
+            data = [{"code": code, "card_count": count} for code, count in self.card_counts.items()]
+            return mock.Mock(status_code=200, json=lambda: {"data": data})
+        url, _, page = url.partition("&page=")
+        page = int(page or 0)
+        self.searched.append(url)
+        cards = self.cards.get(url.split("set%3A'")[1].split("'")[0])
+        if not cards:
+            return mock.Mock(status_code=404)
+        body = {
+            "data": cards[page * 2:page * 2 + 2],
+            "has_more": len(cards) > page * 2 + 2,
+            "next_page": f"{url}&page={page + 1}",
+        }
+        return mock.Mock(status_code=200, json=lambda: body)
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.sql_db = SQLDatabase(":memory:")
+
+    def tearDown(self):
+        self.sql_db.close()
+
+    def test_changed_cards_replace_saved_rows(self):
+        legal = card_row(make_card(1))
+        banned = legal[:5] + ("banned",) + legal[6:]
+        self.assertEqual(self.sql_db.union_events([legal], "card"), (1, 0))
+        self.assertEqual(self.sql_db.union_events([legal], "card"), (0, 1))
+        self.assertEqual(self.sql_db.union_events([banned], "card"), (1, 0))
+        saved = self.sql_db._cursor.execute("SELECT standardLegality FROM card").fetchall()
+        self.assertEqual(saved, [("banned",)])
+
+    def test_only_new_or_changed_sets_are_refreshed(self):
+        cards = {
+            code: [make_card(number, code) for number in range(5)]
+            for code in ("znr", "khm", "m21")
+        }
+        session = FakeScryfall({"znr": 5, "khm": 5, "m21": 5}, cards)
+        sets = ["znr", "khm", "m21", "stx"]
+        changed, signatures, rows = changed_sets(session, self.sql_db, sets)
+        self.assertEqual(changed, sets)
+        self.assertEqual(len(rows), 15)
+        self.sql_db.save_card_set_signatures(signatures)
+
+        self.assertEqual(changed_sets(session, self.sql_db, sets)[0], [])
+
+        # A legal card in znr is banned
+        session.cards["znr"][1] = make_card(1, "znr", legalities={"standard": "banned"})
+        # An errata in khm
+        session.cards["khm"][4] = make_card(4, "khm", oracle_text="Draw two cards.")
+        session.card_counts["stx"] = 3
+        session.cards["stx"] = [make_card(number, "stx") for number in range(3)]
+        session.searched.clear()
+        changed, _, rows = changed_sets(session, self.sql_db, sets)
+        self.assertEqual(changed, ["znr", "khm", "stx"])
+        # The changed sets' rows come from the same searches, not new ones:
+        # each page is fetched once, three for 5 cards and two for 3
+        self.assertEqual(len(session.searched), 3 + 3 + 3 + 2)
+        self.assertEqual(rows[1][5], "banned")
+        self.assertEqual(len(rows), 13)
+
+    def test_errata_to_cards_that_are_not_legal_is_not_seen(self):
+        session = FakeScryfall({"znr": 2}, {"znr": [
+            make_card(1), make_card(2, legalities={"standard": "not_legal"})
+        ]})
+        _, signatures, _ = changed_sets(session, self.sql_db, ["znr"])
+        self.sql_db.save_card_set_signatures(signatures)
+        session.cards["znr"][1] = make_card(
+            2, legalities={"standard": "not_legal"}, oracle_text="Draw two cards."
+        )
+        self.assertEqual(changed_sets(session, self.sql_db, ["znr"])[0], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import random
+import unittest
+
+import pandas as pd
+
+from src.classifier import apply_labels, classify
+
+with open("src/data/maps.json", "r") as json_file:
+    MAPS = json.load(json_file)
+
+
+def label_one_flag_at_a_time(table, column, flag_map, id_map=None, name_map=None):
+    """The str.contains loop set_archetypes used to run"""
+    for label, flags in flag_map.items():
+        for flag in flags:
+            table.loc[table["name"].str.contains(flag, case=False), column] = label
+    for deck_id, label in (id_map or {}).items():
+        table.loc[table["deckId"] == int(deck_id), column] = label
+    for deck_name, label in (name_map or {}).items():
+        table.loc[table["name"] == deck_name, column] = label
+
+
+def make_deck_table(flag_map, size=2000):
+    """Deck names mixing flags from several labels, in several cases"""
+    random.seed(1)
+    flags = [flag for flags in flag_map.values() for flag in flags]
+    words = flags + ["Sanctum", "Tribal", "Combo", "Pile"]
+    names = []
+    for _ in range(size):
+        name = " ".join(random.sample(words, random.randint(1, 3)))
+        names.append(random.choice([name, name.title(), name.upper()]))
+    return pd.DataFrame({"deckId": range(1, size + 1), "name": names})
+
+
+class TestClassifier(unittest.TestCase):
+
+    def test_archetypes_match_the_flag_loop(self):
+        maps = MAPS["archetype_maps"]
+        expected = make_deck_table(maps["base_map"])
+        expected.loc[[3, 7], "name"] = "5c Sanctum"
+        actual = expected.copy()
+        id_map = {"12": "combo", "8": "aggro"}
+
+        label_one_flag_at_a_time(expected, "archetype", maps["base_map"], id_map, maps["name_map"])
+        apply_labels(actual, "archetype", maps["base_map"], id_map, maps["name_map"])
+
+        pd.testing.assert_series_equal(actual["archetype"], expected["archetype"])
+        self.assertEqual(actual.loc[7, "archetype"], "control")
+
+    def test_categories_match_the_flag_loop(self):
+        base_map = MAPS["category_maps"]["base_map"]
+        expected = make_deck_table(base_map)
+        actual = expected.copy()
+
+        label_one_flag_at_a_time(expected, "category", base_map)
+        apply_labels(actual, "category", base_map)
+
+        pd.testing.assert_series_equal(actual["category"], expected["category"])
+
+    def test_last_label_with_a_flag_wins(self):
+        names = pd.Series(["Mono Red Aggro", "Izzet Control", "Pile"])
+        flag_map = {"aggro": ["aggro", "red"], "control": ["control", "izzet"]}
+        labels = classify(names, flag_map)
+        self.assertEqual(labels[0], "aggro")
+        self.assertEqual(labels[1], "control")
+        self.assertTrue(pd.isna(labels[2]))
+
+        flag_map = {"control": ["control"], "izzet": ["izzet"]}
+        self.assertEqual(classify(names, flag_map)[1], "izzet")
+
+    def test_flags_with_groups_keep_their_labels(self):
+        names = pd.Series(["Mono-Green Food", "Gruul Adventures"])
+        flag_map = {"food": ["(f)ood"], "gruul": ["gr(u)(u)l"], "adventure": ["adventure"]}
+        self.assertEqual(list(classify(names, flag_map)), ["food", "adventure"])
+
+    def test_unlabeled_rows_keep_their_old_value(self):
+        table = pd.DataFrame({
+            "deckId": [1, 2],
+            "name": ["Rakdos Midrange", "Something Else"],
+            "archetype": ["old", "kept"]
+        })
+        apply_labels(table, "archetype", {"midrange": ["midrange"]})
+        self.assertEqual(list(table["archetype"]), ["midrange", "kept"])
+
+
+if __name__ == "__main__":
+    unittest.main()
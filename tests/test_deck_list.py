@@ -0,0 +1,43 @@
+import unittest
+
+from src import models as m
+
+
+def make_deck_page(deck_id):
+    cards = [
+        (str(deck_id), "mdznr1", "Card A"),
+        ("2", "md12m100", "Card B"),
+        ("1", "sbkhm2", "Card C"),
+    ]
+    rows = "".join(
+        f"<td class='G14'>{count} <span class='L14' id='{card_id}_1'>{name}</span></td>"
+        for count, card_id, name in cards
+    )
+    return f"<html><body><table><tr>{rows}</tr></table></body></html>"
+
+
+class TestDeckList(unittest.TestCase):
+
+    def test_parse_deck_list_rows(self):
+        rows = m.parse_deck_list(make_deck_page(7), "url", 7)
+        self.assertEqual(rows, [
+            ("1znr", 7, "7", "md", "Card A"),
+            ("100m12 ", 7, "2", "md", "Card B"),
+            ("2khm", 7, "1", "sb", "Card C"),
+        ])
+
+    def test_malformed_pages_come_back_quarantined(self):
+        html = "<html><body><td class='G14'>x</td></body></html>"
+        page = m.parse_deck_list_checked(html, "url", 5)
+        self.assertEqual((page.url, page.kind, page.deck_id), ("url", "deck", 5))
+        self.assertIn("Count is not a digit", page.reason)
+        self.assertEqual(page.html, html)
+
+    def test_pages_missing_card_tags_are_malformed(self):
+        page = "<html><body><td class='G14'>2 Card</td></body></html>"
+        with self.assertRaises(m.MalformedPage):
+            m.parse_deck_list(page, "url", 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
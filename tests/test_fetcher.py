@@ -0,0 +1,134 @@
+import unittest
+import random
+import threading
+import time
+from unittest import mock
+
+import requests
+
+from src.fetcher import FetchError, fetch_all, fetch_and_parse, fetch_each
+
+
+class SlowSession:
+    """Answers with the url after a random delay, tracking concurrency"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def get(self, url):
+        with self.lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(random.uniform(0, 0.02))
+        with self.lock:
+            self.in_flight -= 1
+        return mock.Mock(url=url, text=f"page {url}")
+
+
+def parse_number(text, url, offset):
+    """Runs in the process pool; fails on page 5"""
+    number = int(text.split()[-1])
+    if number == 5:
+        raise ValueError("unreadable")
+    return number + offset
+
+
+class TestFetchAll(unittest.TestCase):
+
+    def test_results_come_back_in_url_order(self):
+        urls = [f"https://www.mtgtop8.com/event?e={i}" for i in range(40)]
+        responses = fetch_all(urls, concurrency=8, session=SlowSession())
+        self.assertEqual([response.url for response in responses], urls)
+
+    def test_concurrency_limit_is_respected(self):
+        session = SlowSession()
+        fetch_all([str(i) for i in range(40)], concurrency=3, session=session)
+        self.assertLessEqual(session.most_in_flight, 3)
+        self.assertGreater(session.most_in_flight, 1)
+
+    def test_no_urls(self):
+        self.assertEqual(fetch_all([], session=SlowSession()), [])
+
+    def test_a_failed_url_keeps_the_other_pages(self):
+        session = SlowSession()
+        get = session.get
+
+        def flaky_get(url):
+            if url == "3":
+                raise ConnectionError("reset")
+            return get(url)
+
+        session.get = flaky_get
+        urls = [str(i) for i in range(10)]
+        with self.assertRaises(FetchError) as raised:
+            fetch_all(urls, concurrency=4, session=session)
+        self.assertEqual(list(raised.exception.failures), ["3"])
+        results = raised.exception.results
+        self.assertIsInstance(results[3], ConnectionError)
+        self.assertEqual(
+            [response.url for response in results[:3] + results[4:]], urls[:3] + urls[4:]
+        )
+
+
+    def test_error_statuses_count_as_failures(self):
+        session = SlowSession()
+        get = session.get
+
+        def get_with_status(url):
+            response = get(url)
+            if url == "2":
+                response.raise_for_status.side_effect = requests.HTTPError("404 Client Error")
+            return response
+
+        session.get = get_with_status
+        with self.assertRaises(FetchError) as raised:
+            fetch_all([str(i) for i in range(4)], concurrency=2, session=session)
+        self.assertEqual(list(raised.exception.failures), ["2"])
+
+class TestFetchAndParse(unittest.TestCase):
+
+    def test_failed_urls_keep_the_other_pages(self):
+        session = SlowSession()
+        get = session.get
+
+        def flaky_get(url):
+            if url == "3":
+                raise ConnectionError("reset")
+            return get(url)
+
+        session.get = flaky_get
+        urls = [str(i) for i in range(10)]
+        with self.assertRaises(FetchError) as raised:
+            fetch_and_parse(urls, parse_number, [(100,)] * 10, fetch_workers=4,
+                            parse_workers=2, queue_size=2, session=session)
+        self.assertEqual(sorted(raised.exception.failures), ["3", "5"])
+        results = raised.exception.results
+        self.assertIsInstance(results[3], ConnectionError)
+        self.assertIsInstance(results[5], ValueError)
+        self.assertEqual(
+            [result for result in results if not isinstance(result, Exception)],
+            [100, 101, 102, 104, 106, 107, 108, 109]
+        )
+
+
+class TestFetchEach(unittest.TestCase):
+
+    def test_chains_overlap_but_keep_their_page_order(self):
+        session = SlowSession()
+
+        def fetch_chain(this_session, chain):
+            return [this_session.get(f"{chain}/{page}").url for page in range(5)]
+
+        chains = [f"set{number}" for number in range(12)]
+        results = fetch_each(chains, fetch_chain, concurrency=4, session=session)
+        self.assertEqual(
+            results, [[f"{chain}/{page}" for page in range(5)] for chain in chains]
+        )
+        self.assertLessEqual(session.most_in_flight, 4)
+        self.assertGreater(session.most_in_flight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
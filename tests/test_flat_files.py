@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from src import flat_files
+from src.flat_files import CSV, PARQUET, append_table, load_table, save_table
+
+
+def make_full_table():
+    """A few full table rows with the dtypes make_full_table produces"""
+    return pd.DataFrame({
+        "eventId": [1, 1, 2, 3],
+        "date": pd.to_datetime(["2021-01-05", "2021-01-05", "2021-02-10", "2021-05-01"]),
+        "deckId": [10, 10, 20, 30],
+        "cardId": pd.Categorical(["001znr", "002znr", "001znr", "003khm"]),
+        "count": [4, 2, 4, 1],
+        "slot": pd.Categorical(["md", "sb", "md", "md"]),
+        "latest_set": pd.Categorical(["Zendikar Rising"] * 2 + ["Kaldheim"] * 2)
+    })
+
+
+class TestFlatFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.table = make_full_table()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_csv_round_trip_parses_dates_and_filters(self):
+        save_table(self.table, "full_table", self.path, file_format=CSV)
+        loaded = load_table(
+            "full_table", self.path, columns=["deckId", "date"],
+            filters=[("slot", "==", "md"), ("eventId", "in", [1, 3])]
+        )
+        self.assertEqual(list(loaded.columns), ["deckId", "date"])
+        self.assertEqual(list(loaded["deckId"]), [10, 30])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(loaded["date"]))
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_parquet_keeps_dtypes(self):
+        save_table(self.table, "full_table", self.path, file_format=PARQUET)
+        loaded = load_table("full_table", self.path)
+        pd.testing.assert_frame_equal(loaded, self.table)
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_partitions_are_pruned_by_filters(self):
+        save_table(self.table, "full_table", self.path, partition_by="latest_set")
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.path, "full_table.parquet"))), 2
+        )
+        loaded = load_table(
+            "full_table", self.path, columns=["deckId", "count"],
+            filters=[("latest_set", "==", "Kaldheim")]
+        )
+        self.assertEqual(loaded.values.tolist(), [[20, 4], [30, 1]])
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_the_latest_save_is_loaded_whatever_its_format(self):
+        save_table(self.table, "full_table", self.path, file_format=PARQUET)
+        os.utime(os.path.join(self.path, "full_table.parquet"), ns=(0, 0))
+        save_table(self.table.iloc[:1], "full_table", self.path, file_format=CSV)
+        self.assertEqual(len(load_table("full_table", self.path)), 1)
+
+        save_table(self.table, "full_table", self.path, file_format=PARQUET)
+        self.assertEqual(len(load_table("full_table", self.path)), 4)
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_month_partitions_replace_the_old_save(self):
+        save_table(self.table, "full_table", self.path)
+        save_table(self.table, "full_table", self.path, partition_by="month")
+        save_table(self.table, "full_table", self.path, partition_by="month")
+        loaded = load_table("full_table", self.path, filters=[("month", "==", "2021-01")])
+        self.assertEqual(list(loaded["deckId"]), [10, 10])
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_appends_add_parts_to_the_saved_partitions(self):
+        save_table(self.table.iloc[:3], "full_table", self.path, partition_by="latest_set")
+        new_rows = self.table.iloc[[3, 0]].assign(
+            latest_set=pd.Categorical(["Kaldheim", "Zendikar Rising"]), deckId=[40, 50]
+        )
+        # The pinned pyarrow's write_to_dataset cannot name appended parts
+        with mock.patch.object(flat_files.pyarrow.parquet, "write_to_dataset",
+                               side_effect=TypeError("unexpected keyword")):
+            append_table(new_rows, "full_table", self.path)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.path, "full_table.parquet"))), 2
+        )
+        loaded = load_table(
+            "full_table", self.path, columns=["deckId"],
+            filters=[("latest_set", "==", "Zendikar Rising")]
+        )
+        self.assertEqual(sorted(loaded["deckId"]), [10, 10, 50])
+        self.assertEqual(len(load_table("full_table", self.path)), 5)
+
+    @unittest.skipIf(flat_files.pyarrow is None, "pyarrow is not installed")
+    def test_appends_to_a_single_file(self):
+        save_table(self.table.iloc[:2], "full_table", self.path)
+        append_table(self.table.iloc[2:], "full_table", self.path)
+        loaded = load_table("full_table", self.path)
+        self.assertEqual(sorted(loaded["deckId"]), [10, 10, 20, 30])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest import mock
+
+from src.form_scraper import FormScraper
+from src import models as m
+
+URL = "https://www.mtgtop8.com/format?f=ST"
+
+
+def make_page(events, page, last_page):
+    rows = "".join(
+        f"<tr class='hover_tr'><td><a href='event?e={link}&f=ST'>{name}</a></td>"
+        f"<td class='S10'>{date}</td></tr>"
+        for name, link, date in events
+    )
+    nav = "".join(
+        f"<a href='javascript:PageSubmit({number})'>{number}</a>"
+        for number in range(1, last_page + 1) if number != page
+    )
+    return (
+        "<html><head><title>MTG Standard</title></head><body>"
+        "<form name='format_form' method='post' action='format?f=ST'>"
+        f"<input type='hidden' name='cp' value='{page}'></form>"
+        "<div><table class='Stable'><tr><td>Decks</td></tr></table>"
+        f"<table class='Stable'>{rows}</table></div>"
+        f"<div class='Nav_norm'>{nav}</div>"
+        "</body></html>"
+    )
+
+
+PAGES = {
+    1: make_page([("FNM @ Store", "100", "30/10/20")], 1, 2),
+    2: make_page([("Open @ Hall", "99", "29/10/20")], 2, 2),
+}
+
+
+def fake_response(page):
+    response = mock.Mock()
+    response.text = PAGES[page]
+    response.url = URL
+    return response
+
+
+class TestFormScraper(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.get.return_value = fake_response(1)
+        self.session.post.side_effect = lambda url, data: fake_response(data["cp"])
+
+    def test_get_page_reads_event_rows(self):
+        with FormScraper(URL, session=self.session) as scraper:
+            result = m.get_page(scraper)
+        self.assertEqual(
+            result,
+            [("FNM @ Store", "https://www.mtgtop8.com/event?e=100&f=ST", "30/10/20")]
+        )
+
+    def test_page_submit_posts_form_with_page_number(self):
+        with FormScraper(URL, session=self.session) as scraper:
+            scraper.execute("PageSubmit", 2)
+            self.assertIn("Open @ Hall", repr(scraper))
+        url, = self.session.post.call_args.args
+        self.assertEqual(url, URL)
+        self.assertEqual(self.session.post.call_args.kwargs["data"]["cp"], 2)
+
+    def test_other_javascript_is_rejected(self):
+        with FormScraper(URL, session=self.session) as scraper:
+            with self.assertRaises(ValueError):
+                scraper.execute("alert", 1)
+
+    def test_event_scraper_stops_after_last_page(self):
+        with mock.patch.object(
+            m, "FormScraper", lambda url: FormScraper(url, session=self.session)
+        ):
+            result = m.EventScraper(URL, ["not seen"]).update()
+        self.assertEqual(
+            [link for _, link, _ in result],
+            [
+                "https://www.mtgtop8.com/event?e=100&f=ST",
+                "https://www.mtgtop8.com/event?e=99&f=ST",
+            ]
+        )
+        self.assertEqual(
+            [call.kwargs["data"]["cp"] for call in self.session.post.call_args_list], [2]
+        )
+
+    def test_event_scraper_reads_a_single_page_once(self):
+        self.session.get.return_value = fake_response(2)
+        with mock.patch.object(
+            m, "FormScraper", lambda url: FormScraper(url, session=self.session)
+        ):
+            result = m.EventScraper(URL, ["not seen"]).update()
+        self.assertEqual(len(result), 1)
+        self.session.post.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
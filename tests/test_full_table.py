@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import pandas as pd
+
+import data_cleaning as dc
+from src.constants import FULL_TABLE_COLUMNS
+
+
+def merge_everything(**kwargs):
+    """The full table as make_full_table used to build it"""
+    result = (
+        pd.merge(kwargs["event_table"], kwargs["deck_table"], on="eventId",
+                 suffixes=["_event", "_deck"]).drop_duplicates()
+        .merge(kwargs["pilot_table"], on="pilotId", suffixes=[None, "_pilot"])
+        .drop_duplicates()
+        .merge(kwargs["deck_list_table"], on="deckId", suffixes=[None, "_decklist"])
+        .drop_duplicates()
+        .merge(kwargs["card_table"], on="cardId", suffixes=[None, "_cards"])
+    )
+    return result[FULL_TABLE_COLUMNS].drop_duplicates()
+
+
+def make_tables():
+    """Small tables shaped like the cleaned ones data_cleaning.main merges"""
+    random.seed(2)
+    event_table = pd.DataFrame({
+        "eventId": range(1, 6),
+        "name": [f"Event {number}" for number in range(1, 6)],
+        "link": [f"event?e={number}" for number in range(1, 6)],
+        "date": pd.to_datetime(["2021-01-0" + str(number) for number in range(1, 6)]),
+        "latest_set": ["Kaldheim"] * 5
+    })
+    deck_table = pd.DataFrame({
+        "deckId": range(1, 31),
+        "eventId": [random.randint(1, 5) for _ in range(30)],
+        "pilotId": [random.randint(1, 10) for _ in range(30)],
+        "deckUrl": [f"?d={number}" for number in range(1, 31)],
+        "name": [random.choice(["Mono Red", "Sultai Ramp"]) for _ in range(30)],
+        "rank": ["1"] * 30,
+        "archetype": [random.choice(["aggro", "ramp"]) for _ in range(30)],
+        "category": [random.choice(["mono red", "sultai"]) for _ in range(30)]
+    })
+    pilot_table = pd.DataFrame({
+        "pilotId": range(1, 11),
+        "firstName": [f"Pilot{number}" for number in range(1, 11)],
+        "lastName": ["Surname"] * 10
+    })
+    deck_list_table = pd.DataFrame(
+        [
+            (f"{card:03d}znr", deck, random.randint(1, 4), random.choice(["md", "sb"]), "x")
+            for deck in range(1, 31)
+            for card in random.sample(range(60), 12)
+        ] + [("001znr", 1, 4, "md", "x")] * 3,
+        columns=["cardId", "deckId", "count", "slot", "cardName"]
+    )
+    card_table = pd.DataFrame({
+        "setNumber": [f"{card:03d}" for card in range(55)],
+        "setName": ["znr"] * 55,
+        "name": [f"Card {card}" for card in range(55)],
+        "color": [random.choice(["R", "G", ""]) for _ in range(55)],
+        "oracle_text": ["Long rules text " * 20] * 55,
+        "image_uri": ["https://example.com/card.jpg"] * 55
+    })
+    dc.add_card_id(card_table)
+    return dict(
+        event_table=event_table,
+        deck_table=deck_table,
+        pilot_table=pilot_table,
+        deck_list_table=deck_list_table,
+        card_table=card_table
+    )
+
+
+def plain(table):
+    """Table with categoricals turned back into objects, in a fixed order"""
+    table = table.astype({
+        column: object for column in table.columns
+        if isinstance(table[column].dtype, pd.CategoricalDtype)
+    })
+    return table.sort_values(by=list(table.columns)).reset_index(drop=True)
+
+
+class TestFullTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = make_tables()
+        self.full_table = dc.make_full_table(**self.tables)
+
+    def test_same_rows_as_merging_everything(self):
+        expected = merge_everything(**self.tables)
+        self.assertEqual(list(self.full_table.columns), FULL_TABLE_COLUMNS)
+        pd.testing.assert_frame_equal(
+            plain(self.full_table), plain(expected), check_dtype=False
+        )
+
+    def test_rows_are_sorted_and_labels_are_categorical(self):
+        keys = self.full_table[["eventId", "deckId"]].apply(tuple, axis=1).tolist()
+        self.assertEqual(keys, sorted(keys))
+        for column in ("slot", "archetype", "category", "color", "latest_set", "name", "cardId"):
+            self.assertIsInstance(self.full_table[column].dtype, pd.CategoricalDtype, column)
+
+    def test_spot_fixes_add_new_categories(self):
+        dc.fix_wrong_names(self.full_table, {"001znr": ["999znr", "Fixed Card", "W"]})
+        fixed = self.full_table[self.full_table["cardId"] == "999znr"]
+        self.assertFalse(fixed.empty)
+        self.assertEqual(set(fixed["name"]), {"Fixed Card"})
+        self.assertEqual(set(fixed["color"]), {"W"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import tempfile
+from unittest import mock
+
+import requests
+
+from src.http_cache import CacheMiss, ResponseCache, cache_policy
+from src.session import make_session
+
+EVENT_URL = "https://www.mtgtop8.com/event?e=100&f=ST"
+SCRYFALL_URL = "https://api.scryfall.com/cards/search?q=set%3A'znr'"
+
+
+def make_response(url, body=b"<html>page</html>", status=200, headers=None):
+    response = requests.Response()
+    response._content = body
+    response.status_code = status
+    response.url = url
+    response.encoding = "utf-8"
+    response.headers.update(headers or {})
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name, ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_policies(self):
+        self.assertEqual(cache_policy(EVENT_URL), "immutable")
+        self.assertEqual(cache_policy(SCRYFALL_URL), "revalidate")
+        self.assertIsNone(cache_policy("https://www.mtgtop8.com/format?f=ST"))
+
+    def test_immutable_pages_are_fetched_once(self):
+        send = mock.Mock(return_value=make_response(EVENT_URL))
+        first = self.cache.fetch(EVENT_URL, send)
+        second = self.cache.fetch(EVENT_URL, send)
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.url, EVENT_URL)
+
+    def test_identical_bodies_share_a_blob(self):
+        other_url = EVENT_URL.replace("100", "101")
+        self.cache.fetch(EVENT_URL, lambda headers: make_response(EVENT_URL))
+        self.cache.fetch(other_url, lambda headers: make_response(other_url))
+        self.assertEqual(
+            self.cache.lookup(EVENT_URL)["digest"], self.cache.lookup(other_url)["digest"]
+        )
+
+    def test_errors_are_not_cached(self):
+        send = mock.Mock(return_value=make_response(EVENT_URL, status=503))
+        self.cache.fetch(EVENT_URL, send)
+        self.assertIsNone(self.cache.lookup(EVENT_URL))
+
+    def test_stale_scryfall_page_is_revalidated(self):
+        self.cache.ttl = 0
+        self.cache.fetch(
+            SCRYFALL_URL,
+            lambda headers: make_response(SCRYFALL_URL, b"{}", headers={"ETag": '"v1"'})
+        )
+        send = mock.Mock(return_value=make_response(SCRYFALL_URL, b"", status=304))
+        response = self.cache.fetch(SCRYFALL_URL, send)
+        self.assertEqual(send.call_args.args[0]["If-None-Match"], '"v1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"{}")
+
+    def test_evicted_pages_are_fetched_again(self):
+        send = mock.Mock(return_value=make_response(EVENT_URL))
+        self.cache.fetch(EVENT_URL, send)
+        self.cache.evict(EVENT_URL)
+        self.assertIsNone(self.cache.lookup(EVENT_URL))
+        self.cache.fetch(EVENT_URL, send)
+        self.assertEqual(send.call_count, 2)
+
+    def test_offline_replay(self):
+        self.cache.fetch(EVENT_URL, lambda headers: make_response(EVENT_URL))
+        self.cache.offline = True
+        send = mock.Mock()
+        self.assertEqual(self.cache.fetch(EVENT_URL, send).content, b"<html>page</html>")
+        with self.assertRaises(CacheMiss):
+            self.cache.fetch(SCRYFALL_URL, send)
+        send.assert_not_called()
+
+    def test_offline_sessions_never_reach_the_network(self):
+        self.cache.fetch(EVENT_URL, lambda headers: make_response(EVENT_URL))
+        with make_session(cache=self.cache, offline=True) as session, \
+                mock.patch.object(requests.Session, "request") as send:
+            self.assertEqual(session.get(EVENT_URL).content, b"<html>page</html>")
+            with self.assertRaises(CacheMiss):
+                session.post("https://www.mtgtop8.com/format?f=ST", data={"cp": 2})
+        send.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
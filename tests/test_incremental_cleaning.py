@@ -0,0 +1,177 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import data_cleaning as dc
+from src.flat_files import load_table
+from src.sqldb import SQLDatabase
+
+
+def add_event(sql_db, number, decks=2, lists=True):
+    """One event with a few Mono Red decks of three znr cards each"""
+    link = f"event?e={number}&f=ST"
+    sql_db.union_tables({
+        "event": [(f"Event {number}", link, f"{number:02d}/03/21")],
+        "pilot": [[f"Pilot{number}", "Doe"], ["SharedPilot", ""]],
+        "deck": [
+            (link, f"Pilot{number} Doe" if deck else "SharedPilot",
+             f"?e={number}&d={deck}&f=ST", "Mono Red Aggro", str(deck + 1))
+            for deck in range(decks)
+        ]
+    })
+    if lists:
+        add_deck_lists(sql_db, number)
+
+
+def add_deck_lists(sql_db, number):
+    """Saves the lists of one event's decks, as a later scrape would"""
+    deck_ids = [
+        row[0] for row in sql_db._cursor.execute(
+            "SELECT id FROM deck WHERE deckUrl LIKE ?", (f"?e={number}&%",)
+        )
+    ]
+    sql_db.union_events(
+        [
+            (f"{card:03d}znr", deck_id, 4, "md", f"Card {card}")
+            for deck_id in deck_ids
+            for card in range(1, 4)
+        ],
+        "deckList"
+    )
+
+
+class TestIncrementalCleaning(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "flat_files")
+        self.db_path = os.path.join(directory.name, "test.db")
+
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            sql_db._cursor.executemany(
+                "INSERT INTO card (setNumber, setName, name, color, standardLegality) "
+                "VALUES (?, 'znr', ?, 'R', 'legal')",
+                [(str(card), f"Card {card}") for card in range(1, 4)]
+            )
+            sql_db._connection.commit()
+            add_event(sql_db, 1)
+
+        for target, value in (
+                ("update", lambda url: None),
+                ("update_json_data", lambda data: None),
+                ("SQLDatabase", lambda: SQLDatabase(self.db_path, shared=False)),
+                ("OUTPUT_DIR", self.output),
+                ("STATE_FILE", os.path.join(self.output, "state.json"))):
+            patcher = mock.patch.object(dc, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_main(self, **kwargs):
+        with mock.patch("builtins.print") as printed:
+            dc.main(**kwargs)
+        return [call.args[0] for call in printed.call_args_list if call.args]
+
+    def saved(self, name):
+        return load_table(name, self.output)
+
+    def test_only_new_decks_are_cleaned_and_appended(self):
+        self.assertIn("Rebuilding every table.", self.run_main())
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            add_event(sql_db, 2, decks=3)
+
+        self.assertIn("Cleaning 3 new or updated decks.", self.run_main())
+        self.assertEqual(self.run_main()[-1], "Nothing new to clean.")
+
+        full_table = self.saved("full_table")
+        self.assertEqual(len(full_table), 15)
+        self.assertEqual(sorted(self.saved("event_table")["eventId"]), [1, 2])
+        self.assertEqual(len(self.saved("pilot_table")), 3)
+        self.assertEqual(set(full_table["archetype"]), {"aggro"})
+
+        incremental = {name: self.saved(name) for name in ("full_table", "deck_table")}
+        self.run_main(incremental=False)
+        for name, table in incremental.items():
+            rebuilt = self.saved(name)
+            pd.testing.assert_frame_equal(
+                table.sort_values("deckId").reset_index(drop=True),
+                rebuilt.sort_values("deckId").reset_index(drop=True),
+                check_dtype=False, check_categorical=False
+            )
+
+    def test_lists_saved_after_their_decks_were_cleaned_are_picked_up(self):
+        self.run_main()
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            add_event(sql_db, 2, decks=3, lists=False)
+        self.assertIn("Cleaning 3 new or updated decks.", self.run_main())
+        self.assertEqual(len(self.saved("full_table")), 6)
+
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            add_deck_lists(sql_db, 2)
+        self.assertIn("Cleaning 3 new or updated decks.", self.run_main())
+        self.assertEqual(self.run_main()[-1], "Nothing new to clean.")
+
+        full_table = self.saved("full_table")
+        self.assertEqual(len(full_table), 15)
+        self.assertEqual(len(self.saved("deck_table")), 5)
+        self.assertEqual(len(self.saved("deck_list_table")), 15)
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            self.assertEqual(len(sql_db.get_full_table()), 15)
+
+    def test_a_new_pilot_alone_is_appended_without_cleaning(self):
+        self.run_main()
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            sql_db.union_tables({"pilot": [["Lone", "Pilot"]]})
+        self.assertIn("No new or updated decks, only new events or pilots.", self.run_main())
+        self.assertEqual(self.run_main()[-1], "Nothing new to clean.")
+
+        self.assertEqual(len(self.saved("pilot_table")), 3)
+        self.assertEqual(len(self.saved("event_table")), 1)
+        self.assertEqual(len(self.saved("full_table")), 6)
+
+    def test_a_new_event_without_decks_is_appended(self):
+        self.run_main()
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            add_event(sql_db, 2, decks=0)
+        self.assertIn("No new or updated decks, only new events or pilots.", self.run_main())
+        events = self.saved("event_table")
+        self.assertEqual(sorted(events["eventId"]), [1, 2])
+        self.assertEqual(list(events["latest_set"]), ["Kaldheim"] * 2)
+
+    def test_full_table_is_materialized_in_sqlite(self):
+        self.run_main()
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            add_event(sql_db, 2, decks=3)
+        self.run_main()
+
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            saved = sql_db.get_full_table()
+            aggro = sql_db.get_full_table(
+                "archetype = ? AND date >= ?", ("aggro", "2021-03-02"), "deckId, date"
+            )
+            plan = " ".join(
+                row[-1] for row in sql_db._cursor.execute(
+                    "EXPLAIN QUERY PLAN SELECT deckId, date FROM fullTable "
+                    "WHERE archetype = 'aggro' AND date >= '2021-03-02'"
+                )
+            )
+        pd.testing.assert_frame_equal(
+            saved.sort_values(["deckId", "cardId"]).reset_index(drop=True),
+            self.saved("full_table").sort_values(["deckId", "cardId"]).reset_index(drop=True),
+            check_dtype=False, check_categorical=False
+        )
+        self.assertEqual(sorted(aggro["deckId"].unique()), [3, 4, 5])
+        self.assertIn("COVERING INDEX fullTableArchetype", plan)
+
+    def test_changed_rules_force_a_rebuild(self):
+        self.run_main()
+        with mock.patch.object(dc, "rules_hash", lambda: "changed"):
+            self.assertIn("Rebuilding every table.", self.run_main())
+        self.assertIn("Rebuilding every table.", self.run_main())
+
+
+if __name__ == "__main__":
+    unittest.main()
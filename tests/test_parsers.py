@@ -0,0 +1,45 @@
+import unittest
+from os.path import dirname, join
+
+from src.data_assertions import MalformedPage
+from src.parsers import parse_deck_page, parse_event_page
+from tests.soup_reference import soup_deck, soup_event
+
+FIXTURES = join(dirname(__file__), "fixtures")
+
+
+def read_fixture(name):
+    with open(join(FIXTURES, name), "r") as fixture:
+        return fixture.read()
+
+
+class TestParsersMatchBeautifulSoup(unittest.TestCase):
+
+    def test_ranked_event(self):
+        text = read_fixture("event_ranked.html")
+        names, ranks, links, players = parse_event_page(text)
+        self.assertEqual((names, ranks, links, players), soup_event(text))
+        self.assertEqual(ranks[:3], ["1", "2", "3-4"])
+        self.assertEqual(links[0], "?e=30001&d=400000&f=ST")
+
+    def test_points_event(self):
+        text = read_fixture("event_points.html")
+        names, ranks, links, players = parse_event_page(text)
+        self.assertEqual((names, ranks, links, players), soup_event(text))
+        self.assertEqual(len(ranks), len(names))
+        self.assertNotIn("Companion card", ranks)
+
+    def test_deck_page(self):
+        text = read_fixture("deck.html")
+        rows = parse_deck_page(text, "deck url", 12)
+        self.assertEqual(rows, soup_deck(text, "deck url", 12))
+        self.assertIn(("221m12 ", 12, "2", "md", "Dragonskull Summit"), rows)
+
+    def test_malformed_name_is_rejected(self):
+        text = read_fixture("event_ranked.html").replace("Dimir Rogues", "$12 (tix)", 1)
+        with self.assertRaises(MalformedPage):
+            parse_event_page(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
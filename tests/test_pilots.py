@@ -0,0 +1,79 @@
+import unittest
+
+import pandas as pd
+
+from src.data_assertions import check_new_players
+from src.pilots import PilotIndex, split_name
+from src.sqldb import SQLDatabase
+
+SAVED = pd.DataFrame({
+    "firstName": ["Jane", "ArenaHandle", "Mary"],
+    "lastName": ["Doe", "", None]
+})
+
+
+class TestPilotIndex(unittest.TestCase):
+
+    def test_names_are_split_like_the_pilot_table(self):
+        self.assertEqual(split_name("Jane  Doe "), ["Jane", "Doe"])
+        self.assertEqual(split_name("Jean Luc\tPicard"), ["Jean", "Luc Picard"])
+        self.assertEqual(split_name(" ArenaHandle"), ["ArenaHandle", ""])
+
+    def test_saved_pilots_and_handles_are_known(self):
+        pilots = PilotIndex.from_table(SAVED)
+        self.assertIn("Jane Doe", pilots)
+        self.assertIn(" Jane   Doe", pilots)
+        self.assertIn("ArenaHandle", pilots)
+        self.assertIn("Mary", pilots)
+        self.assertNotIn("Jane Smith", pilots)
+
+    def test_pilots_seen_at_several_events_are_new_once(self):
+        pilots = PilotIndex.from_table(SAVED)
+        first_event = pilots.add_new(["Jane Doe", "New Player", "Handle2", "ArenaHandle"])
+        second_event = pilots.add_new(["New  Player", "Handle2", "Other One"])
+        self.assertEqual(first_event, [["New", "Player"], ["Handle2", ""]])
+        self.assertEqual(second_event, [["Other", "One"]])
+        self.assertEqual(len(pilots), 6)
+
+    def test_check_new_players_still_filters_one_page(self):
+        self.assertEqual(
+            check_new_players(["Jane Doe", "Jane Doe", "Bob Ross"], SAVED),
+            [["Bob", "Ross"]]
+        )
+
+    def test_new_pilots_resolve_to_ids_for_their_decks(self):
+        players = ["Jane Doe", "Handle2", "Jane  Doe"]
+        with SQLDatabase(":memory:") as sql_db:
+            sql_db.union_events([("Event", "event?e=1", "01/02/21")], "event")
+            counts = sql_db.union_tables({
+                "pilot": PilotIndex().add_new(players),
+                "deck": [
+                    ("event?e=1", player, f"?e=1&d={number}", "Deck", "1")
+                    for number, player in enumerate(players)
+                ]
+            })
+        self.assertEqual(counts["pilot"], (2, 0))
+        self.assertEqual(counts["deck"], (3, 0))
+
+    def test_pilots_saved_with_raw_spacing_resolve(self):
+        with SQLDatabase(":memory:") as sql_db:
+            sql_db.union_events([("Event", "event?e=1", "01/02/21")], "event")
+            # Saved by an older scrape, which kept the spacing as scraped
+            sql_db._cursor.execute(
+                "INSERT INTO pilot (firstName, lastName) VALUES ('Jane', ' Van  Doe ')"
+            )
+            pilots = PilotIndex.from_table(sql_db.get_dataframe_from("pilot"))
+            new_players = pilots.add_new(["Jane Van Doe", "Jane  Van Doe"])
+            counts = sql_db.union_tables({
+                "pilot": new_players,
+                "deck": [("event?e=1", "Jane Van Doe", "?e=1&d=1", "Deck", "1")]
+            })
+            pilot_ids = sql_db._cursor.execute("SELECT pilotId FROM deck").fetchall()
+            self.assertEqual(sql_db.get_pilot_id("Jane Van  Doe"), 1)
+        self.assertEqual(new_players, [])
+        self.assertEqual(counts["deck"], (1, 0))
+        self.assertEqual(pilot_ids, [(1,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,295 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from os.path import dirname, join
+from unittest import mock
+
+import requests
+
+from src import models as m
+from src import pipeline
+from src.pipeline import Pipeline
+from src.quarantine import QuarantinedPage, save_all
+from src.sqldb import SQLDatabase
+from src.work_queue import (
+    DECK,
+    DONE,
+    EVENT,
+    EXHAUSTED,
+    FAILED,
+    IN_FLIGHT,
+    QUARANTINED,
+    WorkQueue
+)
+from tests.test_deck_list import make_deck_page
+
+FIXTURES = join(dirname(__file__), "fixtures")
+EVENT_LINKS = {
+    "https://www.mtgtop8.com/event?e=30001&f=ST": "event_ranked.html",
+    "https://www.mtgtop8.com/event?e=30002&f=ST": "event_points.html",
+}
+PAGES = [
+    [("Ranked Event", "https://www.mtgtop8.com/event?e=30001&f=ST", "01/03/21")],
+    [("Points Event", "https://www.mtgtop8.com/event?e=30002&f=ST", "02/03/21")],
+]
+
+
+class FakeSession:
+    """Serves the fixture event pages and a small page for every deck"""
+
+    def __init__(self, broken_deck=None, down_deck=None, broken_event=None, down_times=None,
+                 status=None):
+        self.broken_deck = broken_deck
+        # url: error status served for it instead of the page
+        self.status = status or {}
+        self.broken_event = broken_event
+        self.down_deck = down_deck
+        # Requests down_deck fails before it comes back; None for never
+        self.down_times = down_times
+        self.lock = threading.Lock()
+        self.requested = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def get(self, url):
+        with self.lock:
+            self.requested.append(url)
+        if url in self.status:
+            response = mock.Mock(text="<html><body>Forbidden</body></html>", url=url)
+            response.raise_for_status.side_effect = requests.HTTPError(
+                f"{self.status[url]} Client Error for url: {url}"
+            )
+            return response
+        if url in EVENT_LINKS:
+            with open(join(FIXTURES, EVENT_LINKS[url]), "r", encoding="utf-8") as page:
+                text = page.read()
+            if url == self.broken_event:
+                text = text.replace("Dimir Rogues", "$12 (tix)", 1)
+            return mock.Mock(text=text, url=url)
+        deck_id = int(url.rsplit("d=", 1)[1].split("&")[0])
+        if deck_id == self.down_deck and self.down_times != 0:
+            if self.down_times is not None:
+                self.down_times -= 1
+            raise requests.ConnectionError("connection reset")
+        if deck_id == self.broken_deck:
+            return mock.Mock(text="<html><body><td class='G14'>x</td></body></html>", url=url)
+        return mock.Mock(text=make_deck_page(deck_id % 4 + 1), url=url)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "test.db")
+
+    def run_pipeline(self, session, pages=PAGES, **kwargs):
+        def make_session(pool_size, offline=False):
+            session.offline = offline
+            return session
+
+        with mock.patch.object(pipeline, "make_session", make_session), \
+                mock.patch.object(Pipeline, "event_pages", lambda self: iter(pages)), \
+                mock.patch("builtins.print"):
+            return Pipeline(
+                "url", event_workers=2, deck_list_workers=3, db_name=self.db_path, **kwargs
+            ).run()
+
+    def table_counts(self):
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            return {
+                table: sql_db._cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("event", "deck", "deckList")
+            }
+
+    def test_events_flow_through_to_deck_lists(self):
+        counts = self.run_pipeline(FakeSession())
+        self.assertEqual(counts["event"], 2)
+        self.assertEqual(counts["deck"], 44)
+        self.assertEqual(counts["decklist"], 44 * 3)
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 132})
+
+        session = FakeSession()
+        self.assertEqual(self.run_pipeline(session)["deck"], 0)
+        self.assertEqual(session.requested, [])
+
+    def test_stages_can_run_one_after_another(self):
+        session = FakeSession()
+        counts = self.run_pipeline(session, streaming=False)
+        self.assertEqual((counts["deck"], counts["decklist"]), (44, 132))
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 132})
+        self.assertEqual(sorted(session.requested[:2]), sorted(EVENT_LINKS))
+        self.assertTrue(all("d=" in url for url in session.requested[2:]))
+
+    def test_a_failed_page_is_retried_by_the_next_run(self):
+        self.run_pipeline(FakeSession(down_deck=400005), retry_window=0)
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 129})
+        queue = WorkQueue(self.db_path)
+        self.assertEqual(queue.counts(DECK), {DONE: 43, FAILED: 1})
+
+        # Until the backoff runs out the page is not retried
+        session = FakeSession()
+        self.run_pipeline(session, pages=[], retry_window=0)
+        self.assertEqual(session.requested, [])
+        with SQLDatabase(self.db_path, shared=False) as sql_db, sql_db._connection:
+            sql_db._cursor.execute("UPDATE scrapeQueue SET nextAttemptAt = 0")
+
+        session = FakeSession()
+        self.run_pipeline(session, pages=[])
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 132})
+        self.assertEqual(queue.counts(DECK), {DONE: 44})
+        self.assertEqual(len(session.requested), 1)
+
+    def test_a_failed_page_due_within_the_window_is_retried_by_this_run(self):
+        session = FakeSession(down_deck=400005, down_times=2)
+        self.run_pipeline(session, retry_base=0.01)
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 132})
+        self.assertEqual(WorkQueue(self.db_path).counts(DECK), {DONE: 44})
+        self.assertEqual(len([url for url in session.requested if "d=400005" in url]), 3)
+
+    def test_a_page_failing_every_attempt_is_exhausted(self):
+        self.run_pipeline(FakeSession(down_deck=400005), retry_base=0.01)
+        self.assertEqual(WorkQueue(self.db_path).counts(DECK), {DONE: 43, EXHAUSTED: 1})
+
+    def test_error_statuses_are_retried_not_quarantined(self):
+        broken_event = "https://www.mtgtop8.com/event?e=30002&f=ST"
+        broken_deck = "https://www.mtgtop8.com/event?e=30001&d=400005&f=ST"
+        session = FakeSession(status={broken_event: 403, broken_deck: 404})
+        self.run_pipeline(session, retry_window=0)
+        queue = WorkQueue(self.db_path)
+        self.assertEqual(queue.counts(EVENT), {DONE: 1, FAILED: 1})
+        self.assertEqual(queue.counts(DECK)[FAILED], 1)
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            self.assertEqual(
+                sql_db._cursor.execute("SELECT COUNT(*) FROM quarantine").fetchone()[0], 0
+            )
+            error = sql_db._cursor.execute(
+                "SELECT lastError FROM scrapeQueue WHERE url = ?", (broken_deck,)
+            ).fetchone()[0]
+        self.assertIn("HTTPError: 404", error)
+
+    def test_pages_left_in_flight_are_resumed(self):
+        self.run_pipeline(FakeSession())
+        queue = WorkQueue(self.db_path)
+        with SQLDatabase(self.db_path, shared=False) as sql_db, sql_db._connection:
+            url, deck_id = sql_db._cursor.execute(
+                "SELECT url, deckId FROM scrapeQueue WHERE url LIKE '%d=400005%'"
+            ).fetchone()
+            sql_db._cursor.execute("DELETE FROM deckList WHERE deckId = ?", (deck_id,))
+            sql_db._cursor.execute(
+                "UPDATE scrapeQueue SET state = ? WHERE url = ?", (IN_FLIGHT, url)
+            )
+
+        session = FakeSession()
+        self.run_pipeline(session, pages=[])
+        self.assertEqual(self.table_counts()["deckList"], 132)
+        self.assertEqual(queue.counts(DECK), {DONE: 44})
+        self.assertEqual(len(session.requested), 1)
+
+    def test_malformed_pages_are_quarantined_and_redriven(self):
+        self.run_pipeline(FakeSession(broken_deck=400005))
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 129})
+        queue = WorkQueue(self.db_path)
+        self.assertEqual(queue.counts(DECK), {DONE: 43, QUARANTINED: 1})
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            url, reason = sql_db._cursor.execute(
+                "SELECT url, reason FROM quarantine"
+            ).fetchone()
+        self.assertIn("d=400005", url)
+        self.assertIn("Count is not a digit", reason)
+
+        # Still malformed without a parser fix
+        with mock.patch("builtins.print"):
+            self.assertEqual(m.redrive_quarantine(self.db_path), 0)
+        self.assertEqual(queue.counts(DECK)[QUARANTINED], 1)
+
+        def fixed_parser(text, deck_url, deck_id):
+            return [("1znr", deck_id, "1", "md", "Card A")]
+
+        with mock.patch.object(m, "parse_deck_page", fixed_parser), \
+                mock.patch("builtins.print"):
+            self.assertEqual(m.redrive_quarantine(self.db_path), 1)
+        self.assertEqual(self.table_counts()["deckList"], 130)
+        self.assertEqual(queue.counts(DECK), {DONE: 44})
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            self.assertEqual(
+                sql_db._cursor.execute("SELECT COUNT(*) FROM quarantine").fetchone()[0], 0
+            )
+
+    def test_quarantined_pages_are_evicted_from_the_cache(self):
+        session = FakeSession(broken_deck=400005)
+        session.cache = mock.Mock(offline=False)
+        self.run_pipeline(session)
+        session.cache.evict.assert_called_once_with(
+            "https://www.mtgtop8.com/event?e=30001&d=400005&f=ST"
+        )
+
+    def test_offline_runs_replay_the_queue_without_reading_events(self):
+        session = FakeSession()
+        counts = self.run_pipeline(session, offline=True)
+        self.assertTrue(session.offline)
+        self.assertEqual(counts["event"], 0)
+        self.assertEqual(session.requested, [])
+
+    def test_a_redriven_event_is_saved_without_fetching_it(self):
+        broken = "https://www.mtgtop8.com/event?e=30002&f=ST"
+        self.run_pipeline(FakeSession(broken_event=broken))
+        queue = WorkQueue(self.db_path)
+        self.assertEqual(queue.counts(EVENT), {DONE: 1, QUARANTINED: 1})
+        decks = self.table_counts()["deck"]
+
+        with mock.patch("src.parsers.is_malformed", lambda name: False), \
+                mock.patch("builtins.print"):
+            self.assertEqual(m.redrive_quarantine(self.db_path), 1)
+        self.assertEqual(queue.counts(EVENT), {DONE: 2})
+        self.assertEqual(self.table_counts()["deck"], 44)
+        self.assertLess(decks, 44)
+
+        # The next run fetches the redriven event's deck lists, not the event
+        session = FakeSession()
+        self.run_pipeline(session, pages=[])
+        self.assertEqual(self.table_counts(), {"event": 2, "deck": 44, "deckList": 132})
+        self.assertNotIn(broken, session.requested)
+
+
+    def test_a_redrive_error_keeps_the_page_and_carries_on(self):
+        links = list(EVENT_LINKS)
+        with open(join(FIXTURES, EVENT_LINKS[links[0]]), "r", encoding="utf-8") as page:
+            html = page.read()
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            sql_db.union_tables({"event": [row for rows in PAGES for row in rows]})
+        # The same pilots on both pages, so the second only saves them if
+        # the first page's failure gave them back
+        save_all([QuarantinedPage(link, EVENT, None, "broken", html) for link in links],
+                 self.db_path)
+
+        union_tables = SQLDatabase.union_tables
+        calls = []
+
+        def locked_once(sql_db, data_by_table):
+            calls.append(data_by_table)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return union_tables(sql_db, data_by_table)
+
+        with mock.patch.object(SQLDatabase, "union_tables", locked_once), \
+                mock.patch("builtins.print"):
+            self.assertEqual(m.redrive_quarantine(self.db_path), 1)
+        self.assertEqual(WorkQueue(self.db_path).counts(EVENT), {})
+        self.assertEqual(self.table_counts()["deck"], 32)
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            url, reason = sql_db._cursor.execute(
+                "SELECT url, reason FROM quarantine"
+            ).fetchone()
+        self.assertEqual(url, links[0])
+        self.assertIn("database is locked", reason)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import time
+from unittest import mock
+
+import requests
+
+from src.scheduler import RequestScheduler, TokenBucket, retry_after
+
+URL = "https://api.scryfall.com/cards/search"
+
+
+def response(status, headers=None):
+    return mock.Mock(status_code=status, headers=headers or {})
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_acquire_waits_for_refill(self):
+        bucket = TokenBucket(rate=50)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+@mock.patch("src.scheduler.time.sleep")
+class TestRequestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RequestScheduler(rates={}, max_retries=3)
+
+    def test_retries_server_errors_then_succeeds(self, sleep):
+        request = mock.Mock(side_effect=[response(503), response(500), response(200)])
+        result = self.scheduler.send(request, "GET", URL)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_honors_retry_after(self, sleep):
+        request = mock.Mock(side_effect=[response(429, {"Retry-After": "7"}), response(200)])
+        self.scheduler.send(request, "GET", URL)
+        sleep.assert_called_once_with(7.0)
+
+    def test_gives_up_after_max_retries(self, sleep):
+        failed = response(502)
+        failed.raise_for_status.side_effect = requests.HTTPError("502")
+        request = mock.Mock(return_value=failed)
+        with self.assertRaises(requests.HTTPError):
+            self.scheduler.send(request, "GET", URL)
+        self.assertEqual(request.call_count, 4)
+
+    def test_retries_connection_errors(self, sleep):
+        request = mock.Mock(side_effect=[requests.ConnectionError(), response(200)])
+        self.assertEqual(self.scheduler.send(request, "GET", URL).status_code, 200)
+
+    def test_other_errors_are_returned(self, sleep):
+        request = mock.Mock(return_value=response(404))
+        self.assertEqual(self.scheduler.send(request, "GET", URL).status_code, 404)
+        sleep.assert_not_called()
+
+    def test_backoff_is_capped(self, sleep):
+        scheduler = RequestScheduler(rates={}, backoff_cap=5)
+        self.assertTrue(all(0 <= scheduler.backoff(10) <= 5 for _ in range(20)))
+
+    def test_unlisted_hosts_are_unlimited(self, sleep):
+        scheduler = RequestScheduler(rates={"api.scryfall.com": 10})
+        self.assertIsNone(scheduler.get_bucket("https://example.com/"))
+        self.assertIsNotNone(scheduler.get_bucket(URL))
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_http_date(self):
+        header = {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        self.assertEqual(retry_after(response(429, header)), 0.0)
+
+    def test_missing(self):
+        self.assertIsNone(retry_after(response(429)))
+
+
+if __name__ == "__main__":
+    unittest.main()
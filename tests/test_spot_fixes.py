@@ -0,0 +1,71 @@
+import json
+import unittest
+
+import pandas as pd
+
+import data_cleaning as dc
+from src.spot_fixes import apply_fixes, fix_frame
+
+with open("src/data/maps.json", "r") as json_file:
+    MAPS = json.load(json_file)
+
+
+def fix_rankings_one_at_a_time(table, ranking_map, composite_ranks):
+    """The .loc loop fix_rankings used to run"""
+    for event_id, rank_conversion in ranking_map.items():
+        for pts, rank in rank_conversion:
+            table.loc[(table["rank"] == pts) & (table["eventId"] == int(event_id)), "rank"] = rank
+    for place_range, rank in composite_ranks.items():
+        table.loc[table["rank"] == place_range, "rank"] = rank
+
+
+class TestSpotFixes(unittest.TestCase):
+
+    def test_deck_names_are_replaced_by_id(self):
+        table = pd.DataFrame({"deckId": [601, 1, 930], "name": ["?", "Mono Red", "??"]})
+        dc.fix_deck_names(table, MAPS["id_names"])
+        self.assertEqual(list(table["name"]), ["GW Adventures", "Mono Red", "Izzet Mill"])
+
+    def test_rankings_match_the_loc_loop(self):
+        rank_map = MAPS["rank_map"]
+        rows = []
+        for event_id, rank_conversion in rank_map["base_map"].items():
+            for pts, _ in rank_conversion:
+                rows.append((int(event_id), pts))
+                rows.append((int(event_id) + 1, pts))
+        rows += [(5, "5-8"), (6, "3-4"), (7, "1"), (22, "3-4")]
+        expected = pd.DataFrame(rows, columns=["eventId", "rank"], dtype=object)
+        expected["eventId"] = expected["eventId"].astype(int)
+        actual = expected.copy()
+
+        fix_rankings_one_at_a_time(expected, rank_map["base_map"], rank_map["composite_map"])
+        dc.fix_rankings(actual, rank_map["base_map"], composite_ranks=rank_map["composite_map"])
+
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_wrong_names_update_all_three_columns(self):
+        table = pd.DataFrame({
+            "cardId": ["160bng", "001znr", "088ths"],
+            "name": ["Temple", "Card", "Gray Merchant"],
+            "color": ["W", "R", "B"]
+        })
+        dc.fix_wrong_names(table, MAPS["id_spec_map"])
+        self.assertEqual(
+            table.values.tolist(),
+            [
+                ["246thb", "Temple of Enlightenment", ""],
+                ["001znr", "Card", "R"],
+                ["099thb", "Gray Merchant of Asphodel", "B"]
+            ]
+        )
+
+    def test_first_fix_for_a_key_wins_and_counts_rows(self):
+        table = pd.DataFrame({"deckId": [1, 2, 1], "name": ["a", "b", "c"]})
+        fixes = pd.DataFrame({"name": ["x", "y"]}, index=pd.Index([1, 1], name="deckId"))
+        self.assertEqual(apply_fixes(table, fixes), 2)
+        self.assertEqual(list(table["name"]), ["x", "b", "x"])
+        self.assertEqual(apply_fixes(table, fix_frame({}, "deckId", ["name"])), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+import unittest
+import gc
+import os
+import sqlite3
+import tempfile
+import threading
+
+from src.migrations import DDL_FILE, list_migrations, migrate
+from src.sqldb import ConnectionManager, SQLDatabase
+from src import sqldb
+
+
+def make_database():
+    return SQLDatabase(":memory:")
+
+
+class TestBulkInsert(unittest.TestCase):
+
+    def setUp(self):
+        self.sql_db = make_database()
+
+    def tearDown(self):
+        self.sql_db.close()
+
+    def test_counts_inserted_and_skipped_rows(self):
+        events = [
+            ("FNM", "link1", "01/01/21"),
+            ("FNM", "link2", "01/01/21"),
+            ("FNM", "link1", "01/01/21"),
+        ]
+        self.assertEqual(self.sql_db.union_events(events, "event", chunk_size=2), (2, 1))
+        self.assertEqual(self.sql_db.union_events(events, "event"), (0, 3))
+
+    def test_union_tables_writes_in_foreign_key_order(self):
+        counts = self.sql_db.union_tables({
+            "deck": [("link1", "Jane Doe", "?e=1&d=1&f=ST", "Mono Red", "1")],
+            "pilot": [["Jane", "Doe"], ["ArenaHandle"]],
+            "event": [("FNM", "link1", "01/01/21")],
+        })
+        self.assertEqual(counts, {"event": (1, 0), "pilot": (2, 0), "deck": (1, 0)})
+        row = self.sql_db._cursor.execute(
+            "SELECT eventId, pilotId, name FROM deck"
+        ).fetchone()
+        self.assertEqual(row, (1, 1, "Mono Red"))
+        handle = self.sql_db._cursor.execute(
+            "SELECT lastName FROM pilot WHERE firstName = 'ArenaHandle'"
+        ).fetchone()
+        self.assertEqual(handle, ("",))
+
+    def test_deck_list_table_name_is_case_insensitive(self):
+        rows = [("1znr", 1, "4", "md", "Card A"), ("1znr", 1, "1", "sb", "Card A")]
+        self.assertEqual(self.sql_db.union_events(rows, "deckList"), (2, 0))
+
+    def test_repeated_deck_list_rows_are_skipped(self):
+        rows = [("1znr", 1, "4", "md", "Card A")] * 3
+        self.assertEqual(self.sql_db.union_events(rows, "decklist"), (1, 2))
+
+
+    def test_nested_writes_share_the_outer_transaction(self):
+        events = [("FNM", "link1", "01/01/21")]
+        with self.assertRaises(ValueError):
+            with self.sql_db.transaction():
+                self.sql_db.union_events(events, "event")
+                self.assertTrue(self.sql_db._connection.in_transaction)
+                raise ValueError("rolled back")
+        self.assertFalse(self.sql_db._connection.in_transaction)
+        self.assertEqual(self.sql_db.union_events(events, "event"), (1, 0))
+
+class TestForeignKeyResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.sql_db = make_database()
+        self.sql_db.union_tables({
+            "event": [("FNM", "link1", "01/01/21"), ("PTQ", "link2", "02/01/21")],
+            "pilot": [["Jane", "Doe"], ["ArenaHandle"]],
+        })
+
+    def tearDown(self):
+        self.sql_db.close()
+
+    def test_resolves_a_batch(self):
+        resolver = self.sql_db.resolver
+        self.assertEqual(resolver.event_ids(["link2", "link1"]), {"link1": 1, "link2": 2})
+        self.assertEqual(
+            resolver.pilot_ids(["Jane Doe", "ArenaHandle"]),
+            {"Jane Doe": 1, "ArenaHandle": 2}
+        )
+
+    def test_picks_up_pilots_added_after_first_lookup(self):
+        self.sql_db.resolver.pilot_ids(["Jane Doe"])
+        self.sql_db.union_events([["New", "Pilot"]], "pilot")
+        self.assertEqual(self.sql_db.resolver.pilot_ids(["New Pilot"]), {"New Pilot": 3})
+
+    def test_unknown_keys_raise(self):
+        with self.assertRaises(KeyError):
+            self.sql_db.resolver.event_ids(["missing"])
+
+    def test_pilot_lookup_uses_the_unique_key(self):
+        plan = self.sql_db._cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT firstName, lastName, id FROM pilot WHERE firstName IN (?)",
+            ("Jane",)
+        ).fetchall()
+        self.assertIn("sqlite_autoindex_pilot", str(plan))
+
+    def test_full_name_index_is_dropped(self):
+        indexes = self.sql_db._cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'pilot'"
+        ).fetchall()
+        self.assertNotIn(("pilotFullName",), indexes)
+
+
+class TestPendingWorkQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.sql_db = make_database()
+        self.sql_db.union_tables({
+            "event": [
+                ("Old", "link1", "31/12/20"),
+                ("New", "link2", "02/01/21"),
+                ("Also new", "link3", "02/01/21"),
+            ],
+            "pilot": [["Jane", "Doe"]],
+            "deck": [
+                ("link1", "Jane Doe", "?e=1&d=1&f=ST", "Mono Red", "1"),
+                ("link2", "Jane Doe", "?e=2&d=2&f=ST", "Mono Red", "1"),
+            ],
+            "decklist": [("1znr", 1, "4", "md", "Card A")],
+        })
+
+    def tearDown(self):
+        self.sql_db.close()
+
+    def test_events_without_decks(self):
+        self.assertEqual(self.sql_db.get_events_without_decks(), ["link3"])
+
+    def test_decks_without_lists(self):
+        pending = self.sql_db.get_decks_without_lists()
+        self.assertEqual(list(pending["id"]), [2])
+        self.assertEqual(list(pending["deckUrl"]), ["?e=2&d=2&f=ST"])
+
+    def test_changed_decks_include_lists_saved_later(self):
+        marks = self.sql_db.get_max_ids()
+        self.sql_db.union_tables({
+            "deck": [("link3", "Jane Doe", "?e=3&d=3&f=ST", "Mono Red", "1")],
+            "decklist": [("1znr", 2, "4", "md", "Card A")],
+        })
+        upto = self.sql_db.get_max_ids()
+        self.assertEqual(self.sql_db.get_changed_deck_ids(marks, upto), [2, 3])
+        self.assertEqual(self.sql_db.get_changed_deck_ids(upto, upto), [])
+
+    def test_latest_event_links_compares_dates_not_text(self):
+        self.assertEqual(self.sql_db.get_latest_event_links(), ["link2", "link3"])
+
+    def test_anti_joins_use_indexes(self):
+        plan = self.sql_db._cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT 1 FROM deckList WHERE deckId = 1"
+        ).fetchall()
+        self.assertIn("deckListKey", str(plan))
+
+
+class TestMigrations(unittest.TestCase):
+
+    def test_duplicates_are_removed_before_the_key_is_added(self):
+        connection = sqlite3.connect(":memory:")
+        with open(DDL_FILE) as ddl:
+            connection.executescript(ddl.read())
+        connection.executemany(
+            "INSERT INTO deckList VALUES (?, ?, ?, ?, ?)",
+            [("1znr", 1, 4, "md", "A"), ("1znr", 1, 4, "md", "A"), ("1znr", 1, 1, "sb", "A")]
+        )
+        connection.commit()
+        self.assertEqual(migrate(connection), [version for version, _ in list_migrations()])
+        self.assertEqual(connection.execute("SELECT count(*) FROM deckList").fetchone(), (2,))
+        self.assertEqual(migrate(connection), [])
+        connection.close()
+
+    def test_pragmas_are_applied(self):
+        with SQLDatabase(":memory:") as sql_db:
+            cache_size = sql_db._cursor.execute("PRAGMA cache_size").fetchone()[0]
+        self.assertEqual(cache_size, -64 * 1024)
+
+
+class TestConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.db")
+        self.manager = ConnectionManager()
+
+    def tearDown(self):
+        self.manager.close_all()
+        self.directory.cleanup()
+
+    def test_one_connection_per_thread(self):
+        first = self.manager.get(self.path)
+        self.assertIs(self.manager.get(self.path), first)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.manager.get(self.path)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], first)
+
+    def test_a_finished_thread_closes_its_connection(self):
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.manager.get(self.path)))
+        thread.start()
+        thread.join()
+        gc.collect()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            other[0].execute("SELECT 1")
+        self.assertEqual(len(self.manager._connections), 0)
+
+    def test_close_thread_opens_a_new_connection_next_time(self):
+        first = self.manager.get(self.path)
+        self.manager.close_thread()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            first.execute("SELECT 1")
+        second = self.manager.get(self.path)
+        self.assertEqual(second.execute("SELECT 1").fetchone(), (1,))
+        self.assertEqual(self.manager._connections, {second})
+
+    def test_sqldatabase_reuses_the_shared_connection(self):
+        original = sqldb.CONNECTIONS
+        sqldb.CONNECTIONS = self.manager
+        try:
+            with SQLDatabase(self.path) as sql_db:
+                first = sql_db._connection
+            with SQLDatabase(self.path) as sql_db:
+                self.assertIs(sql_db._connection, first)
+                self.assertEqual(sql_db._cursor.execute("SELECT 1").fetchone(), (1,))
+        finally:
+            sqldb.CONNECTIONS = original
+
+    def test_concurrent_writers_do_not_lock(self):
+        original = sqldb.CONNECTIONS
+        sqldb.CONNECTIONS = self.manager
+        errors = []
+
+        def write(worker):
+            try:
+                for batch in range(20):
+                    with SQLDatabase(self.path) as sql_db:
+                        sql_db.union_tables({
+                            "event": [("FNM", f"link{worker}-{batch}", "01/01/21")],
+                            "pilot": [[f"Pilot{worker}-{batch}"]],
+                        })
+            except sqlite3.Error as error:
+                errors.append(error)
+
+        try:
+            threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with SQLDatabase(self.path) as sql_db:
+                count = sql_db._cursor.execute("SELECT count(*) FROM event").fetchone()[0]
+        finally:
+            sqldb.CONNECTIONS = original
+        self.assertEqual(errors, [])
+        self.assertEqual(count, 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.sqldb import SQLDatabase
+from src.work_queue import (
+    DECK,
+    DONE,
+    EVENT,
+    EXHAUSTED,
+    FAILED,
+    IN_FLIGHT,
+    PENDING,
+    WorkQueue
+)
+
+EVENTS = ["https://www.mtgtop8.com/event?e=1", "https://www.mtgtop8.com/event?e=2"]
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "test.db")
+        self.queue = WorkQueue(self.db_path, max_attempts=2, retry_base=60)
+
+    def test_urls_are_queued_once(self):
+        self.assertEqual(self.queue.add(EVENT, EVENTS), 2)
+        self.assertEqual(self.queue.add(EVENT, EVENTS), 0)
+        self.assertEqual(self.queue.counts(), {PENDING: 2})
+
+    def test_claims_follow_queue_order_and_kind(self):
+        self.queue.add(EVENT, EVENTS)
+        self.queue.add(DECK, ["https://www.mtgtop8.com/event?e=1&d=7"], [3])
+
+        item = self.queue.claim(DECK)
+        self.assertEqual((item.kind, item.deck_id, item.attempts), (DECK, 3, 1))
+        self.assertEqual([self.queue.claim(EVENT).url for _ in EVENTS], EVENTS)
+        self.assertIsNone(self.queue.claim(EVENT))
+        self.assertEqual(self.queue.counts(EVENT), {IN_FLIGHT: 2})
+
+    def test_a_batch_claims_the_next_due_items_in_order(self):
+        self.queue.add(EVENT, EVENTS + ["https://www.mtgtop8.com/event?e=3"])
+        batch = self.queue.claim_batch(EVENT, 2)
+        self.assertEqual([item.url for item in batch], EVENTS)
+        self.assertEqual(self.queue.counts(EVENT), {IN_FLIGHT: 2, PENDING: 1})
+        self.assertEqual(len(self.queue.claim_batch(EVENT, 2)), 1)
+        self.assertEqual(self.queue.claim_batch(EVENT, 2), [])
+
+    def test_complete_saves_rows_with_the_done_state(self):
+        self.queue.add(EVENT, EVENTS[:1])
+        item = self.queue.claim(EVENT)
+        counts = self.queue.complete(item, {"pilot": [["Some", "Pilot"]]})
+        self.assertEqual(counts["pilot"][0], 1)
+        self.assertEqual(self.queue.counts(), {DONE: 1})
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            self.assertEqual(
+                sql_db._cursor.execute("SELECT COUNT(*) FROM pilot").fetchone()[0], 1
+            )
+
+    def test_failed_items_wait_out_their_backoff(self):
+        self.queue.add(EVENT, EVENTS[:1])
+        self.queue.fail(self.queue.claim(EVENT), ValueError("bad page"))
+        self.assertIsNone(self.queue.claim(EVENT))
+
+        with SQLDatabase(self.db_path, shared=False) as sql_db:
+            next_attempt, error = sql_db._cursor.execute(
+                "SELECT nextAttemptAt, lastError FROM scrapeQueue"
+            ).fetchone()
+        self.assertGreaterEqual(next_attempt, time.time() + 60)
+        self.assertEqual(error, "ValueError: bad page")
+
+    def test_items_stop_after_max_attempts(self):
+        queue = WorkQueue(self.db_path, max_attempts=2, retry_base=0)
+        queue.add(EVENT, EVENTS[:1])
+        for attempt, state in ((1, FAILED), (2, EXHAUSTED)):
+            item = queue.claim(EVENT)
+            self.assertEqual(item.attempts, attempt)
+            self.assertEqual(queue.fail(item, ValueError("bad page")), state)
+        self.assertIsNone(queue.claim(EVENT))
+        self.assertEqual(queue.counts(), {EXHAUSTED: 1})
+
+    def test_exhausted_items_can_be_queued_again(self):
+        queue = WorkQueue(self.db_path, max_attempts=1, retry_base=0)
+        queue.add(EVENT, EVENTS[:1])
+        queue.fail(queue.claim(EVENT), ValueError("bad page"))
+        self.assertEqual(queue.retry_exhausted(DECK), 0)
+        self.assertEqual(queue.retry_exhausted(), 1)
+        self.assertEqual(queue.counts(), {PENDING: 1})
+        self.assertEqual(queue.claim(EVENT).attempts, 1)
+
+    def test_recover_returns_in_flight_items_to_pending(self):
+        self.queue.add(EVENT, EVENTS)
+        self.queue.claim(EVENT)
+        self.assertEqual(self.queue.recover(), 1)
+        self.assertEqual(self.queue.counts(), {PENDING: 2})
+        self.assertEqual(self.queue.claim(EVENT).attempts, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()